@@ -0,0 +1,43 @@
+"""apply_node_pairs_to_config 随节点对数量增长的耗时。
+
+用法: python benchmarks/bench_apply_node_pairs.py [--proxies 3000] [--module 旧版本脚本路径]
+"""
+import argparse
+import time
+
+from common import load_service_module, make_subscription_yaml
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--proxies", type=int, default=3000)
+    parser.add_argument("--groups", type=int, default=60)
+    parser.add_argument("--pairs", default="10,100,300,1000,3000")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--module", help="要测试的服务脚本路径，默认为仓库中的 chain-subconverter.py")
+    args = parser.parse_args()
+
+    # 解析与复制始终使用仓库当前版本，--module 只替换被测的 apply_node_pairs_to_config
+    service = load_service_module()
+    target = load_service_module(args.module) if args.module else service
+    text, proxy_names, _, group_names = make_subscription_yaml(args.proxies, args.groups)
+    base_config = service.get_yaml().load(text)
+
+    print(f"proxies={args.proxies} groups={args.groups}")
+    print(f"{'pairs':>8} {'best ms':>10} {'us/pair':>10}")
+    for pair_count in [int(x) for x in args.pairs.split(",")]:
+        pairs = [
+            (proxy_names[i % len(proxy_names)], group_names[i % len(group_names)])
+            for i in range(pair_count)
+        ]
+        best = float("inf")
+        for _ in range(args.repeat):
+            config = service.clone_config(base_config)
+            start = time.perf_counter()
+            target.apply_node_pairs_to_config(config, pairs)
+            best = min(best, time.perf_counter() - start)
+        print(f"{pair_count:>8} {best * 1000:>10.1f} {best * 1e6 / pair_count:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""核心处理步骤的微基准：YAML 解析 / 输出、深复制、自动检测、校验与应用节点对，以及上游少量节点变化后的增量生成。
+
+每个步骤重复执行 --repeat 次，输出最短与中位耗时。--baseline 传入旧版本脚本的路径时，
+同一组数据也在旧版本上执行并输出耗时比值（当前 / 旧版本），任一步骤的比值超过 --max-ratio
+时以非零状态退出，可用于发现性能回退：
+    git show HEAD~1:chain-subconverter.py > /tmp/old.py
+    python benchmarks/bench_micro.py --baseline /tmp/old.py --max-ratio 1.2
+旧版本中不存在的步骤（例如尚未引入 names 解析模式）显示为 n/a。
+
+用法: python benchmarks/bench_micro.py [--proxies 3000] [--groups 60] [--rules 1000] [--repeat 5] [--baseline 旧版本脚本路径]
+"""
+import argparse
+import copy
+import statistics
+import sys
+import time
+
+from common import load_service_module, make_subscription_yaml
+
+
+def roundtrip_yaml(service):
+    """该版本的 round-trip YAML 实例：当前版本通过 get_yaml() 获取，早期版本只有模块级的 yaml。"""
+    return service.get_yaml() if hasattr(service, "get_yaml") else service.yaml
+
+
+def make_cases(service, text, node_pairs, repeat):
+    """返回 [(名称, 准备函数)]，准备函数返回被计时的无参函数；所需函数在该版本中不存在时抛出 AttributeError。"""
+    data = text.encode("utf-8")
+
+    def load_roundtrip():
+        yaml = roundtrip_yaml(service)
+        return lambda: yaml.load(data)
+
+    def load_safe():
+        safe_yaml = service.get_safe_yaml()
+        return lambda: safe_yaml.load(data)
+
+    def load_names():
+        extract_proxy_names = service.extract_proxy_names
+        return lambda: extract_proxy_names(data)
+
+    def dump():
+        yaml = roundtrip_yaml(service)
+        config = yaml.load(data)
+        return lambda: yaml.dump(config, service.StringIO())
+
+    def clone():
+        clone_config = service.clone_config
+        config = roundtrip_yaml(service).load(data)
+        return lambda: clone_config(config)
+
+    def auto_detect():
+        config = roundtrip_yaml(service).load(data)
+        return lambda: service.perform_auto_detection(config, service.REGION_KEYWORD_CONFIG, service.LANDING_NODE_KEYWORDS)
+
+    def auto_detect_names():
+        config = service.parse_subscription(data, service.PARSE_MODE_NAMES, [])
+        return lambda: service.perform_auto_detection(config, service.REGION_KEYWORD_CONFIG, service.LANDING_NODE_KEYWORDS)
+
+    def validate_pairs():
+        # /api/validate_configuration 的做法：在共享的 names 解析结果上检查节点对，旧版本需要先复制名称骨架
+        config = service.parse_subscription(data, service.PARSE_MODE_NAMES, [])
+        if hasattr(service, "NodeModel"):
+            return lambda: service.apply_node_pairs_to_config(config, node_pairs)
+        return lambda: service.apply_node_pairs_to_config(service.clone_config(config), node_pairs)
+
+    def apply_pairs():
+        # 每次都应用到一份新的副本上，副本预先生成，复制本身不计入耗时
+        config = roundtrip_yaml(service).load(data)
+        clone_fn = getattr(service, "clone_config", copy.deepcopy)
+        copies = [clone_fn(config) for _ in range(repeat)]
+        return lambda: service.apply_node_pairs_to_config(copies.pop(), node_pairs)
+
+    def patch_render():
+        # 上游订阅中有 3 个节点的端口变化，在上次输出的基础上增量生成
+        patch_rendered_output = service.patch_rendered_output
+        yaml = roundtrip_yaml(service)
+        config = yaml.load(data)
+        service.apply_node_pairs_to_config(config, node_pairs)
+        output = service.StringIO()
+        yaml.dump(config, output)
+        previous_output = output.getvalue().encode("utf-8")
+        changed = data
+        for i in (7, 1234, 2999):
+            changed = changed.replace(f"port: {10000 + i},".encode(), f"port: {20000 + i},".encode())
+        return lambda: patch_rendered_output(data, previous_output, changed, node_pairs)
+
+    return [("load_roundtrip", load_roundtrip), ("load_safe", load_safe), ("load_names", load_names),
+            ("dump", dump), ("clone", clone), ("auto_detect", auto_detect), ("auto_detect_names", auto_detect_names),
+            ("validate_pairs", validate_pairs), ("apply_pairs", apply_pairs),
+            ("patch_render", patch_render)]
+
+
+def measure(prepare_case, repeat):
+    """返回 (最短秒数, 中位秒数)；该版本不支持此步骤时返回 None。"""
+    try:
+        fn = prepare_case()
+    except AttributeError:
+        return None
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings), statistics.median(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--proxies", type=int, default=3000)
+    parser.add_argument("--groups", type=int, default=60)
+    parser.add_argument("--rules", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--baseline", help="用于对比的旧版本服务脚本路径")
+    parser.add_argument("--max-ratio", type=float, default=None, help="与旧版本的耗时比值上限，超过时以状态 1 退出")
+    args = parser.parse_args()
+
+    text = make_subscription_yaml(args.proxies, args.groups, num_rules=args.rules)[0]
+    service = load_service_module()
+    config = service.get_yaml().load(text)
+    node_pairs = [(pair["landing"], pair["front"]) for pair in service.perform_auto_detection(
+        config, service.REGION_KEYWORD_CONFIG, service.LANDING_NODE_KEYWORDS)[0]]
+    baseline = load_service_module(args.baseline) if args.baseline else None
+
+    print(f"proxies={args.proxies} groups={args.groups} rules={args.rules} bytes={len(text.encode('utf-8'))} pairs={len(node_pairs)}")
+    header = f"{'step':>17} {'best ms':>10} {'median ms':>10}"
+    if baseline:
+        header += f" {'base ms':>10} {'ratio':>7}"
+    print(header)
+    regressions = []
+    baseline_cases = dict(make_cases(baseline, text, node_pairs, args.repeat)) if baseline else {}
+    for name, prepare_case in make_cases(service, text, node_pairs, args.repeat):
+        result = measure(prepare_case, args.repeat)
+        line = f"{name:>17} " + (f"{result[0] * 1000:>10.1f} {result[1] * 1000:>10.1f}" if result else f"{'n/a':>10} {'n/a':>10}")
+        if baseline:
+            base = measure(baseline_cases[name], args.repeat)
+            if result and base:
+                ratio = result[0] / base[0]
+                line += f" {base[0] * 1000:>10.1f} {ratio:>7.2f}"
+                if args.max_ratio is not None and ratio > args.max_ratio:
+                    regressions.append(name)
+            else:
+                line += f" {'n/a':>10} {'n/a':>7}"
+        print(line)
+    if regressions:
+        print(f"性能回退（比值超过 {args.max_ratio}）: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
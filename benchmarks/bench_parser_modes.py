@@ -0,0 +1,71 @@
+"""round-trip、safe 与 names 三种解析模式对大型订阅的解析耗时。
+
+safe 模式在安装了 ruamel.yaml.clib 时使用 libyaml (C) 实现，脚本会输出实际是否启用；
+names 模式只从事件流中提取节点与代理组名称，--rules 可生成规则繁多的订阅观察其效果；
+--pure 额外测试纯 Python 的 safe 加载器作为对照；--memory 额外输出各模式的峰值内存。
+
+用法: python benchmarks/bench_parser_modes.py [--proxies 1000,3000,10000] [--rules 50000] [--pure] [--memory]
+"""
+import argparse
+import time
+import tracemalloc
+
+from ruamel.yaml import YAML
+
+from common import load_service_module, make_subscription_yaml
+
+
+def best_of(repeat, fn):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_memory(fn):
+    tracemalloc.start()
+    try:
+        fn()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--proxies", default="1000,3000,10000")
+    parser.add_argument("--groups", type=int, default=60)
+    parser.add_argument("--rules", type=int, default=0, help="额外生成的规则条数")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--memory", action="store_true", help="同时测量各模式解析时的峰值内存")
+    parser.add_argument("--pure", action="store_true", help="同时测试纯 Python 的 safe 加载器")
+    args = parser.parse_args()
+
+    service = load_service_module()
+    safe_yaml = service.get_safe_yaml()
+    c_loader = getattr(safe_yaml.Parser, "__name__", "") == "CParser"
+    print(f"safe 加载器使用 libyaml: {c_loader}")
+
+    modes = [("roundtrip", lambda data: service.get_yaml().load(data)),
+             ("safe", lambda data: safe_yaml.load(data)),
+             ("names", lambda data: service.extract_proxy_names(data))]
+    if args.pure:
+        pure_yaml = YAML(typ="safe", pure=True)
+        modes.append(("safe-pure", lambda data: pure_yaml.load(data)))
+
+    print(f"rules={args.rules}")
+    print(f"{'proxies':>8} {'bytes':>10} " + " ".join(f"{name + ' ms':>14}" for name, _ in modes))
+    for proxy_count in [int(x) for x in args.proxies.split(",")]:
+        text = make_subscription_yaml(proxy_count, args.groups, num_rules=args.rules)[0]
+        data = text.encode("utf-8")
+        timings = [best_of(args.repeat, lambda load=load: load(data)) for _, load in modes]
+        print(f"{proxy_count:>8} {len(data):>10} " + " ".join(f"{t * 1000:>14.1f}" for t in timings))
+        if args.memory:
+            peaks = [peak_memory(lambda load=load: load(data)) for _, load in modes]
+            print(f"{'peak MB':>19} " + " ".join(f"{p / 2**20:>14.1f}" for p in peaks))
+
+
+if __name__ == "__main__":
+    main()
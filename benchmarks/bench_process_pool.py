@@ -0,0 +1,61 @@
+"""进程内处理与 YAML 处理进程池的吞吐量对比。
+
+启动一个提供合成订阅的本地上游，再以不同的 PROCESS_POOL_WORKERS 启动服务脚本，
+并发请求 /subscription.yaml（禁用渲染缓存，每个请求都完整执行 解析→应用节点对→输出）。
+
+用法: python benchmarks/bench_process_pool.py [--workers 0,2,4] [--requests 40] [--concurrency 8]
+"""
+import argparse
+import os
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from common import StubUpstream, make_subscription_yaml, start_service
+
+
+def fetch(url):
+    with urllib.request.urlopen(url, timeout=300) as response:
+        return response.status, len(response.read())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--proxies", type=int, default=1000)
+    parser.add_argument("--groups", type=int, default=30)
+    parser.add_argument("--workers", default=f"0,{os.cpu_count() or 1}")
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--engine", default="threading", choices=["threading", "asyncio"])
+    args = parser.parse_args()
+
+    text, _, landing_names, group_names = make_subscription_yaml(args.proxies, args.groups)
+    upstream = StubUpstream(text.encode("utf-8"))
+    upstream_url = upstream.url
+    pairs = ",".join(f"{name}:{group_names[i % len(group_names)]}" for i, name in enumerate(landing_names))
+    url_path = f"/subscription.yaml?remote_url={quote(upstream_url)}&manual_pairs={quote(pairs)}"
+
+    print(f"proxies={args.proxies} requests={args.requests} concurrency={args.concurrency} engine={args.engine}")
+    print(f"{'workers':>8} {'seconds':>10} {'req/s':>10}")
+    for workers in [int(x) for x in args.workers.split(",")]:
+        process, base = start_service(RENDER_CACHE_MAX_BYTES=0, PROCESS_POOL_WORKERS=workers, SERVER_ENGINE=args.engine)
+        try:
+            fetch(base + url_path) # 预热：获取并缓存上游订阅，工作进程启动
+            with ThreadPoolExecutor(args.concurrency) as clients:
+                if workers:
+                    list(clients.map(fetch, [base + url_path] * args.concurrency)) # 每个工作进程各解析一次
+                start = time.perf_counter()
+                results = list(clients.map(fetch, [base + url_path] * args.requests))
+                elapsed = time.perf_counter() - start
+        finally:
+            process.terminate()
+            process.wait(30)
+        failed = sum(1 for status, _ in results if status != 200)
+        note = f"  ({failed} 个请求失败)" if failed else ""
+        print(f"{workers:>8} {elapsed:>10.2f} {args.requests / elapsed:>10.2f}{note}")
+    upstream.stop()
+
+
+if __name__ == "__main__":
+    main()
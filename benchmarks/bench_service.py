@@ -0,0 +1,129 @@
+"""端到端负载场景：并发请求服务的三个订阅接口，输出吞吐量、延迟分位数与峰值内存。
+
+启动一个本地模拟上游（可设置响应延迟与是否支持 ETag），每个场景各启动一个新的服务进程，
+先请求一次 /api/auto_detect_pairs 取得节点对（同时预热订阅缓存），再以固定并发发出请求：
+  subscription  GET  /subscription.yaml
+  auto_detect   GET  /api/auto_detect_pairs
+  validate      POST /api/validate_configuration
+  mixed         以上三种轮流发出
+峰值内存为服务进程（含 YAML 处理进程池的工作进程）的 VmHWM 之和。
+--env 可向服务传入额外的环境变量，例如 --env SUBSCRIPTION_CACHE_TTL=1 让请求更多地经过上游，
+--env RENDER_CACHE_MAX_BYTES=0 让每个 /subscription.yaml 请求都完整生成输出。
+
+用法: python benchmarks/bench_service.py [--scenarios subscription,auto_detect,validate,mixed] [--proxies 3000]
+      [--requests 200] [--concurrency 16] [--latency-ms 50] [--no-etag] [--engine threading|asyncio] [--env KEY=VALUE]
+"""
+import argparse
+import json
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+from common import StubUpstream, make_subscription_yaml, peak_rss_bytes, start_service
+
+SCENARIOS = ("subscription", "auto_detect", "validate", "mixed")
+
+
+def send(request):
+    """发出请求并读完响应，返回 (状态码, 耗时秒数)。"""
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=300) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        status = e.code
+    except OSError:
+        status = None
+    return status, time.perf_counter() - start
+
+
+def build_requests(base, upstream_url, node_pairs):
+    manual_pairs = ",".join(f"{pair['landing']}:{pair['front']}" for pair in node_pairs)
+    validate_body = json.dumps({"remote_url": upstream_url, "node_pairs": node_pairs}).encode("utf-8")
+    return {
+        "subscription": lambda: urllib.request.Request(
+            f"{base}/subscription.yaml?remote_url={quote(upstream_url)}&manual_pairs={quote(manual_pairs)}"),
+        "auto_detect": lambda: urllib.request.Request(f"{base}/api/auto_detect_pairs?remote_url={quote(upstream_url)}"),
+        "validate": lambda: urllib.request.Request(
+            f"{base}/api/validate_configuration", data=validate_body, headers={"Content-Type": "application/json"}),
+    }
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))]
+
+
+def run_scenario(scenario, upstream, args, service_env):
+    process, base = start_service(**service_env)
+    try:
+        with urllib.request.urlopen(f"{base}/api/auto_detect_pairs?remote_url={quote(upstream.url)}", timeout=300) as response:
+            node_pairs = json.loads(response.read().decode("utf-8")).get("suggested_pairs", [])
+        factories = build_requests(base, upstream.url, node_pairs)
+        kinds = list(factories) if scenario == "mixed" else [scenario]
+        upstream_before, not_modified_before = upstream.requests, upstream.not_modified
+        with ThreadPoolExecutor(args.concurrency) as clients:
+            start = time.perf_counter()
+            results = list(clients.map(lambda i: send(factories[kinds[i % len(kinds)]]()), range(args.requests)))
+            elapsed = time.perf_counter() - start
+        peak_rss = peak_rss_bytes(process.pid)
+    finally:
+        process.terminate()
+        process.wait(30)
+    latencies = sorted(seconds for _, seconds in results)
+    return {
+        "pairs": len(node_pairs),
+        "rps": len(results) / elapsed,
+        "p50": percentile(latencies, 0.50),
+        "p99": percentile(latencies, 0.99),
+        "failed": sum(1 for status, _ in results if status != 200),
+        "peak_rss": peak_rss,
+        "upstream": upstream.requests - upstream_before,
+        "not_modified": upstream.not_modified - not_modified_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--proxies", type=int, default=3000)
+    parser.add_argument("--groups", type=int, default=60)
+    parser.add_argument("--rules", type=int, default=1000)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency-ms", type=float, default=50, help="模拟上游每个请求的响应延迟")
+    parser.add_argument("--no-etag", action="store_true", help="模拟上游不返回 ETag，不支持条件请求")
+    parser.add_argument("--engine", default="threading", choices=["threading", "asyncio"])
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE", help="传给服务进程的环境变量，可重复")
+    args = parser.parse_args()
+
+    scenarios = args.scenarios.split(",")
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"未知场景: {', '.join(unknown)}")
+    service_env = {"SERVER_ENGINE": args.engine}
+    service_env.update(item.split("=", 1) for item in args.env)
+
+    text = make_subscription_yaml(args.proxies, args.groups, num_rules=args.rules)[0]
+    body = text.encode("utf-8")
+    upstream = StubUpstream(body, latency=args.latency_ms / 1000, etag=not args.no_etag)
+    print(f"proxies={args.proxies} bytes={len(body)} requests={args.requests} concurrency={args.concurrency} "
+          f"engine={args.engine} upstream_latency={args.latency_ms:g}ms etag={not args.no_etag}")
+    print(f"{'scenario':>12} {'pairs':>6} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'failed':>7} {'upstream':>9} {'304':>6} {'peak MB':>9}")
+    try:
+        for scenario in scenarios:
+            result = run_scenario(scenario, upstream, args, service_env)
+            peak = f"{result['peak_rss'] / 2**20:.1f}" if result["peak_rss"] is not None else "n/a"
+            print(f"{scenario:>12} {result['pairs']:>6} {result['rps']:>9.1f} {result['p50'] * 1000:>9.1f} "
+                  f"{result['p99'] * 1000:>9.1f} {result['failed']:>7} {result['upstream']:>9} {result['not_modified']:>6} {peak:>9}")
+    finally:
+        upstream.stop()
+
+
+if __name__ == "__main__":
+    main()
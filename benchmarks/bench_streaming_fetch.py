@@ -0,0 +1,46 @@
+"""边下载边解析与下载完成后再解析的耗时对比。
+
+启动一个按固定速率分块发送合成订阅的本地上游，分别以启用/禁用增量解析的方式
+调用 _fetch_remote_subscription（每次使用不同的 URL，不命中订阅缓存），输出从发起请求到得到解析结果的耗时。
+
+用法: python benchmarks/bench_streaming_fetch.py [--proxies 3000] [--rate-kb 1024] [--mode roundtrip|safe|names]
+"""
+import argparse
+import time
+
+from common import StubUpstream, load_service_module, make_subscription_yaml
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--proxies", type=int, default=3000)
+    parser.add_argument("--groups", type=int, default=60)
+    parser.add_argument("--rate-kb", type=int, default=1024, help="上游发送速率 (KB/s)")
+    parser.add_argument("--mode", default="roundtrip", choices=["roundtrip", "safe", "names"])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    service = load_service_module()
+    body = make_subscription_yaml(args.proxies, args.groups)[0].encode("utf-8")
+    upstream = StubUpstream(body, bytes_per_second=args.rate_kb * 1024, etag=False) # 上游运行在独立进程中，不与解析线程争用 GIL
+    upstream_url = upstream.url
+    download_seconds = len(body) / (args.rate_kb * 1024)
+    print(f"proxies={args.proxies} bytes={len(body)} rate={args.rate_kb}KB/s (纯下载约 {download_seconds:.2f} 秒) mode={args.mode}")
+
+    incremental_parse_for = service._incremental_parse_for
+    variants = [("增量解析", incremental_parse_for), ("下载后解析", lambda cached_entry, parse_mode: None)]
+    for index, (name, factory) in enumerate(variants):
+        service._incremental_parse_for = factory
+        best = float("inf")
+        for attempt in range(args.repeat):
+            start = time.perf_counter()
+            entry, logs = service._fetch_remote_subscription(f"{upstream_url}?run={index}-{attempt}", True, args.mode)
+            assert entry is not None and entry.parsed, logs
+            best = min(best, time.perf_counter() - start)
+        print(f"{name:>8}: {best * 1000:.0f} ms")
+    service._incremental_parse_for = incremental_parse_for
+    upstream.stop()
+
+
+if __name__ == "__main__":
+    main()
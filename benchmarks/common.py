@@ -0,0 +1,223 @@
+"""基准测试公用工具：加载服务模块、生成合成订阅、本地模拟上游与启动服务进程。"""
+import atexit
+import gzip
+import hashlib
+import http.server
+import importlib.util
+import logging
+import multiprocessing
+import os
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVICE_SCRIPT = os.path.join(REPO_ROOT, "chain-subconverter.py")
+_WORK_DIR = None
+
+REGION_NAME_STYLES = {
+    "HK": ["HK", "香港", "🇭🇰 Hong Kong"],
+    "US": ["US", "美国", "🇺🇸 USA"],
+    "JP": ["JP", "日本", "🇯🇵 Japan"],
+    "SG": ["SG", "新加坡", "🇸🇬 Singapore"],
+    "TW": ["TW", "台湾", "Taiwan"],
+    "KR": ["KR", "韩国", "🇰🇷 Korea"],
+}
+
+
+def work_dir():
+    """基准进程共用的临时工作目录，服务写入的 logs/ 等运行时文件都落在这里而不是仓库目录，进程退出时删除。"""
+    global _WORK_DIR
+    if _WORK_DIR is None:
+        _WORK_DIR = tempfile.mkdtemp(prefix="chain-bench-")
+        atexit.register(shutil.rmtree, _WORK_DIR, ignore_errors=True)
+    return _WORK_DIR
+
+
+def load_service_module(path=None, log_level=logging.WARNING):
+    """按文件路径加载服务脚本（文件名带连字符，无法直接 import）。
+
+    传入旧版本脚本的路径即可对比不同版本的性能，例如：
+    git show HEAD~1:chain-subconverter.py > /tmp/old.py
+    """
+    path = os.path.abspath(path or SERVICE_SCRIPT)
+    os.environ.setdefault("DISK_CACHE_MAX_BYTES", "0") # 不把基准数据写入磁盘缓存
+    spec = importlib.util.spec_from_file_location("chain_subconverter_bench", path)
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[spec.name] = module
+    cwd = os.getcwd()
+    os.chdir(work_dir()) # 服务脚本导入时按相对路径创建 logs/ 日志文件
+    try:
+        spec.loader.exec_module(module)
+    finally:
+        os.chdir(cwd)
+    module.logger.setLevel(log_level)
+    return module
+
+
+def make_subscription_yaml(num_proxies=3000, num_groups=50, landing_ratio=0.1, num_rules=0):
+    """生成 Mihomo 风格的订阅 YAML 文本，返回 (文本, 节点名列表, 落地节点名列表, 代理组名列表)。
+
+    节点名称混用 REGION_KEYWORD_CONFIG 中各区域的代码、中文名与旗帜写法，约 landing_ratio 比例的节点
+    名称带有落地关键字；num_rules 为 MATCH 之前额外生成的 DOMAIN-SUFFIX 规则数量，用于模拟规则繁多的订阅。
+    """
+    regions = list(REGION_NAME_STYLES)
+    landing_keywords = ("Landing", "落地") # 与 LANDING_NODE_KEYWORDS 一致，交替使用
+    lines = ["mixed-port: 7890", "mode: rule", "proxies:"]
+    proxy_names = []
+    landing_names = []
+    landing_every = max(1, int(round(1 / landing_ratio))) if landing_ratio > 0 else 0
+    for i in range(num_proxies):
+        region = regions[i % len(regions)]
+        style = REGION_NAME_STYLES[region][(i // len(regions)) % 3]
+        if landing_every and i % landing_every == 0:
+            name = f"{style} {landing_keywords[(i // landing_every) % 2]} {i:05d}"
+            landing_names.append(name)
+        else:
+            name = f"{style} {i:05d}"
+        proxy_names.append(name)
+        lines.append(
+            f"  - {{name: '{name}', type: ss, server: node{i}.example.com, port: {10000 + i}, "
+            f"cipher: aes-128-gcm, password: bench-{i}, udp: true}}"
+        )
+    lines.append("proxy-groups:")
+    group_names = []
+    for g in range(num_groups):
+        # 每个区域一个名称带区域关键字的地区组（自动检测时可唯一匹配为前置组），其余为不含区域关键字的选择组
+        if g < len(regions):
+            name = f"{REGION_NAME_STYLES[regions[g]][1]} 组 {g:03d}"
+        else:
+            name = f"Select {g:03d}"
+        group_names.append(name)
+        lines.append(f"  - name: '{name}'")
+        lines.append("    type: select")
+        lines.append("    proxies:")
+        for member in proxy_names[g % len(regions)::len(regions)]:
+            lines.append(f"      - '{member}'")
+    lines.append("rules:")
+    for r in range(num_rules):
+        lines.append(f"  - DOMAIN-SUFFIX,site{r}.example.com,{group_names[r % len(group_names)] if group_names else 'DIRECT'}")
+    lines.append("  - MATCH,DIRECT")
+    return "\n".join(lines) + "\n", proxy_names, landing_names, group_names
+
+
+def _serve_stub_upstream(body, latency, bytes_per_second, etag_enabled, gzip_enabled, chunk_size, port_queue, counters):
+    etag = '"' + hashlib.sha256(body).hexdigest()[:16] + '"'
+    gzip_body = gzip.compress(body) if gzip_enabled else None
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            with counters["requests"].get_lock():
+                counters["requests"].value += 1
+            if latency:
+                time.sleep(latency)
+            if etag_enabled and self.headers.get("If-None-Match") == etag:
+                with counters["not_modified"].get_lock():
+                    counters["not_modified"].value += 1
+                self.send_response(304)
+                self.send_header("ETag", etag)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            payload = body
+            self.send_response(200)
+            if etag_enabled:
+                self.send_header("ETag", etag)
+            if gzip_body is not None and "gzip" in self.headers.get("Accept-Encoding", ""):
+                payload = gzip_body
+                self.send_header("Content-Encoding", "gzip")
+            self.send_header("Content-Length", str(len(payload)))
+            self.end_headers()
+            if not bytes_per_second:
+                self.wfile.write(payload)
+                return
+            for start in range(0, len(payload), chunk_size):
+                self.wfile.write(payload[start:start + chunk_size])
+                self.wfile.flush()
+                time.sleep(chunk_size / bytes_per_second)
+
+        def log_message(self, *args):
+            pass
+
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+class StubUpstream:
+    """在独立进程中运行的本地订阅上游，避免与被测代码争用 GIL。
+
+    latency 为每个请求在响应前的等待秒数；bytes_per_second 非 0 时按该速率分块发送响应体；
+    etag=True 时返回 ETag，并对携带匹配 If-None-Match 的条件请求返回 304；
+    gzip=True 时对 Accept-Encoding 含 gzip 的请求以 Content-Encoding: gzip 压缩传输响应体。
+    requests / not_modified 为收到的请求数与其中返回 304 的次数。
+    """
+
+    def __init__(self, body, latency=0.0, bytes_per_second=0, etag=True, gzip=False, chunk_size=16 * 1024):
+        self._counters = {"requests": multiprocessing.Value("i", 0), "not_modified": multiprocessing.Value("i", 0)}
+        port_queue = multiprocessing.Queue()
+        self._process = multiprocessing.Process(
+            target=_serve_stub_upstream,
+            args=(body, latency, bytes_per_second, etag, gzip, chunk_size, port_queue, self._counters),
+            daemon=True,
+        )
+        self._process.start()
+        self.url = f"http://127.0.0.1:{port_queue.get(timeout=30)}/sub.yaml"
+
+    @property
+    def requests(self):
+        return self._counters["requests"].value
+
+    @property
+    def not_modified(self):
+        return self._counters["not_modified"].value
+
+    def stop(self):
+        self._process.terminate()
+        self._process.join(10)
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_service(**env_overrides):
+    """以子进程启动服务脚本并等待其就绪，返回 (进程, 基础 URL)。env_overrides 作为环境变量传给服务。"""
+    port = free_port()
+    # 默认不使用磁盘缓存，每次启动都是冷缓存；工作目录为临时目录，日志与缓存文件不会留在仓库目录下
+    env = dict(os.environ, PORT=str(port), LOG_LEVEL="ERROR", DISK_CACHE_MAX_BYTES="0")
+    env.update({key: str(value) for key, value in env_overrides.items()})
+    process = subprocess.Popen([sys.executable, SERVICE_SCRIPT], cwd=work_dir(), env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base = f"http://127.0.0.1:{port}"
+    for _ in range(100):
+        try:
+            urllib.request.urlopen(base + "/favicon.ico", timeout=1).read()
+            return process, base
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("服务未能启动")
+
+
+def peak_rss_bytes(pid):
+    """进程及其子进程（如 YAML 处理进程池）的峰值常驻内存之和 (Linux /proc)，无法读取时返回 None。"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            total = next(int(line.split()[1]) * 1024 for line in f if line.startswith("VmHWM:"))
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(child) for child in f.read().split()]
+    except (OSError, StopIteration, ValueError):
+        return None
+    for child in children:
+        total += peak_rss_bytes(child) or 0
+    return total
@@ -1,10 +1,39 @@
 import http.server
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.exceptions import DecodeError, ProtocolError, ReadTimeoutError
+import http.cookiejar
+import http.client
+import asyncio
+import io
+import ssl
+import concurrent.futures
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+import multiprocessing
+import signal
+import atexit
+import contextvars
+import cProfile
+import pstats
 import logging
 import logging.handlers
 import os
 import re
+import sys
+import copy
+import functools
+import hashlib
+import threading
+import time
+from array import array
+from collections import OrderedDict, deque
 from ruamel.yaml import YAML
+from ruamel.yaml.anchor import Anchor
+from ruamel.yaml.comments import CommentedMap, CommentedSeq, Comment, Format, LineCol, Tag, merge_attrib
+from ruamel.yaml.events import (AliasEvent, DocumentEndEvent, DocumentStartEvent, MappingEndEvent, MappingStartEvent,
+                                ScalarEvent, SequenceEndEvent, SequenceStartEvent, StreamEndEvent, StreamStartEvent)
+from ruamel.yaml.nodes import ScalarNode
 from ruamel.yaml.compat import StringIO
 from http.server import ThreadingHTTPServer # 使用 ThreadingHTTPServer 处理并发请求
 from urllib.parse import urlparse, parse_qs, unquote, urlencode # 增加了 urlencode
@@ -12,6 +41,22 @@ import mimetypes
 import datetime
 from datetime import timezone # Add this near your other datetime import
 import json
+import math
+import bisect
+import queue
+import random
+import pickle
+import tempfile
+import gzip
+import zlib
+try:
+    import aiohttp # 可选依赖：asyncio 服务模式下用于非阻塞地请求上游
+except ImportError:
+    aiohttp = None
+try:
+    import brotli # 可选依赖：客户端支持时以 brotli 压缩响应，未安装时只使用 gzip
+except ImportError:
+    brotli = None
 
 # --- 配置日志开始 ---
 LOG_FILE = "logs/server.log"
@@ -27,20 +72,88 @@ file_handler = logging.handlers.RotatingFileHandler(
     LOG_FILE, maxBytes=1024*1024, backupCount=2, encoding='utf-8'
 )
 file_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-logger.addHandler(file_handler)
 
 console_handler = logging.StreamHandler()
 console_handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
-logger.addHandler(console_handler)
+
+# 写文件与控制台由后台线程完成：请求线程只把日志记录放入队列，不会因写盘、轮转或终端输出而阻塞
+LOG_QUEUE = queue.SimpleQueue()
+LOG_LISTENER = logging.handlers.QueueListener(LOG_QUEUE, file_handler, console_handler)
+logger.addHandler(logging.handlers.QueueHandler(LOG_QUEUE))
+LOG_LISTENER.start()
+atexit.register(LOG_LISTENER.stop) # 退出前写完队列中剩余的日志
 # --- 配置日志结束 ---
 
 # --- 全局配置 ---
 PORT = int(os.getenv("PORT", 11200))
 # 新增：读取SSL验证配置的环境变量
 REQUESTS_SSL_VERIFY_CONFIG = os.getenv("REQUESTS_SSL_VERIFY", "true").lower()
+# 新增：上游请求连接池配置。POOL_CONNECTIONS 为缓存连接池的上游主机数，POOL_MAXSIZE 为每个主机保持的 keep-alive 连接数；
+# MAX_RETRIES 为 GET 请求在连接错误或 502/503/504 时的重试次数 (0 表示不重试)，RETRY_BACKOFF 为指数退避的基数 (秒)。
+REQUESTS_POOL_CONNECTIONS = int(os.getenv("REQUESTS_POOL_CONNECTIONS", 10))
+REQUESTS_POOL_MAXSIZE = int(os.getenv("REQUESTS_POOL_MAXSIZE", 10))
+REQUESTS_MAX_RETRIES = int(os.getenv("REQUESTS_MAX_RETRIES", 0))
+REQUESTS_RETRY_BACKOFF = float(os.getenv("REQUESTS_RETRY_BACKOFF", 0.5))
 # 新增：读取是否显示服务地址配置区块的环境变量
 env_value = os.getenv("SHOW_SERVICE_ADDRESS_CONFIG", "false").lower()
 SHOW_SERVICE_ADDRESS_CONFIG_ENV = env_value == "true" or env_value == "1"
+# 新增：远程订阅缓存配置。TTL 内直接复用缓存，过期后使用 ETag/Last-Modified 条件请求重新验证；
+# 最大字节数按原始订阅内容大小计算，设为 0 可禁用缓存。
+SUBSCRIPTION_CACHE_TTL = float(os.getenv("SUBSCRIPTION_CACHE_TTL", 60))
+SUBSCRIPTION_CACHE_MAX_BYTES = int(os.getenv("SUBSCRIPTION_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+# 新增：缓存过期后最多 SUBSCRIPTION_MAX_STALENESS 秒内仍立即返回上次成功获取的订阅，同时在后台刷新；
+# 刷新失败时继续使用旧订阅，直至超过该时限 (0 表示过期后同步获取)。
+# 在 BACKGROUND_REFRESH_WINDOW 秒内被请求至少 BACKGROUND_REFRESH_HOT_REQUESTS 次的订阅会在过期前由后台提前刷新 (0 表示禁用)。
+SUBSCRIPTION_MAX_STALENESS = float(os.getenv("SUBSCRIPTION_MAX_STALENESS", 3600))
+BACKGROUND_REFRESH_HOT_REQUESTS = int(os.getenv("BACKGROUND_REFRESH_HOT_REQUESTS", 2))
+BACKGROUND_REFRESH_WINDOW = float(os.getenv("BACKGROUND_REFRESH_WINDOW", 600))
+# 新增：订阅磁盘缓存。获取到的订阅原始内容、校验信息及解析结果快照保存在 DISK_CACHE_DIR (与 logs/ 同级)，
+# 服务启动时用于预热内存缓存；DISK_CACHE_MAX_BYTES 为磁盘占用上限，设为 0 可禁用。
+DISK_CACHE_DIR = os.getenv("DISK_CACHE_DIR", "cache")
+DISK_CACHE_MAX_BYTES = int(os.getenv("DISK_CACHE_MAX_BYTES", 64 * 1024 * 1024))
+# 新增：/subscription.yaml 渲染结果缓存的最大字节数（按上游内容哈希与节点对缓存），设为 0 可禁用
+RENDER_CACHE_MAX_BYTES = int(os.getenv("RENDER_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+# 新增：增量渲染。按 (订阅 URL, 节点对) 保留上次的订阅内容与输出，上游更新后只重新生成有变化的节点与代理组；
+# INCREMENTAL_RENDER_MAX_BYTES 为保留内容的总字节数上限，设为 0 可禁用
+INCREMENTAL_RENDER_MAX_BYTES = int(os.getenv("INCREMENTAL_RENDER_MAX_BYTES", 32 * 1024 * 1024))
+# 新增：/subscription.yaml 是否边生成边输出（分块发送），可降低大订阅的内存峰值与首字节延迟
+env_value = os.getenv("SUBSCRIPTION_STREAMING", "true").lower()
+SUBSCRIPTION_STREAMING = env_value == "true" or env_value == "1"
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", 64 * 1024))
+# 新增：同一订阅的并发请求会合并为一次获取，其余请求最多等待该秒数
+SINGLEFLIGHT_WAIT_TIMEOUT = float(os.getenv("SINGLEFLIGHT_WAIT_TIMEOUT", 30))
+# 新增：服务引擎。threading (默认) 为每个连接启动一个线程；asyncio 由事件循环处理连接，等待上游期间不占用线程，
+# YAML 解析与输出在 ASYNC_WORKER_THREADS 个线程中执行。未安装 aiohttp 时，上游请求在 ASYNC_UPSTREAM_THREADS 个线程中执行。
+SERVER_ENGINE = os.getenv("SERVER_ENGINE", "threading").lower()
+ASYNC_WORKER_THREADS = int(os.getenv("ASYNC_WORKER_THREADS", min(32, (os.cpu_count() or 1) + 4)))
+ASYNC_UPSTREAM_THREADS = int(os.getenv("ASYNC_UPSTREAM_THREADS", 32))
+# 新增：YAML 处理进程数。大于 0 时订阅的解析、节点对应用、自动检测与 YAML 输出在独立的工作进程中执行，
+# 不再受 GIL 限制而只能使用一个 CPU 核；0 (默认) 表示在服务进程内处理。
+PROCESS_POOL_WORKERS = int(os.getenv("PROCESS_POOL_WORKERS", 0))
+# 新增：准入控制。需要获取远程订阅的接口最多同时处理 ADMISSION_MAX_CONCURRENT 个请求 (0 表示不限制)，
+# 其余请求最多 ADMISSION_MAX_QUEUE 个排队等待 ADMISSION_QUEUE_TIMEOUT 秒；队列已满或等待超时返回 503 与 Retry-After。
+# UPSTREAM_HOST_MAX_CONCURRENT 限制对同一上游主机同时发出的请求数 (0 表示不限制)，避免集中请求被机场封禁。
+ADMISSION_MAX_CONCURRENT = int(os.getenv("ADMISSION_MAX_CONCURRENT", 32))
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", 64))
+ADMISSION_QUEUE_TIMEOUT = float(os.getenv("ADMISSION_QUEUE_TIMEOUT", 10))
+UPSTREAM_HOST_MAX_CONCURRENT = int(os.getenv("UPSTREAM_HOST_MAX_CONCURRENT", 8))
+# 新增：上游订阅的大小上限 (字节，0 表示不限制) 与整个下载过程的总时限 (秒)，超出即中止下载。
+UPSTREAM_MAX_BYTES = int(os.getenv("UPSTREAM_MAX_BYTES", 32 * 1024 * 1024))
+UPSTREAM_FETCH_DEADLINE = float(os.getenv("UPSTREAM_FETCH_DEADLINE", 30))
+# 新增：/api/batch_subscriptions 单个请求最多包含的任务数；批量请求中不同的远程订阅最多同时获取 BATCH_FETCH_WORKERS 个
+BATCH_MAX_JOBS = int(os.getenv("BATCH_MAX_JOBS", 1000))
+BATCH_FETCH_WORKERS = int(os.getenv("BATCH_FETCH_WORKERS", 8))
+# 新增：响应压缩。按客户端的 Accept-Encoding 对不小于 COMPRESSION_MIN_BYTES 字节的前端文件、订阅 YAML 与 JSON 响应
+# 使用 brotli (需安装可选依赖 brotli) 或 gzip 压缩；设为 false 可禁用
+env_value = os.getenv("RESPONSE_COMPRESSION", "true").lower()
+RESPONSE_COMPRESSION = env_value == "true" or env_value == "1"
+COMPRESSION_MIN_BYTES = int(os.getenv("COMPRESSION_MIN_BYTES", 1024))
+# 新增：慢请求记录。耗时不少于 SLOW_REQUEST_THRESHOLD 秒的请求连同各处理阶段的耗时保存在最近 SLOW_REQUEST_BUFFER_SIZE 条
+# 的环形缓冲中，可通过 /debug/slow 查看 (0 表示禁用，此时该接口不存在)；SLOW_REQUEST_PROFILE_RATE 为同时以 cProfile
+# 分析的请求比例 (0~1，0 表示不分析)，分析会明显拖慢被抽中的请求。
+SLOW_REQUEST_THRESHOLD = float(os.getenv("SLOW_REQUEST_THRESHOLD", 0))
+SLOW_REQUEST_BUFFER_SIZE = int(os.getenv("SLOW_REQUEST_BUFFER_SIZE", 50))
+SLOW_REQUEST_PROFILE_RATE = float(os.getenv("SLOW_REQUEST_PROFILE_RATE", 0))
 
 
 REGION_KEYWORD_CONFIG = [
@@ -53,220 +166,2619 @@ REGION_KEYWORD_CONFIG = [
 ]
 LANDING_NODE_KEYWORDS = ["Landing", "落地"]
 
-yaml = YAML()
-yaml.preserve_quotes = True
-yaml.indent(mapping=2, sequence=4, offset=2)
-yaml.width = float('inf')
-yaml.explicit_start = True
+# ruamel 的 YAML 实例内部保存解析/输出状态，不能在线程间共享，因此每个线程各用一个实例
+_yaml_local = threading.local()
+
+def get_yaml():
+    yaml = getattr(_yaml_local, "yaml", None)
+    if yaml is None:
+        yaml = YAML()
+        yaml.preserve_quotes = True
+        yaml.indent(mapping=2, sequence=4, offset=2)
+        yaml.width = float('inf')
+        yaml.explicit_start = True
+        _yaml_local.yaml = yaml
+    return yaml
+
+def get_safe_yaml():
+    """只读解析使用的 safe 加载器；安装了 ruamel.yaml.clib 时由 libyaml (C) 实现。"""
+    safe_yaml = getattr(_yaml_local, "safe_yaml", None)
+    if safe_yaml is None:
+        safe_yaml = YAML(typ="safe", pure=False)
+        _yaml_local.safe_yaml = safe_yaml
+    return safe_yaml
+
+# 解析模式：round-trip 保留注释、引号与锚点，用于需要原样输出的 /subscription.yaml；
+# safe 生成普通 dict/list，速度快、占用小；
+# names 只从事件流中提取节点名称与代理组成员，用于自动检测与配置验证。
+PARSE_MODE_ROUNDTRIP = "roundtrip"
+PARSE_MODE_SAFE = "safe"
+PARSE_MODE_NAMES = "names"
 # --- 全局配置结束 ---
 
 # --- 日志辅助函数 ---
+LOG_LEVELS = {"DEBUG": logging.DEBUG, "INFO": logging.INFO, "WARN": logging.WARNING, "ERROR": logging.ERROR}
+
+# 当前请求需要收集到响应中的最低日志级别。普通请求只收集警告与错误（用于组成错误详情），
+# 客户端带上 verbose=1 时才收集完整日志；请求之外（后台刷新、基准脚本等）默认全部收集。
+REQUEST_LOG_CAPTURE_LEVEL = contextvars.ContextVar("request_log_capture_level", default=logging.DEBUG)
+
+def request_log_capture_level(request_target):
+    query = parse_qs(urlparse(request_target).query)
+    verbose = query.get("verbose", [""])[0].lower() in ("1", "true", "yes")
+    return logging.DEBUG if verbose else logging.WARNING
+
+def _log_enabled(level):
+    """该级别的日志是否会被收集或输出。循环中先判断再构造消息，级别被关闭时不必格式化字符串。"""
+    levelno = LOG_LEVELS.get(level.upper(), logging.INFO)
+    return levelno >= REQUEST_LOG_CAPTURE_LEVEL.get() or logger.isEnabledFor(levelno)
+
 def _add_log_entry(logs_list, level, message, an_exception=None):
-    timestamp = datetime.datetime.now(timezone.utc).isoformat()
-    log_entry = {"timestamp": timestamp, "level": level.upper(), "message": str(message)}
-    logs_list.append(log_entry)
-
-    if level.upper() == "ERROR":
-        logger.error(message, exc_info=an_exception if an_exception else False)
-    elif level.upper() == "WARN":
-        logger.warning(message)
-    elif level.upper() == "DEBUG":
-        logger.debug(message)
-    else:
-        logger.info(message)
+    level = level.upper()
+    levelno = LOG_LEVELS.get(level, logging.INFO)
+    if levelno >= REQUEST_LOG_CAPTURE_LEVEL.get():
+        timestamp = datetime.datetime.now(timezone.utc).isoformat()
+        logs_list.append({"timestamp": timestamp, "level": level, "message": str(message)})
+    if logger.isEnabledFor(levelno):
+        logger.log(levelno, message, exc_info=an_exception if levelno == logging.ERROR and an_exception else False)
+
+# --- 运行指标 ---
+# 以 Prometheus 文本格式通过 /metrics 输出。每个指标一把锁，只在更新数值的瞬间持有；
+# 当前值类指标 (缓存大小、线程数等) 在抓取时通过回调读取，平时没有任何开销。
+def _format_labels(label_names, label_values, extra=()):
+    pairs = list(zip(label_names, label_values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+class Counter:
+    def __init__(self, name, help_text, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines.extend(f"{self.name}{_format_labels(self.label_names, labels)} {value}" for labels, value in items)
+        return lines
+
+class Histogram:
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, name, help_text, label_names=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        self._series = {} # 标签值 -> [各桶计数..., +Inf 计数, 总和]
+        self._lock = threading.Lock()
+
+    def observe(self, value, *label_values):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, list(series)) for labels, series in self._series.items())
+        for labels, series in items:
+            cumulative = 0
+            for upper_bound, count in zip(self.buckets + ("+Inf",), series):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, [('le', upper_bound)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {series[-1]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {cumulative}")
+        return lines
+
+class Gauge:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help_text = help_text
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def add(self, amount):
+        with self._lock:
+            self.value += amount
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge", f"{self.name} {self.value}"]
+
+class CallbackGauge:
+    def __init__(self, name, help_text, read_value):
+        self.name = name
+        self.help_text = help_text
+        self.read_value = read_value
+
+    def render(self):
+        return [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge", f"{self.name} {self.read_value()}"]
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e: # 回调所需的对象可能尚未创建
+                logger.debug(f"输出指标 {metric.name} 失败: {e}")
+        return "\n".join(lines) + "\n"
+
+METRICS = MetricsRegistry()
+HTTP_REQUESTS = METRICS.register(Counter(
+    "chain_http_requests_total", "HTTP requests handled, by route, method and status.", ("route", "method", "status")))
+HTTP_REQUEST_SECONDS = METRICS.register(Histogram(
+    "chain_http_request_duration_seconds", "Time from request dispatch to response completion, by route.", ("route",)))
+STAGE_SECONDS = METRICS.register(Histogram(
+    "chain_stage_duration_seconds", "Time spent in each pipeline stage.", ("stage",)))
+UPSTREAM_FETCHES = METRICS.register(Counter(
+    "chain_upstream_fetches_total", "Upstream subscription fetches, by result (HTTP status, timeout, error).", ("result",)))
+UPSTREAM_BYTES = METRICS.register(Counter(
+    "chain_upstream_bytes_total", "Subscription bytes downloaded from upstream."))
+CACHE_LOOKUPS = METRICS.register(Counter(
+    "chain_cache_lookups_total", "Cache lookups, by cache and result.", ("cache", "result")))
+INFLIGHT_REQUESTS = METRICS.register(Gauge(
+    "chain_inflight_requests", "HTTP requests currently being handled."))
+METRICS.register(CallbackGauge("chain_threads", "Live threads in the server process.", threading.active_count))
+
+def timed_stage(stage):
+    """计时上下文管理器，把代码块的耗时记录到 chain_stage_duration_seconds{stage=...}，并作为 span 记入当前请求的追踪。"""
+    return _StageTimer(stage)
+
+class _StageTimer:
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        elapsed = time.perf_counter() - self.started
+        STAGE_SECONDS.observe(elapsed, self.stage)
+        trace = CURRENT_TRACE.get()
+        if trace is not None:
+            trace.add_span(self.stage, self.started, elapsed)
+        return False
+
+# --- 请求追踪 ---
+class RequestTrace:
+    """一个请求的处理时间线：各阶段 (span) 相对请求开始的起点与耗时。
+
+    经由 CURRENT_TRACE 在请求的执行上下文中传递，timed_stage 与 record_span 在有追踪时追加 span。
+    span 可能来自并行的线程（批量请求的并发获取、边下载边解析），list.append 本身是线程安全的。
+    """
+    __slots__ = ("started", "started_at", "spans")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.started_at = datetime.datetime.now(timezone.utc)
+        self.spans = [] # (阶段, 相对请求开始的秒数, 耗时秒数)
+
+    def add_span(self, name, started, duration):
+        self.spans.append((name, started - self.started, duration))
+
+# 只有启用慢请求记录时才为请求创建追踪，否则为 None，timed_stage 只多一次上下文变量读取
+CURRENT_TRACE = contextvars.ContextVar("current_request_trace", default=None)
+
+def record_span(name, started):
+    """把从 started (time.perf_counter()) 到现在的耗时记为当前请求追踪中的一个 span，不计入运行指标。"""
+    trace = CURRENT_TRACE.get()
+    if trace is not None:
+        trace.add_span(name, started, time.perf_counter() - started)
+
+SLOW_REQUESTS_TOTAL = METRICS.register(Counter(
+    "chain_slow_requests_total", "Requests slower than SLOW_REQUEST_THRESHOLD, by route.", ("route",)))
+
+class SlowRequestLog:
+    """最近的慢请求（耗时不少于 threshold 秒）的环形缓冲，供 /debug/slow 查看。
+
+    profile_rate 为以 cProfile 分析的请求比例。请求开始时无法知道它是否会变慢，被抽中的请求无论快慢
+    都承担分析开销，只有慢请求保留结果；cProfile 只分析启用它的线程，同一时间最多分析一个请求。
+    """
+    PROFILE_LINES = 40
+
+    def __init__(self, threshold, capacity, profile_rate):
+        self.threshold = threshold
+        self.capacity = capacity
+        self.profile_rate = profile_rate
+        self.recorded = 0
+        self._entries = deque(maxlen=max(capacity, 1))
+        self._lock = threading.Lock()
+        self._profile_lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.threshold > 0 and self.capacity > 0
+
+    def start_profile(self):
+        """按抽样比例为当前线程启用 cProfile 并返回分析器；未抽中或已有请求在分析时返回 None。"""
+        if self.profile_rate <= 0 or random.random() >= self.profile_rate:
+            return None
+        if not self._profile_lock.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError: # 已有其它分析工具在运行（Python 3.12 起全局只能启用一个）
+            self._profile_lock.release()
+            return None
+        return profiler
+
+    def finish(self, trace, method, route, status, profiler=None):
+        """请求结束时在同一线程中调用：停止分析，耗时超过阈值时把追踪记录到缓冲中。"""
+        duration = time.perf_counter() - trace.started
+        if profiler is not None:
+            profiler.disable()
+            self._profile_lock.release()
+        if duration < self.threshold:
+            return
+        record = {
+            "started_at": trace.started_at.isoformat(),
+            "method": method,
+            "route": route,
+            "status": status,
+            "duration_ms": round(duration * 1000, 1),
+            "spans": [
+                {"stage": name, "start_ms": round(start * 1000, 1), "duration_ms": round(span_duration * 1000, 1)}
+                for name, start, span_duration in sorted(trace.spans, key=lambda span: span[1])
+            ],
+        }
+        if profiler is not None:
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).strip_dirs().sort_stats("cumulative").print_stats(self.PROFILE_LINES)
+            record["profile"] = stream.getvalue()
+        with self._lock:
+            self._entries.append(record)
+            self.recorded += 1
+        SLOW_REQUESTS_TOTAL.inc(route)
+        logger.info(f"慢请求: {method} {route} 耗时 {duration:.2f} 秒，详情见 /debug/slow。")
+
+    def snapshot(self):
+        with self._lock:
+            entries = list(reversed(self._entries))
+            recorded = self.recorded
+        return {
+            "threshold_seconds": self.threshold,
+            "capacity": self.capacity,
+            "profile_rate": self.profile_rate,
+            "recorded": recorded,
+            "requests": entries, # 最近的在前
+        }
+
+SLOW_REQUESTS = SlowRequestLog(SLOW_REQUEST_THRESHOLD, SLOW_REQUEST_BUFFER_SIZE, SLOW_REQUEST_PROFILE_RATE)
+
+# --- 节点模型 ---
+def _intern_name(name):
+    """驻留名称字符串；ruamel 的 ScalarString 等 str 子类先转为 str（sys.intern 只接受 str）。"""
+    return sys.intern(name if type(name) is str else str(name))
+
+class ProxyRecord:
+    """'proxies' 中的一个条目及其在原列表中的下标；条目不是映射时 name 为 None。"""
+    __slots__ = ("name", "position")
+
+    def __init__(self, name, position):
+        self.name = name
+        self.position = position
+
+class GroupRecord:
+    """'proxy-groups' 中的一个代理组及其在原列表中的下标。
+
+    members 依次对应该组 'proxies' 列表中的成员：成员是某个节点的名称时为该节点的编号（重名时为第一个），
+    其余成员（其它代理组、DIRECT 等）为 -1；'proxies' 不是列表时为 None。经锚点与别名共用同一个列表的代理组，
+    members 也是同一个对象。
+    模型以 compact=False 构建时保留原来的列表，见 NodeModel.from_config。
+    """
+    __slots__ = ("name", "position", "members")
+
+    def __init__(self, name, position, members):
+        self.name = name
+        self.position = position
+        self.members = members
+
+class NodeModel:
+    """自动检测与应用节点对使用的紧凑节点模型，不依赖 ruamel 的 CommentedMap。
+
+    只保存节点与代理组的名称、它们在原文档列表中的下标以及代理组的成员关系：名称经 sys.intern 驻留，
+    成员关系保存为节点编号的整数数组。names 解析模式的结果即为该模型；round-trip 文档上应用节点对时
+    先在模型上得出修改方案，再按下标写回文档。
+    """
+    __slots__ = ("proxies", "proxy_ids", "groups", "has_groups_key", "invalid_proxies")
+
+    def __init__(self):
+        self.proxies = None # ProxyRecord 列表，编号即下标；'proxies' 不是列表时为 None
+        self.proxy_ids = {} # 节点名称 -> 第一个同名节点的编号
+        self.groups = None # GroupRecord 列表（跳过不是映射的条目）；'proxy-groups' 缺失或不是列表时为 None
+        self.has_groups_key = False
+        self.invalid_proxies = {} # 编号 -> 不是映射或缺少名称的原始条目，只用于检测日志
+
+    @classmethod
+    def from_config(cls, config_object, compact=True):
+        """由解析得到的配置 (dict / CommentedMap) 构建模型；已经是 NodeModel 时原样返回，不是映射时返回 None。
+
+        compact=False 时不驻留名称，GroupRecord.members 保留原来的 'proxies' 列表，由 member_ids() 按需编码，
+        供只用到少数代理组、用完即弃的模型使用。
+        """
+        if isinstance(config_object, NodeModel):
+            return config_object
+        if not isinstance(config_object, dict):
+            return None
+        model = cls()
+        proxies = config_object.get("proxies")
+        if isinstance(proxies, list):
+            records = model.proxies = []
+            proxy_ids = model.proxy_ids
+            # CommentedSeq 继承自 list，直接使用 list 的 C 迭代器，避免经由 ruamel 的逐元素 Python 迭代
+            for position, proxy_node in enumerate(list.__iter__(proxies)):
+                name = proxy_node.get("name") if isinstance(proxy_node, dict) else None
+                if not name:
+                    model.invalid_proxies[position] = proxy_node
+                if isinstance(name, str):
+                    if compact:
+                        name = _intern_name(name)
+                    proxy_ids.setdefault(name, position)
+                records.append(ProxyRecord(name, position))
+        model.has_groups_key = "proxy-groups" in config_object
+        proxy_groups = config_object.get("proxy-groups")
+        if isinstance(proxy_groups, list):
+            model.groups = []
+            encoded_members = {} # id(列表) -> 编码后的数组，多个代理组经别名共用的列表也共用同一个数组
+            for position, group in enumerate(list.__iter__(proxy_groups)):
+                if not isinstance(group, dict):
+                    continue
+                name = group.get("name")
+                if compact and isinstance(name, str):
+                    name = _intern_name(name)
+                members = group.get("proxies")
+                if not isinstance(members, list):
+                    members = None
+                elif compact:
+                    encoded = encoded_members.get(id(members))
+                    if encoded is None:
+                        encoded = encoded_members[id(members)] = model.member_ids(members)
+                    members = encoded
+                model.groups.append(GroupRecord(name, position, members))
+        return model
+
+    def member_ids(self, members):
+        """把代理组的 'proxies' 列表编码为节点编号数组，见 GroupRecord.members。"""
+        proxy_id = self.proxy_ids.get
+        return array("i", [proxy_id(member, -1) if isinstance(member, str) else -1 for member in list.__iter__(members)])
 
 # --- 核心逻辑函数 ---
+class _PendingGroupRemovals:
+    """记录需要从某个代理组成员中移除的落地节点，最后一次性删除。
+
+    discard() 与 list.remove 的语义一致：每次调用移除一个（最靠前的）该节点的成员，
+    成员中已没有该节点时返回 False。计数和查找都在 GroupRecord.members 的整数数组上进行。
+    """
+    __slots__ = ("members", "remaining", "to_remove")
+
+    def __init__(self, members):
+        self.members = members
+        self.remaining = {}
+        self.to_remove = {}
+
+    def discard(self, proxy_id):
+        remaining = self.remaining.get(proxy_id)
+        if remaining is None:
+            remaining = self.members.count(proxy_id)
+        if remaining <= 0:
+            self.remaining[proxy_id] = 0
+            return False
+        self.remaining[proxy_id] = remaining - 1
+        self.to_remove[proxy_id] = self.to_remove.get(proxy_id, 0) + 1
+        return True
+
+    def positions(self):
+        """返回要删除的成员下标，从大到小排列，可依次删除。"""
+        indices = []
+        for proxy_id, count in self.to_remove.items():
+            position = -1
+            for _ in range(count):
+                position = self.members.index(proxy_id, position + 1)
+                indices.append(position)
+        return sorted(indices, reverse=True)
+
 def apply_node_pairs_to_config(config_object, node_pairs_list):
+    """为落地节点设置 dialer-proxy，并把它从同名的前置组中移除。
+
+    先在 NodeModel 上得出修改方案，再按下标写回 config_object；传入的是 NodeModel 时只检查节点对
+    能否应用（返回值与日志相同），不做修改，可直接用于共享的只读模型。
+    """
     logs = [] # Logs specific to this function's execution
     _add_log_entry(logs, "info", f"开始应用 {len(node_pairs_list)} 个节点对到配置中。")
 
-    if not isinstance(config_object, dict):
+    model = NodeModel.from_config(config_object, compact=False)
+    if model is None:
         _add_log_entry(logs, "error", "无效的配置对象：不是一个字典。")
         return False, config_object, logs
+    if model.proxies is None:
+        _add_log_entry(logs, "error", "配置对象中缺少有效的 'proxies' 部分。")
+        return False, config_object, logs
+    if model.has_groups_key and model.groups is None:
+        _add_log_entry(logs, "warn", "配置对象中的 'proxy-groups' 部分无效（不是列表），可能会影响组操作。")
+
+    # 与逐个扫描一致，重名时以第一个出现的为准
+    group_index = {}
+    for group in model.groups or ():
+        if isinstance(group.name, str):
+            group_index.setdefault(group.name, group)
+    dialer_proxies = {} # 节点编号 -> 前置名称
+    # id(成员列表) -> (代理组下标, _PendingGroupRemovals)，最后统一删除；锚点与别名可使多个代理组共用同一个列表
+    pending_group_removals = {}
+
+    applied_count = 0
+    debug_enabled, info_enabled = _log_enabled("debug"), _log_enabled("info") # 循环内的逐条日志在级别关闭时不构造
+    for landing_name, front_name in node_pairs_list:
+        if debug_enabled:
+            _add_log_entry(logs, "debug", f"尝试应用节点对: 落地='{landing_name}', 前置='{front_name}'.")
+
+        proxy_id = model.proxy_ids.get(landing_name)
+        if proxy_id is None:
+            _add_log_entry(logs, "warn", f"节点对中的落地节点 '{landing_name}' 未在 'proxies' 列表中找到，已跳过此对。")
+            continue
+
+        dialer_proxies[proxy_id] = front_name
+        if info_enabled:
+            _add_log_entry(logs, "info", f"成功为落地节点 '{landing_name}' 设置 'dialer-proxy' 为 '{front_name}'.")
+        applied_count += 1
+
+        grp = group_index.get(front_name)
+        if grp is not None:
+            pending = pending_group_removals.get(id(grp.members))
+            if pending is None:
+                members = grp.members
+                if isinstance(members, list): # 只为用到的代理组编码成员
+                    members = model.member_ids(members)
+                pending = (grp.position, _PendingGroupRemovals(members) if members is not None else False)
+                pending_group_removals[id(grp.members)] = pending
+            removals = pending[1]
+            if removals and removals.discard(proxy_id) and info_enabled:
+                _add_log_entry(logs, "info", f"已从前置组 '{front_name}' 的节点列表中移除落地节点 '{landing_name}'。")
+
+    if model is not config_object:
+        proxies = config_object["proxies"]
+        for proxy_id, front_name in dialer_proxies.items():
+            proxies[proxy_id]["dialer-proxy"] = front_name
+        proxy_groups = config_object.get("proxy-groups")
+        for group_position, removals in pending_group_removals.values():
+            if removals:
+                group_proxies_list = proxy_groups[group_position]["proxies"]
+                for i in removals.positions():
+                    del group_proxies_list[i]
+
+    if len(node_pairs_list) > 0:
+        if applied_count == 0:
+            _add_log_entry(logs, "error", "未能应用任何提供的节点对。请检查节点名称是否与订阅中的节点匹配，或查看日志了解详情。")
+            return False, config_object, logs
+        elif applied_count < len(node_pairs_list):
+            failed_count = len(node_pairs_list) - applied_count
+            _add_log_entry(logs, "warn", f"节点对应用部分成功：成功 {applied_count} 个，失败 {failed_count} 个 (共 {len(node_pairs_list)} 个)。失败的节点对因无法匹配而被跳过。请核对节点名称或查看日志。")
+            return False, config_object, logs
+        else:
+            _add_log_entry(logs, "info", f"成功应用所有 {applied_count} 个节点对。")
+            return True, config_object, logs
+    else:
+        _add_log_entry(logs, "info", "没有提供节点对进行应用，配置未修改。")
+        return True, config_object, logs
+
+def _compile_keyword_pattern(keywords):
+    """把一组关键字编译成一个交替正则，匹配小写化后的文本；没有有效关键字时返回 None。
+
+    含英文字母的关键字要求前后不紧邻其他英文字母（如 "US" 不匹配 "RUSSIA"），其余关键字按子串匹配。
+    """
+    alternatives = []
+    for keyword in keywords:
+        if not keyword:
+            continue
+        escaped = re.escape(keyword.lower())
+        if re.search(r'[a-zA-Z]', keyword):
+            alternatives.append(r'(?<![a-zA-Z])' + escaped + r'(?![a-zA-Z])')
+        else:
+            alternatives.append(escaped)
+    if not alternatives:
+        return None
+    return re.compile("|".join(alternatives))
+
+class KeywordMatcher:
+    """由区域关键字配置和落地节点关键字预编译的匹配器，每个区域只有一个正则。"""
+    def __init__(self, region_keyword_config, landing_node_keywords_config):
+        self.landing_pattern = _compile_keyword_pattern(landing_node_keywords_config)
+        self.region_patterns = [
+            (region_def.get("id"), _compile_keyword_pattern(region_def.get("keywords", [])))
+            for region_def in region_keyword_config
+        ]
+        # 查找前置时使用该区域ID第一次出现时的关键字
+        self.dialer_keywords = {}
+        self.dialer_patterns = {}
+        for region_def, (region_id, pattern) in zip(region_keyword_config, self.region_patterns):
+            if region_id not in self.dialer_keywords:
+                self.dialer_keywords[region_id] = region_def.get("keywords", [])
+                self.dialer_patterns[region_id] = pattern
+
+    def is_landing(self, name):
+        return bool(name) and self.landing_pattern is not None and self.landing_pattern.search(str(name).lower()) is not None
+
+    def region_ids(self, name):
+        """返回名称匹配到的所有区域ID（按配置顺序插入的集合）。"""
+        matched = set()
+        if not name:
+            return matched
+        name_lower = str(name).lower()
+        for region_id, pattern in self.region_patterns:
+            if pattern is not None and pattern.search(name_lower):
+                matched.add(region_id)
+        return matched
+
+    def dialer_region_ids(self, name):
+        """返回名称可以作为哪些区域的前置（每个区域ID只按其第一份关键字判断）。"""
+        if not name:
+            return frozenset()
+        name_lower = str(name).lower()
+        return frozenset(
+            region_id for region_id, pattern in self.dialer_patterns.items()
+            if pattern is not None and pattern.search(name_lower)
+        )
+
+@functools.lru_cache(maxsize=8)
+def _cached_keyword_matcher(region_key, landing_key):
+    region_keyword_config = [{"id": region_id, "keywords": list(keywords)} for region_id, keywords in region_key]
+    return KeywordMatcher(region_keyword_config, list(landing_key))
+
+def get_keyword_matcher(region_keyword_config, landing_node_keywords_config):
+    """按关键字配置的内容缓存编译好的匹配器，同一配置只编译一次。"""
+    region_key = tuple(
+        (region_def.get("id"), tuple(region_def.get("keywords", []))) for region_def in region_keyword_config
+    )
+    return _cached_keyword_matcher(region_key, tuple(landing_node_keywords_config))
+
+class RegionIndex:
+    """区域ID -> 可作为前置的代理组 / 节点名称 的倒排索引。
+
+    构建时对节点模型中的代理组与节点各扫描一遍，每个名称只做一次关键字分类；
+    之后为每个落地节点查找前置只需一次字典查询。列表内保持配置中的原始顺序。
+    """
+    def __init__(self, model, matcher):
+        self._groups = {}
+        self._nodes = {}
+        self._node_name_counts = {}
+        regions_by_name = {}
+
+        def regions_of(name):
+            regions = regions_by_name.get(name)
+            if regions is None:
+                regions = regions_by_name[name] = matcher.dialer_region_ids(name)
+            return regions
+
+        for group in model.groups or ():
+            group_name = group.name
+            if not group_name: continue
+            for region_id in regions_of(group_name):
+                self._groups.setdefault(region_id, []).append(group_name)
+        for record in model.proxies:
+            node_name = record.name
+            if not node_name: continue
+            for region_id in regions_of(node_name):
+                self._nodes.setdefault(region_id, []).append(node_name)
+                counts = self._node_name_counts.setdefault(region_id, {})
+                counts[node_name] = counts.get(node_name, 0) + 1
+
+    def front_groups(self, region_id):
+        return self._groups.get(region_id, [])
+
+    def front_nodes(self, region_id, landing_name):
+        """返回该区域中除落地节点自身（按名称）以外的候选节点。"""
+        candidates = self._nodes.get(region_id, [])
+        remaining = len(candidates) - self._node_name_counts.get(region_id, {}).get(landing_name, 0)
+        if remaining == len(candidates):
+            return candidates
+        if remaining == 1:
+            return [next(name for name in candidates if name != landing_name)]
+        if remaining <= 0:
+            return []
+        return [name for name in candidates if name != landing_name]
+
+def perform_auto_detection(config_object, region_keyword_config, landing_node_keywords_config):
+    logs = []
+    _add_log_entry(logs, "info", "开始自动节点对检测。")
+    suggested_pairs = []
+    model = NodeModel.from_config(config_object, compact=False) # 检测不需要代理组成员
+    if model is None:
+        _add_log_entry(logs, "error", "无效的配置对象：不是一个字典。")
+        return [], logs
+    if model.proxies is None:
+        _add_log_entry(logs, "error", "配置对象中缺少有效的 'proxies' 列表，无法进行自动检测。")
+        return [], logs
+    if model.groups is None:
+        _add_log_entry(logs, "warn", "'proxy-groups' 部分缺失或无效，自动检测前置组的功能将受影响。")
+    matcher = get_keyword_matcher(region_keyword_config, landing_node_keywords_config)
+    region_index = RegionIndex(model, matcher)
+    debug_enabled, info_enabled = _log_enabled("debug"), _log_enabled("info") # 循环内的逐条日志在级别关闭时不构造
+    for record in model.proxies:
+        proxy_name = record.name
+        if not proxy_name:
+            if debug_enabled:
+                proxy_node = model.invalid_proxies.get(record.position)
+                if isinstance(proxy_node, dict):
+                    _add_log_entry(logs, "debug", f"跳过 'proxies' 中缺少名称的节点: {proxy_node}")
+                else:
+                    _add_log_entry(logs, "debug", f"跳过 'proxies' 中的无效条目: {proxy_node}")
+            continue
+        if not matcher.is_landing(proxy_name):
+            if debug_enabled:
+                _add_log_entry(logs, "debug", f"节点 '{proxy_name}' 未被识别为落地节点，跳过。")
+            continue
+        if info_enabled:
+            _add_log_entry(logs, "info", f"节点 '{proxy_name}' 被识别为潜在的落地节点。开始为其查找前置...")
+        matched_region_ids = matcher.region_ids(proxy_name)
+        if not matched_region_ids:
+            _add_log_entry(logs, "warn", f"落地节点 '{proxy_name}': 未能识别出任何区域。跳过此节点。")
+            continue
+        if len(matched_region_ids) > 1:
+            _add_log_entry(logs, "error", f"落地节点 '{proxy_name}': 识别出多个区域 {list(matched_region_ids)}，区域不明确。跳过此节点。")
+            continue
+        target_region_id = matched_region_ids.pop()
+        if info_enabled:
+            _add_log_entry(logs, "info", f"落地节点 '{proxy_name}': 成功识别区域ID为 '{target_region_id}'.")
+        if not matcher.dialer_keywords.get(target_region_id):
+            _add_log_entry(logs, "error", f"内部错误：区域ID '{target_region_id}' 未找到对应的关键字列表。跳过落地节点 '{proxy_name}'.")
+            continue
+        found_dialer_name = None
+        if model.groups is not None:
+            matching_groups = region_index.front_groups(target_region_id)
+            if len(matching_groups) == 1:
+                found_dialer_name = matching_groups[0]
+                if info_enabled:
+                    _add_log_entry(logs, "info", f"落地节点 '{proxy_name}': 在区域 '{target_region_id}' 找到唯一匹配的前置组: '{found_dialer_name}'.")
+            elif len(matching_groups) > 1:
+                _add_log_entry(logs, "error", f"落地节点 '{proxy_name}': 在区域 '{target_region_id}' 找到多个匹配的前置组 {matching_groups}，无法自动选择。跳过此节点。")
+                continue
+            elif info_enabled:
+                _add_log_entry(logs, "info", f"落地节点 '{proxy_name}': 在区域 '{target_region_id}' 未找到匹配的前置组。将尝试查找节点。")
+        elif debug_enabled:
+            _add_log_entry(logs, "debug", "跳过查找前置组，因为 'proxy-groups' 缺失或无效。")
+        if not found_dialer_name:
+            matching_nodes = region_index.front_nodes(target_region_id, proxy_name)
+            if len(matching_nodes) == 1:
+                found_dialer_name = matching_nodes[0]
+                if info_enabled:
+                    _add_log_entry(logs, "info", f"落地节点 '{proxy_name}': 在区域 '{target_region_id}' 找到唯一匹配的前置节点: '{found_dialer_name}'.")
+            elif len(matching_nodes) > 1:
+                _add_log_entry(logs, "error", f"落地节点 '{proxy_name}': 在区域 '{target_region_id}' 找到多个匹配的前置节点 {matching_nodes}，无法自动选择。跳过此节点。")
+                continue
+            else:
+                 _add_log_entry(logs, "warn", f"落地节点 '{proxy_name}': 在区域 '{target_region_id}' 也未能找到匹配的前置节点。")
+        if found_dialer_name:
+            suggested_pairs.append({"landing": proxy_name, "front": found_dialer_name})
+            if info_enabled:
+                _add_log_entry(logs, "info", f"成功为落地节点 '{proxy_name}' 自动配置前置为 '{found_dialer_name}'.")
+    _add_log_entry(logs, "info", f"自动节点对检测完成，共找到 {len(suggested_pairs)} 对建议。")
+    if not suggested_pairs and len(model.proxies) > 0:
+        _add_log_entry(logs, "warn", "未自动检测到任何可用的节点对。请检查节点命名是否符合预设的关键字规则，或调整关键字配置。")
+    return suggested_pairs, logs
+
+# --- 上游 HTTP 会话 ---
+def _create_http_session():
+    """创建所有上游订阅请求共享的 requests 会话。
+
+    连接池 (urllib3) 本身是线程安全的，复用 keep-alive 连接可以避免每次请求都重新进行 TCP/TLS 握手。
+    会话不保存任何 Cookie，防止不同用户的订阅请求之间相互影响。
+    """
+    session = requests.Session()
+    session.cookies.set_policy(http.cookiejar.DefaultCookiePolicy(allowed_domains=[]))
+    # 读取超时不重试并原样抛出：否则会被包装成 MaxRetryError -> requests.ConnectionError，无法按超时处理
+    retry = Retry(
+        total=REQUESTS_MAX_RETRIES,
+        read=False,
+        backoff_factor=REQUESTS_RETRY_BACKOFF,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset(["GET", "HEAD"]),
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=REQUESTS_POOL_CONNECTIONS,
+        pool_maxsize=REQUESTS_POOL_MAXSIZE,
+        max_retries=retry,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers['User-Agent'] = 'chain-subconverter/1.0'
+    return session
+
+HTTP_SESSION = _create_http_session()
+
+def _resolve_ssl_verify_value(logs_list_ref):
+    """根据 REQUESTS_SSL_VERIFY 确定上游请求的 verify 参数：True、False 或 CA 证书包路径。"""
+    ssl_verify_value = True # 默认值
+    if REQUESTS_SSL_VERIFY_CONFIG == "false":
+        ssl_verify_value = False
+        _add_log_entry(logs_list_ref, "warn", "警告：SSL证书验证已禁用 (REQUESTS_SSL_VERIFY=false)。这可能存在安全风险。")
+    elif REQUESTS_SSL_VERIFY_CONFIG != "true":
+        # 如果不是 "true" 或 "false"，则假定它是一个 CA bundle 文件的路径
+        if os.path.exists(REQUESTS_SSL_VERIFY_CONFIG):
+            ssl_verify_value = REQUESTS_SSL_VERIFY_CONFIG
+            _add_log_entry(logs_list_ref, "info", f"SSL证书验证将使用自定义CA证书包: {REQUESTS_SSL_VERIFY_CONFIG}")
+        else:
+            _add_log_entry(logs_list_ref, "error", f"自定义CA证书包路径无效: {REQUESTS_SSL_VERIFY_CONFIG}。将回退到默认验证。")
+            # ssl_verify_value 保持 True
+    return ssl_verify_value
+
+def _conditional_request_headers(cached_entry):
+    headers = {'User-Agent': 'chain-subconverter/1.0'} #
+    if cached_entry is not None:
+        if cached_entry.etag:
+            headers['If-None-Match'] = cached_entry.etag
+        if cached_entry.last_modified:
+            headers['If-Modified-Since'] = cached_entry.last_modified
+    return headers
+
+class UpstreamBodyTooLarge(requests.RequestException):
+    """上游响应超过 UPSTREAM_MAX_BYTES。"""
+
+class UpstreamDeadlineExceeded(requests.Timeout):
+    """下载上游响应超过 UPSTREAM_FETCH_DEADLINE。"""
+
+UPSTREAM_CHUNK_SIZE = 64 * 1024
+
+class _UpstreamBody:
+    """逐块收集上游响应体：检查大小上限与总时限，去除首块开头的 UTF-8 BOM，并把数据块转交给增量解析。"""
+    def __init__(self, incremental_parse=None):
+        self._deadline = time.monotonic() + UPSTREAM_FETCH_DEADLINE
+        self._chunks = []
+        self._size = 0
+        self._head = b"" # BOM 判断前暂存的开头几个字节
+        self._incremental_parse = incremental_parse
+
+    def check_declared_length(self, response_headers):
+        # 压缩传输时 Content-Length 是压缩后的大小，此时只按 add() 收到的解压后大小检查上限
+        declared_length = response_headers.get('Content-Length')
+        if UPSTREAM_MAX_BYTES > 0 and declared_length and declared_length.isdigit() and \
+           response_headers.get('Content-Encoding', 'identity') == 'identity' and \
+           int(declared_length) > UPSTREAM_MAX_BYTES:
+            raise UpstreamBodyTooLarge(f"远程订阅大小 ({declared_length} 字节) 超过上限 ({UPSTREAM_MAX_BYTES} 字节)")
+        self.check_deadline()
+
+    def check_deadline(self):
+        if time.monotonic() > self._deadline:
+            raise UpstreamDeadlineExceeded(f"下载远程订阅超过总时限 ({UPSTREAM_FETCH_DEADLINE:g} 秒)")
+
+    def add(self, chunk):
+        self.check_deadline()
+        if not chunk:
+            return
+        self._size += len(chunk)
+        if UPSTREAM_MAX_BYTES > 0 and self._size > UPSTREAM_MAX_BYTES:
+            raise UpstreamBodyTooLarge(f"远程订阅超过大小上限 ({UPSTREAM_MAX_BYTES} 字节)")
+        if self._head is not None:
+            self._head += chunk
+            if len(self._head) < 3:
+                return
+            chunk = self._head[3:] if self._head.startswith(b'\xef\xbb\xbf') else self._head
+            self._head = None
+        self._append(chunk)
+
+    def _append(self, chunk):
+        if chunk:
+            self._chunks.append(chunk)
+            if self._incremental_parse is not None:
+                self._incremental_parse.feed(chunk)
+
+    def finish(self):
+        self.check_deadline()
+        UPSTREAM_BYTES.inc(amount=self._size)
+        if self._head is not None: # 不足 3 字节的响应
+            self._append(self._head)
+            self._head = None
+        if self._incremental_parse is not None:
+            self._incremental_parse.finish()
+        return b"".join(self._chunks)
+
+    def abort(self):
+        if self._incremental_parse is not None:
+            self._incremental_parse.abort()
+
+def _iter_available_chunks(response):
+    """逐次返回已到达的数据，每次至多一次套接字读取，总时限的检查不会被等待凑满大块的读取拖延。
+    按 Content-Encoding (gzip/deflate 等) 解压，每块解压后至多 UPSTREAM_CHUNK_SIZE 字节；
+    urllib3 的异常按 requests.iter_content 的方式转换为 requests 异常。"""
+    try:
+        while True:
+            chunk = response.raw.read1(UPSTREAM_CHUNK_SIZE, decode_content=True)
+            if not chunk:
+                return
+            yield chunk
+    except ReadTimeoutError as e:
+        raise requests.Timeout(e)
+    except ProtocolError as e:
+        raise requests.exceptions.ChunkedEncodingError(e)
+    except DecodeError as e:
+        raise requests.exceptions.ContentDecodingError(e)
+
+def _upstream_get(remote_url, headers, ssl_verify_value, incremental_parse=None):
+    """通过 HTTP_SESSION 流式请求上游，返回 (状态码, 响应头, 已去除 BOM 的内容)；4xx/5xx 抛出 requests.HTTPError。
+
+    超过 UPSTREAM_MAX_BYTES 或 UPSTREAM_FETCH_DEADLINE 时中止下载并关闭连接；
+    提供 incremental_parse 时边下载边解析。
+    """
+    body = _UpstreamBody(incremental_parse)
+    try:
+        started = time.perf_counter()
+        with HTTP_SESSION.get(remote_url, timeout=15, headers=headers, verify=ssl_verify_value, stream=True) as response: # 使用 ssl_verify_value
+            # requests 不单独提供 DNS 解析、建立连接与 TLS 握手的耗时，三者连同上游的处理时间一起计入
+            record_span("upstream_headers", started)
+            response.raise_for_status() #
+            body.check_declared_length(response.headers)
+            started = time.perf_counter()
+            for chunk in _iter_available_chunks(response):
+                body.add(chunk)
+            record_span("upstream_download", started)
+            return response.status_code, response.headers, body.finish()
+    except BaseException:
+        body.abort()
+        raise
+
+class _IncrementalParseAborted(Exception):
+    pass
+
+class IncrementalParse:
+    """边下载边解析：下载方通过 feed()/finish() 送入数据块，解析线程把它们当作文件读取，
+    下载等待网络的时间与解析的 CPU 时间得以重叠。
+
+    只做所选模式的一次解析，不含 parse_subscription 的回退逻辑；result() 返回 None 时由调用方对完整内容重新解析。
+    解析线程在收到第一个数据块时才启动。
+    """
+    _END = object()
+    _ABORT = object()
+
+    def __init__(self, parse_mode):
+        self.parse_mode = parse_mode
+        self._trace = CURRENT_TRACE.get() # 解析线程不继承请求的上下文
+        self._chunks = queue.SimpleQueue()
+        self._buffer = bytearray()
+        self._eof = False
+        self._thread = None
+        self._config_object = None
+        self._error = None
+
+    def feed(self, chunk):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="incremental-parse", daemon=True)
+            self._thread.start()
+        self._chunks.put(chunk)
+
+    def finish(self):
+        self._chunks.put(self._END)
+
+    def abort(self):
+        self._chunks.put(self._ABORT)
+
+    def _fill(self):
+        item = self._chunks.get()
+        if item is self._END:
+            self._eof = True
+        elif item is self._ABORT:
+            raise _IncrementalParseAborted()
+        else:
+            self._buffer += item
+
+    def read(self, size=-1):
+        """供 YAML 解析器调用的文件接口：有数据时立即返回，不等待凑满 size。"""
+        if size is None or size < 0:
+            while not self._eof:
+                self._fill()
+            size = len(self._buffer)
+        elif not self._buffer and not self._eof:
+            self._fill()
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+    def _run(self):
+        started = time.perf_counter()
+        try:
+            if self.parse_mode == PARSE_MODE_NAMES:
+                self._config_object = extract_proxy_names(self)
+            elif self.parse_mode == PARSE_MODE_SAFE:
+                self._config_object = get_safe_yaml().load(self)
+            else:
+                self._config_object = get_yaml().load(self)
+            # 包含等待下载的时间，单独记录以免与完整解析的耗时混在一起
+            elapsed = time.perf_counter() - started
+            STAGE_SECONDS.observe(elapsed, f"parse_{self.parse_mode}_incremental")
+            if self._trace is not None:
+                self._trace.add_span(f"parse_{self.parse_mode}_incremental", started, elapsed)
+        except _IncrementalParseAborted:
+            pass
+        except Exception as e:
+            self._error = e
+            # 继续读取直到下载结束，确保下载方不会因为解析提前失败而阻塞或残留数据
+            try:
+                while not self._eof:
+                    self._fill()
+                    self._buffer.clear()
+            except _IncrementalParseAborted:
+                pass
+
+    def result(self, logs_list_ref):
+        """等待解析线程结束，返回解析出的对象；解析失败或未启动时返回 None。"""
+        if self._thread is None:
+            return None
+        self._thread.join()
+        if self._error is not None:
+            _add_log_entry(logs_list_ref, "debug", f"边下载边解析失败，改为对完整内容重新解析: {self._error}")
+        return self._config_object
+
+# --- 节点/代理组名称提取 ---
+class _NamesExtractionUnsupported(Exception):
+    """文档使用了名称提取不处理的结构（别名、合并键、显式标签、非字符串名称等），需要完整解析。"""
+
+_STR_TAG = "tag:yaml.org,2002:str"
+
+def _skip_yaml_node(events, event):
+    """跳过以 event 开始的整个节点，只消费事件，不构建任何对象。"""
+    depth = 0
+    while True:
+        event_type = type(event)
+        if event_type is MappingStartEvent or event_type is SequenceStartEvent:
+            depth += 1
+        elif event_type is MappingEndEvent or event_type is SequenceEndEvent:
+            depth -= 1
+        if depth == 0:
+            return
+        event = next(events)
+
+def _extract_str(events, event, resolver):
+    """返回标量在 safe 加载下的字符串值；不是字符串（数字、null 等）或带有标签时交由完整解析处理。"""
+    if type(event) is not ScalarEvent or event.tag is not None:
+        raise _NamesExtractionUnsupported()
+    if event.implicit[0] and resolver.resolve(ScalarNode, event.value, (True, False)) != _STR_TAG:
+        raise _NamesExtractionUnsupported()
+    return event.value
+
+def _extract_fields(events, resolver, field_extractors):
+    """读取一个映射（MappingStartEvent 之后的事件），只构建 field_extractors 中列出的键，其余值直接跳过。"""
+    fields = {}
+    seen_keys = set()
+    while True:
+        event = next(events)
+        if type(event) is MappingEndEvent:
+            return fields
+        if type(event) is not ScalarEvent or event.tag is not None:
+            raise _NamesExtractionUnsupported()
+        key = event.value
+        if key in seen_keys or (key == "<<" and event.implicit[0]):
+            raise _NamesExtractionUnsupported()
+        seen_keys.add(key)
+        value_event = next(events)
+        extractor = field_extractors.get(key)
+        if extractor is None:
+            _skip_yaml_node(events, value_event)
+        else:
+            fields[key] = extractor(events, value_event, resolver)
+
+def _sequence_extractor(item_extractor):
+    def extract(events, event, resolver):
+        if type(event) is not SequenceStartEvent or event.tag is not None:
+            raise _NamesExtractionUnsupported()
+        items = []
+        while True:
+            event = next(events)
+            if type(event) is SequenceEndEvent:
+                return items
+            items.append(item_extractor(events, event, resolver))
+    return extract
+
+def _mapping_item_extractor(field_extractors, required_field=None):
+    """列表项为映射时只提取指定字段；为标量时按原样保留（供检测日志输出无效条目）。"""
+    def extract(events, event, resolver):
+        if type(event) is ScalarEvent:
+            return _extract_str(events, event, resolver)
+        if type(event) is not MappingStartEvent or event.tag is not None:
+            raise _NamesExtractionUnsupported()
+        fields = _extract_fields(events, resolver, field_extractors)
+        if required_field and not fields.get(required_field):
+            # 缺少名称的节点会被完整输出到检测日志中，需要完整解析
+            raise _NamesExtractionUnsupported()
+        return fields
+    return extract
+
+_NAMES_FIELD_EXTRACTORS = {
+    "proxies": _sequence_extractor(_mapping_item_extractor({"name": _extract_str}, required_field="name")),
+    "proxy-groups": _sequence_extractor(_mapping_item_extractor({
+        "name": _extract_str,
+        "proxies": _sequence_extractor(_extract_str),
+    })),
+}
+
+def extract_proxy_names(content):
+    """基于 YAML 事件流只提取 proxies[].name 与 proxy-groups[].name/proxies，返回 NodeModel。
+
+    rules、rule-providers 等其它部分只消费事件而不构建节点。文档中出现提取器不处理的结构时
+    抛出 _NamesExtractionUnsupported，由调用方改用完整解析。
+    """
+    safe_yaml = get_safe_yaml()
+    resolver = safe_yaml.resolver
+    events = safe_yaml.parse(content)
+    try:
+        if type(next(events)) is not StreamStartEvent:
+            raise _NamesExtractionUnsupported()
+        event = next(events)
+        if type(event) is not DocumentStartEvent or event.version is not None:
+            raise _NamesExtractionUnsupported()
+        event = next(events)
+        if type(event) is not MappingStartEvent or event.tag is not None:
+            raise _NamesExtractionUnsupported()
+        config_object = _extract_fields(events, resolver, _NAMES_FIELD_EXTRACTORS)
+        if type(next(events)) is not DocumentEndEvent or type(next(events)) is not StreamEndEvent:
+            raise _NamesExtractionUnsupported() # 多文档
+        return NodeModel.from_config(config_object)
+    finally:
+        events.close()
+
+# --- 远程订阅缓存 ---
+_SHARED_YAML_ATTRIBUTES = (Format.attrib, LineCol.attrib, Anchor.attrib, Tag.attrib)
+
+def _copy_yaml_attributes(source, target):
+    # 格式、行列号、锚点和标签在处理过程中不会被修改，直接共享；
+    # 注释会随列表元素的增删调整下标，且注释 token 在输出时会被重置状态，必须为每个副本单独复制。
+    for attrib in _SHARED_YAML_ATTRIBUTES:
+        value = getattr(source, attrib, None)
+        if value is not None:
+            setattr(target, attrib, value)
+    comment = getattr(source, Comment.attrib, None)
+    if comment is not None:
+        setattr(target, Comment.attrib, copy.deepcopy(comment))
+
+def clone_config(node, memo=None):
+    """深拷贝解析后的配置树，供缓存的只读配置派生出可修改的副本。
+
+    不使用 copy.deepcopy：ruamel 的 CommentedSeq.__deepcopy__ 每追加一个元素都会重新复制一遍属性，
+    对数千个节点的列表是平方复杂度，并且会丢失锚点与合并键 (<<) 的关联。
+    这里每个容器只复制一次属性，共享引用在副本中仍然共享，合并键按原样重建；标量均为不可变对象，直接复用。
+    """
+    if memo is None:
+        memo = {}
+    existing = memo.get(id(node))
+    if existing is not None:
+        return existing
+    if isinstance(node, CommentedMap):
+        result = node.__class__()
+        memo[id(node)] = result
+        for key in node:
+            if key in node._ok:
+                result[key] = clone_config(node[key], memo)
+        merges = getattr(node, merge_attrib, None)
+        if merges:
+            result.add_yaml_merge([(position, clone_config(merged, memo)) for position, merged in merges])
+        _copy_yaml_attributes(node, result)
+        return result
+    if isinstance(node, CommentedSeq):
+        result = node.__class__()
+        memo[id(node)] = result
+        for item in node:
+            result.append(clone_config(item, memo))
+        _copy_yaml_attributes(node, result)
+        return result
+    if type(node) is dict:
+        result = {}
+        memo[id(node)] = result
+        for key, value in node.items():
+            result[key] = clone_config(value, memo)
+        return result
+    if type(node) is list:
+        result = []
+        memo[id(node)] = result
+        for item in node:
+            result.append(clone_config(item, memo))
+        return result
+    if isinstance(node, (str, int, float, bool, type(None), datetime.date)):
+        return node
+    return copy.deepcopy(node, memo)
+
+class SubscriptionCacheEntry:
+    """一份远程订阅的原始内容及其按解析模式缓存的解析结果。解析结果只读，需要修改时先 clone_config。"""
+    __slots__ = ("url", "content", "content_hash", "parsed", "etag", "last_modified", "fetched_at", "_parse_lock")
+
+    def __init__(self, url, content, etag=None, last_modified=None):
+        self.url = url
+        self.content = content
+        self.content_hash = hashlib.sha256(content).hexdigest()
+        self.parsed = {} # 解析模式 -> 配置对象
+        self.etag = etag
+        self.last_modified = last_modified
+        self.fetched_at = time.monotonic()
+        self._parse_lock = threading.Lock()
+
+    @property
+    def size(self):
+        return len(self.content)
+
+    def age(self):
+        return time.monotonic() - self.fetched_at
+
+    def get_config(self, parse_mode, logs_list_ref):
+        """返回指定模式的解析结果，首次请求该模式时解析并保存；内容无效时返回 None。"""
+        config_object = self.parsed.get(parse_mode)
+        if config_object is not None:
+            return config_object
+        with self._parse_lock:
+            config_object = self.parsed.get(parse_mode)
+            if config_object is None:
+                config_object = parse_subscription(self.content, parse_mode, logs_list_ref)
+                if config_object is not None:
+                    self.parsed[parse_mode] = config_object
+                    if self.url is not None:
+                        DISK_SUBSCRIPTION_STORE.save_snapshot(self, parse_mode)
+        return config_object
 
-    proxies = config_object.get("proxies")
-    proxy_groups = config_object.get("proxy-groups")
+def parse_subscription(content, parse_mode, logs_list_ref):
+    """按解析模式解析订阅内容，校验其包含 'proxies' 列表；失败时记录日志并返回 None。"""
+    with timed_stage(f"parse_{parse_mode}"):
+        return _parse_subscription(content, parse_mode, logs_list_ref)
+
+def _parse_subscription(content, parse_mode, logs_list_ref):
+    if parse_mode == PARSE_MODE_NAMES:
+        try:
+            config_object = extract_proxy_names(content)
+        except _NamesExtractionUnsupported:
+            _add_log_entry(logs_list_ref, "debug", "订阅中包含名称提取不支持的结构，改用 safe 模式完整解析。")
+            parse_mode = PARSE_MODE_SAFE
+        except Exception:
+            pass # 语法错误等由完整解析给出错误信息
+        else:
+            return _validated_subscription(config_object, logs_list_ref)
+        # 完整解析后只保留节点模型，完整的配置树随即释放
+        return NodeModel.from_config(_parse_subscription(content, PARSE_MODE_SAFE, logs_list_ref))
+    try:
+        if parse_mode == PARSE_MODE_SAFE:
+            try:
+                config_object = get_safe_yaml().load(content)
+            except Exception as e:
+                # safe 加载器不认识的自定义标签等，回退到 round-trip 解析
+                _add_log_entry(logs_list_ref, "debug", f"safe 模式解析失败，回退到 round-trip 模式: {e}")
+                config_object = get_yaml().load(content)
+        else:
+            config_object = get_yaml().load(content) #
+    except Exception as e:
+        _add_log_entry(logs_list_ref, "error", f"处理远程订阅内容时出错 (URL provided): {e}", e) #
+        return None
+    return _validated_subscription(config_object, logs_list_ref)
+
+def _validated_subscription(config_object, logs_list_ref):
+    if isinstance(config_object, NodeModel):
+        valid = config_object.proxies is not None
+    else:
+        valid = isinstance(config_object, dict) and isinstance(config_object.get("proxies"), list)
+    if not valid: #
+        _add_log_entry(logs_list_ref, "error", "远程YAML格式无效或缺少 'proxies' 列表。") #
+        return None
+    _add_log_entry(logs_list_ref, "debug", "远程配置解析成功。") #
+    return config_object
+
+class LRUByteCache:
+    """按总字节数限制容量的 LRU 缓存（线程安全）。条目的字节数由调用方在写入时给出。"""
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict() # key -> (value, size)
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    @property
+    def total_bytes(self):
+        return self._total_bytes
+
+    def get(self, key):
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            self._entries.move_to_end(key)
+            return item[0]
+
+    def put(self, key, value, size):
+        if not self.enabled or size > self.max_bytes:
+            return
+        with self._lock:
+            old_item = self._entries.pop(key, None)
+            if old_item is not None:
+                self._total_bytes -= old_item[1]
+            self._entries[key] = (value, size)
+            self._total_bytes += size
+            while self._total_bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_size
+
+class SubscriptionCache(LRUByteCache):
+    """按 remote_url 缓存远程订阅的原始内容与解析结果（进程级共享，线程安全）。
+
+    条目在 TTL 内视为新鲜；过期条目仍保留其校验信息 (ETag/Last-Modified)，
+    供下一次请求发起条件请求，上游返回 304 时直接复用已解析的配置。
+    所有条目原始内容的总字节数超过上限时按 LRU 顺序淘汰。
+    """
+    def __init__(self, ttl, max_bytes):
+        super().__init__(max_bytes)
+        self.ttl = ttl
+
+    def is_fresh(self, entry):
+        return entry.age() < self.ttl
+
+    def put(self, entry):
+        super().put(entry.url, entry, entry.size)
+
+    def revalidated(self, entry, etag=None, last_modified=None):
+        """上游返回 304 后刷新条目的时间戳和校验信息。"""
+        with self._lock:
+            if etag:
+                entry.etag = etag
+            if last_modified:
+                entry.last_modified = last_modified
+            entry.fetched_at = time.monotonic()
+
+SUBSCRIPTION_CACHE = SubscriptionCache(SUBSCRIPTION_CACHE_TTL, SUBSCRIPTION_CACHE_MAX_BYTES)
+METRICS.register(CallbackGauge(
+    "chain_subscription_cache_bytes", "Raw subscription bytes held in the subscription cache.", lambda: SUBSCRIPTION_CACHE.total_bytes))
+
+# --- 订阅磁盘缓存 ---
+class DiskSubscriptionStore:
+    """把订阅缓存条目持久化到磁盘，服务重启后预热 SUBSCRIPTION_CACHE，避免所有客户端同时回源。
+
+    每个订阅以 sha256(url) 为文件名前缀保存三类文件：
+    <前缀>.body 为原始内容；<前缀>.meta.json 为 url、ETag/Last-Modified、内容哈希与获取时间；
+    <前缀>.<解析模式>.pickle 为解析结果快照 (内容哈希, 配置对象)，冷启动时无需重新解析 YAML。
+    加载时按内容哈希校验三者一致。所有写入在后台线程中进行，先写临时文件再 os.replace，进程中途退出也不会留下半个文件；
+    总大小超过上限时按最后写入时间淘汰最旧的订阅。快照使用 pickle，缓存目录只应由本服务写入。
+    """
+    FORMAT_VERSION = 1
+    SNAPSHOT_MODES = (PARSE_MODE_ROUNDTRIP, PARSE_MODE_SAFE, PARSE_MODE_NAMES)
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._tasks = queue.SimpleQueue()
+        self._writer = None
+        self._index = None # 前缀 -> [总字节数, 最后写入时间]，由写入线程在首次写入时建立
+        self._written_snapshots = set() # (前缀, 解析模式, 内容哈希)，避免重复写入同一快照
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    @staticmethod
+    def _prefix(url):
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _path(self, prefix, suffix):
+        return os.path.join(self.directory, f"{prefix}.{suffix}")
+
+    def _submit(self, task, *args):
+        if not self.enabled:
+            return
+        with self._lock:
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run_writer, name="disk-cache-writer", daemon=True)
+                self._writer.start()
+        self._tasks.put((task, args))
+
+    def save(self, entry):
+        """保存新获取的条目：原始内容、元数据以及已有的解析结果快照。"""
+        self._submit(self._write_entry, entry)
+        for parse_mode in list(entry.parsed):
+            self.save_snapshot(entry, parse_mode)
+
+    def save_metadata(self, entry):
+        """条目经上游重新验证后只更新元数据（获取时间与校验信息）。"""
+        self._submit(self._write_metadata, entry)
+
+    def save_snapshot(self, entry, parse_mode):
+        self._submit(self._write_snapshot, entry, parse_mode)
+
+    def _run_writer(self):
+        while True:
+            task, args = self._tasks.get()
+            try:
+                if self._index is None:
+                    os.makedirs(self.directory, exist_ok=True)
+                    self._index = self._scan()
+                prefix = self._prefix(args[0].url)
+                if task(prefix, *args):
+                    self._update_index(prefix)
+                    self._evict()
+            except Exception as e:
+                logger.warning(f"写入订阅磁盘缓存失败: {e}")
+
+    def _atomic_write(self, path, data):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.unlink(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _write_entry(self, prefix, entry):
+        self._atomic_write(self._path(prefix, "body"), entry.content)
+        return self._write_metadata(prefix, entry)
+
+    def _write_metadata(self, prefix, entry):
+        metadata = {
+            "version": self.FORMAT_VERSION,
+            "url": entry.url,
+            "etag": entry.etag,
+            "last_modified": entry.last_modified,
+            "content_hash": entry.content_hash,
+            "fetched_at": time.time() - entry.age(), # 单调时钟不能跨进程使用，转换为墙上时间
+        }
+        self._atomic_write(self._path(prefix, "meta.json"), json.dumps(metadata, ensure_ascii=False).encode("utf-8"))
+        return True
+
+    def _write_snapshot(self, prefix, entry, parse_mode):
+        snapshot_key = (prefix, parse_mode, entry.content_hash)
+        config_object = entry.parsed.get(parse_mode)
+        if config_object is None or parse_mode not in self.SNAPSHOT_MODES or snapshot_key in self._written_snapshots:
+            return False
+        data = pickle.dumps((self.FORMAT_VERSION, entry.content_hash, config_object), protocol=pickle.HIGHEST_PROTOCOL)
+        self._atomic_write(self._path(prefix, f"{parse_mode}.pickle"), data)
+        self._written_snapshots.add(snapshot_key)
+        return True
+
+    def _files_of(self, prefix):
+        return [self._path(prefix, suffix) for suffix in
+                ("body", "meta.json") + tuple(f"{parse_mode}.pickle" for parse_mode in self.SNAPSHOT_MODES)]
+
+    def _scan(self):
+        index = {}
+        for file_name in os.listdir(self.directory):
+            prefix, _, _ = file_name.partition(".")
+            if prefix and prefix not in index and not file_name.startswith(".tmp-"):
+                index[prefix] = None
+        for prefix in list(index):
+            index[prefix] = self._measure(prefix)
+        return index
+
+    def _measure(self, prefix):
+        total_bytes, last_write = 0, 0.0
+        for path in self._files_of(prefix):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            total_bytes += stat.st_size
+            last_write = max(last_write, stat.st_mtime)
+        return [total_bytes, last_write]
+
+    def _update_index(self, prefix):
+        self._index[prefix] = self._measure(prefix)
+
+    def _evict(self):
+        total_bytes = sum(size for size, _ in self._index.values())
+        for prefix, (size, _) in sorted(self._index.items(), key=lambda item: item[1][1]):
+            if total_bytes <= self.max_bytes:
+                break
+            self._remove(prefix)
+            total_bytes -= size
+
+    def _remove(self, prefix):
+        for path in self._files_of(prefix):
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass
+        self._index.pop(prefix, None)
+        self._written_snapshots = {key for key in self._written_snapshots if key[0] != prefix}
+
+    def load_entries(self):
+        """读取磁盘上的全部条目，按获取时间从旧到新返回；损坏或不一致的文件被忽略。"""
+        if not self.enabled or not os.path.isdir(self.directory):
+            return []
+        entries = []
+        now_wall, now_monotonic = time.time(), time.monotonic()
+        for file_name in os.listdir(self.directory):
+            if not file_name.endswith(".meta.json"):
+                continue
+            prefix = file_name[:-len(".meta.json")]
+            try:
+                with open(self._path(prefix, "meta.json"), "rb") as f:
+                    metadata = json.loads(f.read())
+                if metadata.get("version") != self.FORMAT_VERSION:
+                    continue
+                with open(self._path(prefix, "body"), "rb") as f:
+                    entry = SubscriptionCacheEntry(metadata["url"], f.read(), metadata.get("etag"), metadata.get("last_modified"))
+                if entry.content_hash != metadata.get("content_hash"):
+                    continue # 写入内容后、写入元数据前进程退出
+                entry.fetched_at = now_monotonic - max(0.0, now_wall - metadata["fetched_at"])
+            except (OSError, ValueError, KeyError, TypeError) as e:
+                logger.warning(f"忽略无法读取的订阅磁盘缓存 {prefix}: {e}")
+                continue
+            for parse_mode in self.SNAPSHOT_MODES:
+                snapshot_path = self._path(prefix, f"{parse_mode}.pickle")
+                if not os.path.exists(snapshot_path):
+                    continue
+                try:
+                    with open(snapshot_path, "rb") as f:
+                        version, content_hash, config_object = pickle.load(f)
+                except Exception as e:
+                    logger.warning(f"忽略无法读取的订阅解析快照 {prefix}.{parse_mode}: {e}")
+                    continue
+                if version == self.FORMAT_VERSION and content_hash == entry.content_hash:
+                    entry.parsed[parse_mode] = config_object
+                    self._written_snapshots.add((prefix, parse_mode, content_hash))
+            entries.append(entry)
+        entries.sort(key=lambda entry: entry.fetched_at)
+        return entries
+
+    def warm(self, subscription_cache):
+        """启动时把磁盘上的条目加载到内存缓存，返回 (条目数, 快照数)。过期条目仍可用于条件请求与过期后台刷新。"""
+        entries = self.load_entries()
+        for entry in entries:
+            subscription_cache.put(entry)
+        return len(entries), sum(len(entry.parsed) for entry in entries)
+
+DISK_SUBSCRIPTION_STORE = DiskSubscriptionStore(DISK_CACHE_DIR, DISK_CACHE_MAX_BYTES)
+
+# --- 渲染结果缓存 ---
+# 输出格式变化时修改此值，使旧的 ETag 失效
+RENDER_FORMAT_VERSION = "1"
+
+def render_cache_key(content_hash, node_pairs_list):
+    """渲染结果由上游内容与节点对（含顺序）唯一确定。"""
+    return (content_hash, tuple(node_pairs_list))
+
+def render_etag(render_key):
+    """由缓存键计算强 ETag，无需先渲染即可响应条件请求。"""
+    content_hash, node_pairs = render_key
+    digest = hashlib.sha256()
+    digest.update(RENDER_FORMAT_VERSION.encode("utf-8"))
+    digest.update(content_hash.encode("ascii"))
+    digest.update(json.dumps(node_pairs, ensure_ascii=False).encode("utf-8"))
+    return f'"{digest.hexdigest()[:32]}"'
+
+def etag_matches(if_none_match, etag):
+    """按 If-None-Match 的弱比较规则判断 etag 是否命中；压缩版本的 ETag 与未压缩的视为同一内容。"""
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        for suffix in ENCODING_ETAG_SUFFIXES.values():
+            if candidate.endswith(suffix + '"'):
+                candidate = candidate[:-len(suffix) - 1] + '"'
+                break
+        if candidate == etag:
+            return True
+    return False
+
+RENDER_CACHE = LRUByteCache(RENDER_CACHE_MAX_BYTES)
+METRICS.register(CallbackGauge(
+    "chain_render_cache_bytes", "Rendered YAML bytes held in the render cache.", lambda: RENDER_CACHE.total_bytes))
+
+# --- 响应压缩 ---
+GZIP_LEVEL = 6
+BROTLI_STATIC_QUALITY = 11 # 前端文件只在启动时压缩一次，使用最高压缩率
+BROTLI_DYNAMIC_QUALITY = 5 # 订阅与 JSON 响应在请求时压缩，兼顾速度
+ENCODING_ETAG_SUFFIXES = {"br": "-br", "gzip": "-gzip"}
+
+def negotiate_encoding(accept_encoding):
+    """按 Accept-Encoding（含 q 值）选择响应编码：优先 br，其次 gzip；均不可用时返回 None（不压缩）。"""
+    if not RESPONSE_COMPRESSION or not accept_encoding:
+        return None
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.partition(";")
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key.lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name.strip().lower()] = quality
+    wildcard = accepted.get("*", 0.0)
+    for encoding in ("br", "gzip") if brotli is not None else ("gzip",):
+        if accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+def compress_body(body, encoding, static=False):
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_STATIC_QUALITY if static else BROTLI_DYNAMIC_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+def encoded_etag(etag, encoding):
+    """同一内容的不同编码是不同的响应体，强 ETag 需要区分：在引号内追加编码后缀。"""
+    if etag is None or encoding is None:
+        return etag
+    return etag[:-1] + ENCODING_ETAG_SUFFIXES[encoding] + '"'
+
+class StreamCompressor:
+    """分块输出时逐块压缩；sync=True 时立即输出已写入数据的压缩结果，客户端无需等待后续数据即可解压。"""
+    def __init__(self, encoding):
+        self.encoding = encoding
+        if encoding == "br":
+            self._compressor = brotli.Compressor(quality=BROTLI_DYNAMIC_QUALITY)
+        else:
+            self._compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS) # gzip 格式
+
+    def compress(self, data, sync=False):
+        if self.encoding == "br":
+            return self._compressor.process(data) + (self._compressor.flush() if sync else b"")
+        return self._compressor.compress(data) + (self._compressor.flush(zlib.Z_SYNC_FLUSH) if sync else b"")
+
+    def finish(self):
+        if self.encoding == "br":
+            return self._compressor.finish()
+        return self._compressor.flush()
+
+# --- 静态文件 ---
+STATIC_ALLOWED_EXTENSIONS = {'.html', '.js', '.css', '.ico'}
+PRELOADED_STATIC_FILES = ("frontend.html", "script.js", "favicon.ico")
+
+class StaticAssetError(Exception):
+    """静态文件不可访问。status 为返回给客户端的 HTTP 状态码。"""
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+class StaticAsset:
+    """加载并预处理好的静态文件：内容、ETag 与各编码的响应体。"""
+    __slots__ = ("file_path", "etag", "variants")
+
+    def __init__(self, file_path, body):
+        self.file_path = file_path
+        self.etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+        self.variants = {None: body}
+        if len(body) >= COMPRESSION_MIN_BYTES:
+            for encoding in ("br", "gzip") if brotli is not None else ("gzip",):
+                compressed = compress_body(body, encoding, static=True)
+                if len(compressed) < len(body):
+                    self.variants[encoding] = compressed
+
+    def body_for(self, encoding):
+        """返回 (实际使用的编码, 响应体)；该编码没有更小的版本时返回未压缩内容。"""
+        if encoding in self.variants:
+            return encoding, self.variants[encoding]
+        return None, self.variants[None]
+
+def _inject_frontend_config(content):
+    logger.debug(f"Modifying frontend.html to inject SHOW_SERVICE_ADDRESS_CONFIG: {SHOW_SERVICE_ADDRESS_CONFIG_ENV}")
+    html_content_str = content.decode('utf-8')
+    js_config_script = f"<script>window.SHOW_SERVICE_ADDRESS_CONFIG = {str(SHOW_SERVICE_ADDRESS_CONFIG_ENV).lower()};</script>"
+    # Insert before closing </head> tag
+    insertion_point = html_content_str.find("</head>")
+    if insertion_point != -1:
+        html_content_str = html_content_str[:insertion_point] + js_config_script + html_content_str[insertion_point:]
+    else:
+        logger.warning("</head> tag not found in frontend.html, config script not injected near head. Trying before body.")
+        insertion_point_body = html_content_str.find("<body")
+        if insertion_point_body != -1: # find opening body tag
+             # find where that tag ends
+            end_of_body_tag = html_content_str.find(">",insertion_point_body)
+            if end_of_body_tag != -1:
+                 html_content_str = html_content_str[:end_of_body_tag+1] + js_config_script + html_content_str[end_of_body_tag+1:]
+            else: # fallback if body tag is weirdly formatted
+                 html_content_str = js_config_script + html_content_str # prepend
+        else: # ultimate fallback
+            html_content_str = js_config_script + html_content_str # prepend
+    return html_content_str.encode('utf-8')
+
+class StaticAssetStore:
+    """前端文件在首次访问（或启动预加载）时读取、注入配置并压缩，之后直接从内存返回。
+
+    文件内容在进程运行期间视为不变（与 SHOW_SERVICE_ADDRESS_CONFIG 一样，修改后需重启服务）。
+    加载失败不缓存，文件补上后下一次请求即可成功。
+    """
+    def __init__(self, directory):
+        self.directory = directory
+        self._assets = {}
+        self._lock = threading.Lock()
+
+    def get(self, file_name):
+        asset = self._assets.get(file_name)
+        if asset is not None:
+            return asset
+        with self._lock:
+            asset = self._assets.get(file_name)
+            if asset is None:
+                asset = self._load(file_name)
+                self._assets[file_name] = asset
+            return asset
+
+    def _load(self, file_name):
+        file_path = os.path.join(self.directory, file_name)
+        normalized_script_dir = os.path.normcase(os.path.normpath(self.directory))
+        normalized_file_path = os.path.normcase(os.path.normpath(os.path.realpath(file_path)))
+        if not normalized_script_dir.endswith(os.sep):
+            normalized_script_dir += os.sep
+        if not normalized_file_path.startswith(normalized_script_dir):
+            logger.warning(f"禁止访问：尝试访问脚本目录之外的文件: {file_path}")
+            raise StaticAssetError(f"禁止访问: {file_name}", 403)
+        ext = os.path.splitext(file_path)[1].lower()
+        if ext not in STATIC_ALLOWED_EXTENSIONS:
+            logger.warning(f"禁止访问：不允许的文件类型 {ext} 对于路径 {file_path}")
+            raise StaticAssetError(f"文件类型 {ext} 不允许访问", 403)
+        if not os.path.exists(file_path) or not os.path.isfile(file_path):
+            logger.warning(f"静态文件未找到或不是一个文件: {file_path}")
+            raise StaticAssetError(f"资源未找到: {file_name}", 404)
+        with open(file_path, "rb") as f:
+            content = f.read()
+        if file_name == "frontend.html":
+            content = _inject_frontend_config(content)
+        asset = StaticAsset(file_path, content)
+        logger.debug(f"已加载静态文件 {file_path}: {len(content)} 字节，预压缩版本: {', '.join(f'{encoding} {len(body)} 字节' for encoding, body in asset.variants.items() if encoding) or '无'}")
+        return asset
+
+    def preload(self, file_names):
+        for file_name in file_names:
+            try:
+                self.get(file_name)
+            except (StaticAssetError, OSError, UnicodeDecodeError) as e:
+                logger.warning(f"预加载静态文件 {file_name} 失败，将在首次请求时重试: {e}")
+
+STATIC_ASSETS = StaticAssetStore(os.path.dirname(os.path.abspath(__file__)))
+
+# --- 并发请求合并 (single-flight) ---
+class SingleFlightTimeout(Exception):
+    pass
+
+class _FlightCall:
+    __slots__ = ("done", "result", "error", "waiters")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.waiters = 0
+
+class SingleFlight:
+    """将同一 key 的并发调用合并为一次执行。
+
+    第一个调用者执行函数，其余调用者等待并共享其结果或异常。
+    do() 返回 (结果, shared)，shared 表示该结果是否被多个调用者共享。
+    """
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, timeout=None):
+        with self._lock:
+            call = self._calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = _FlightCall()
+                self._calls[key] = call
+            else:
+                call.waiters += 1
+
+        if is_leader:
+            try:
+                call.result = fn()
+            except BaseException as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                call.done.set()
+        elif not call.done.wait(timeout):
+            raise SingleFlightTimeout(key)
+
+        if call.error is not None:
+            raise call.error
+        return call.result, (call.waiters > 0 or not is_leader)
+
+SUBSCRIPTION_FETCH_FLIGHT = SingleFlight()
+
+# --- 准入控制 ---
+class AdmissionRejected(Exception):
+    """等待队列已满或排队超时。retry_after 为建议客户端重试前等待的秒数。"""
+    def __init__(self, reason, retry_after):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+class _AdmissionWaiter:
+    __slots__ = ("notify", "granted")
+
+    def __init__(self, notify):
+        self.notify = notify
+        self.granted = False
+
+class AdmissionController:
+    """并发上限 + 有界 FIFO 等待队列。
+
+    线程通过 acquire()/release() 使用，asyncio 服务模式下使用 acquire_async()，两者共享同一组名额。
+    名额释放时直接转交给队首的等待者。max_active <= 0 表示不限制并发，仅做统计。
+    """
+    def __init__(self, max_active, max_queue=None, queue_timeout=None):
+        self.max_active = max_active
+        self.max_queue = max_queue # None 表示不限制排队数
+        self.queue_timeout = queue_timeout
+        self.active = 0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def queue_depth(self):
+        return len(self._waiters)
+
+    @property
+    def retry_after(self):
+        return max(1, math.ceil(self.queue_timeout or 1))
+
+    def _admit_or_enqueue(self, notify):
+        """在锁内调用：能立即获得名额时返回 None，否则返回排队中的等待者；队列已满时抛出 AdmissionRejected。"""
+        if self.max_active <= 0 or (self.active < self.max_active and not self._waiters):
+            self.active += 1
+            self.admitted += 1
+            return None
+        if self.max_queue is not None and len(self._waiters) >= self.max_queue:
+            self.rejected_queue_full += 1
+            raise AdmissionRejected("queue_full", self.retry_after)
+        waiter = _AdmissionWaiter(notify)
+        self._waiters.append(waiter)
+        return waiter
+
+    def _finish_wait(self, waiter, started):
+        """在锁内调用：等待结束（被唤醒、超时或取消）后确认是否已获得名额。"""
+        if not waiter.granted:
+            self._waiters.remove(waiter)
+            return False
+        waited = time.monotonic() - started
+        self.admitted += 1
+        self.wait_seconds_total += waited
+        self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        return True
+
+    def acquire(self):
+        started = time.monotonic()
+        event = threading.Event()
+        with self._lock:
+            waiter = self._admit_or_enqueue(event.set)
+        if waiter is None:
+            return
+        event.wait(self.queue_timeout)
+        with self._lock:
+            if self._finish_wait(waiter, started):
+                return
+            self.rejected_timeout += 1
+        raise AdmissionRejected("timeout", self.retry_after)
+
+    async def acquire_async(self):
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def notify():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        with self._lock:
+            waiter = self._admit_or_enqueue(notify)
+        if waiter is None:
+            return
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            pass
+        except asyncio.CancelledError:
+            with self._lock:
+                granted = self._finish_wait(waiter, started)
+            if granted:
+                self.release()
+            raise
+        with self._lock:
+            if self._finish_wait(waiter, started):
+                return
+            self.rejected_timeout += 1
+        raise AdmissionRejected("timeout", self.retry_after)
+
+    def release(self):
+        with self._lock:
+            if self._waiters and self.max_active > 0:
+                waiter = self._waiters.popleft()
+                waiter.granted = True # 名额直接转交，active 不变
+                waiter.notify()
+            else:
+                self.active -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                "active": self.active,
+                "queue_depth": len(self._waiters),
+                "max_concurrent": self.max_active,
+                "max_queue": self.max_queue,
+                "admitted": self.admitted,
+                "rejected_queue_full": self.rejected_queue_full,
+                "rejected_timeout": self.rejected_timeout,
+                "avg_wait_ms": round(self.wait_seconds_total * 1000 / self.admitted, 1) if self.admitted else 0.0,
+                "max_wait_ms": round(self.wait_seconds_max * 1000, 1),
+            }
+
+class UpstreamHostLimiter:
+    """按上游主机名分别限制并发请求数，每个主机一个 AdmissionController（只排队不拒绝，等待超时为止）。"""
+    MAX_IDLE_HOSTS = 256
+
+    def __init__(self, max_per_host, queue_timeout):
+        self.max_per_host = max_per_host
+        self.queue_timeout = queue_timeout
+        self._hosts = {}
+        self._users = {} # 主机名 -> 已取得控制器、尚未 release 的请求数（含排队中的），不为 0 的主机不会被丢弃
+        self._lock = threading.Lock()
+
+    def _checkout(self, host):
+        """取得主机的控制器并登记使用者；从查找到 release 期间该控制器不会被丢弃，acquire 与 release 作用于同一个控制器。"""
+        with self._lock:
+            controller = self._hosts.get(host)
+            if controller is None:
+                if len(self._hosts) >= self.MAX_IDLE_HOSTS:
+                    # 丢弃没有使用者的主机的统计，防止字典无限增长
+                    for idle_host in [h for h in self._hosts if h not in self._users]:
+                        del self._hosts[idle_host]
+                controller = self._hosts[host] = AdmissionController(self.max_per_host, None, self.queue_timeout)
+            self._users[host] = self._users.get(host, 0) + 1
+            return controller
+
+    def _checkin(self, host):
+        with self._lock:
+            remaining = self._users[host] - 1
+            if remaining:
+                self._users[host] = remaining
+            else:
+                del self._users[host]
+
+    def acquire(self, host):
+        controller = self._checkout(host)
+        try:
+            controller.acquire()
+        except BaseException:
+            self._checkin(host)
+            raise
+
+    async def acquire_async(self, host):
+        controller = self._checkout(host)
+        try:
+            await controller.acquire_async()
+        except BaseException:
+            self._checkin(host)
+            raise
+
+    def release(self, host):
+        with self._lock:
+            controller = self._hosts[host]
+        controller.release()
+        self._checkin(host)
+
+    def stats(self):
+        with self._lock:
+            controllers = list(self._hosts.items())
+        return {host: controller.stats() for host, controller in controllers}
+
+ADMISSION_CONTROLLER = AdmissionController(ADMISSION_MAX_CONCURRENT, ADMISSION_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT)
+METRICS.register(CallbackGauge(
+    "chain_admission_active", "Admission-controlled requests currently holding a slot.", lambda: ADMISSION_CONTROLLER.active))
+METRICS.register(CallbackGauge(
+    "chain_admission_queue_depth", "Requests waiting for an admission slot.", lambda: ADMISSION_CONTROLLER.queue_depth))
+UPSTREAM_HOST_LIMITER = UpstreamHostLimiter(UPSTREAM_HOST_MAX_CONCURRENT, ADMISSION_QUEUE_TIMEOUT)
+# 需要获取远程订阅、受准入控制的接口
+ADMISSION_CONTROLLED_PATHS = frozenset(["/subscription.yaml", "/api/auto_detect_pairs", "/api/validate_configuration",
+                                        "/api/batch_subscriptions"])
+
+def _fresh_cached_subscription(remote_url, logs_list_ref):
+    """返回仍在 TTL 内的缓存条目（并记录日志），没有则返回 None。"""
+    cached_entry = SUBSCRIPTION_CACHE.get(remote_url)
+    if cached_entry is not None and SUBSCRIPTION_CACHE.is_fresh(cached_entry):
+        _add_log_entry(logs_list_ref, "info", f"使用缓存的远程订阅 (缓存于 {cached_entry.age():.0f} 秒前)。")
+        return cached_entry
+    return None
+
+def _accept_subscription_response(remote_url, cached_entry, status_code, response_headers, config_content, parse_mode, logs,
+                                  incremental_parse=None):
+    """处理上游的成功响应：304 或内容未变时复用 cached_entry，否则解析并写入缓存。返回条目或 None。
+
+    提供 incremental_parse 时优先采用其在下载期间得到的解析结果。
+    """
+    UPSTREAM_FETCHES.inc(str(status_code))
+    if status_code == 304 and cached_entry is not None:
+        SUBSCRIPTION_CACHE.revalidated(cached_entry, response_headers.get('ETag'), response_headers.get('Last-Modified'))
+        DISK_SUBSCRIPTION_STORE.save_metadata(cached_entry)
+        _add_log_entry(logs, "info", "远程订阅未变更 (304)，复用已缓存的解析结果。")
+        return cached_entry
+    _add_log_entry(logs, "info", f"远程订阅获取成功，状态码: {status_code}") #
+    if cached_entry is not None and cached_entry.content == config_content:
+        # 上游不支持条件请求但内容未变，沿用已解析的配置
+        SUBSCRIPTION_CACHE.revalidated(cached_entry, response_headers.get('ETag'), response_headers.get('Last-Modified'))
+        DISK_SUBSCRIPTION_STORE.save_metadata(cached_entry)
+        _add_log_entry(logs, "info", "远程订阅内容未变化，复用已缓存的解析结果。")
+        return cached_entry
+    entry = SubscriptionCacheEntry(
+        remote_url, config_content,
+        etag=response_headers.get('ETag'),
+        last_modified=response_headers.get('Last-Modified'),
+    )
+    if incremental_parse is not None:
+        config_object = incremental_parse.result(logs)
+        if config_object is not None:
+            if _validated_subscription(config_object, logs) is None:
+                return None
+            entry.parsed[incremental_parse.parse_mode] = config_object
+    # 进程池模式下由工作进程解析，服务进程只缓存原始内容
+    if PROCESS_POOL is None and entry.get_config(parse_mode, logs) is None:
+        return None
+    SUBSCRIPTION_CACHE.put(entry)
+    DISK_SUBSCRIPTION_STORE.save(entry)
+    return entry
+
+def _incremental_parse_for(cached_entry, parse_mode):
+    """首次获取订阅时边下载边解析；已有缓存时上游多半返回 304 或相同内容，提前解析只会白做。
+    进程池模式下服务进程不解析订阅。"""
+    if cached_entry is not None or PROCESS_POOL is not None:
+        return None
+    return IncrementalParse(parse_mode)
+
+def _fetch_remote_subscription(remote_url, ssl_verify_value, parse_mode, revalidate=False):
+    """获取并按 parse_mode 解析远程订阅，返回 (SubscriptionCacheEntry 或 None, 日志列表)。
+
+    缓存中存在过期条目时发起条件请求，上游返回 304 则直接复用该条目。
+    revalidate=True 时即使缓存未过期也向上游重新验证（后台提前刷新）。
+    """
+    logs = []
+    # 等待进入本次请求期间，其他请求可能已刷新了缓存
+    fresh_entry = None if revalidate else _fresh_cached_subscription(remote_url, logs)
+    if fresh_entry is not None:
+        return fresh_entry, logs
+    cached_entry = SUBSCRIPTION_CACHE.get(remote_url)
+    upstream_host = urlparse(remote_url).hostname or ""
+    incremental_parse = _incremental_parse_for(cached_entry, parse_mode)
+    try:
+        _add_log_entry(logs, "info", f"正在请求远程订阅 (URL provided).") #
+        UPSTREAM_HOST_LIMITER.acquire(upstream_host)
+        try:
+            with timed_stage("upstream_fetch"):
+                status_code, response_headers, config_content = _upstream_get(
+                    remote_url, _conditional_request_headers(cached_entry), ssl_verify_value, incremental_parse
+                )
+        finally:
+            UPSTREAM_HOST_LIMITER.release(upstream_host)
+        return _accept_subscription_response(
+            remote_url, cached_entry, status_code, response_headers, config_content, parse_mode, logs,
+            incremental_parse,
+        ), logs
+    except AdmissionRejected:
+        UPSTREAM_FETCHES.inc("host_limit")
+        _add_log_entry(logs, "error", f"同一上游主机的并发请求数已达上限 ({UPSTREAM_HOST_MAX_CONCURRENT})，等待超时。")
+        return None, logs
+    except requests.Timeout:
+        UPSTREAM_FETCHES.inc("timeout")
+        _add_log_entry(logs, "error", f"请求远程订阅超时 (URL provided).") #
+        return None, logs
+    except requests.RequestException as e:
+        UPSTREAM_FETCHES.inc(str(e.response.status_code) if e.response is not None else "error")
+        _add_log_entry(logs, "error", f"请求远程订阅发生错误 (URL provided): {e}", e) #
+        return None, logs
+    except Exception as e:
+        _add_log_entry(logs, "error", f"处理远程订阅内容时出错 (URL provided): {e}", e) #
+        return None, logs
+
+# --- 订阅后台刷新 ---
+class _TrackedSubscription:
+    __slots__ = ("request_times", "ssl_verify_value", "parse_mode")
+
+    def __init__(self):
+        self.request_times = deque()
+        self.ssl_verify_value = True
+        self.parse_mode = PARSE_MODE_ROUNDTRIP
+
+class SubscriptionRefresher:
+    """在后台刷新远程订阅：过期缓存被使用后立即重新验证；热门订阅在过期前提前刷新。
+
+    window 秒内被请求至少 hot_requests 次的订阅视为热门，缓存存活超过 TTL 的 REFRESH_AHEAD_RATIO 后由调度线程刷新。
+    刷新经由 SUBSCRIPTION_FETCH_FLIGHT 与前台请求合并；失败时保留原缓存，TTL 秒内不再重试。
+    线程在首次使用时才启动，进程池的工作进程导入本模块时不会创建。
+    """
+    REFRESH_AHEAD_RATIO = 0.8
+
+    def __init__(self, hot_requests, window):
+        self.hot_requests = hot_requests
+        self.window = window
+        self.refreshed = 0
+        self.failed = 0
+        self._tracked = {} # remote_url -> _TrackedSubscription
+        self._pending = set()
+        self._failed_at = {}
+        self._scheduler = None
+        self._lock = threading.Lock()
+
+    def record_request(self, remote_url, ssl_verify_value, parse_mode):
+        if self.hot_requests <= 0:
+            return
+        now = time.monotonic()
+        with self._lock:
+            tracked = self._tracked.get(remote_url)
+            if tracked is None:
+                tracked = self._tracked[remote_url] = _TrackedSubscription()
+            tracked.request_times.append(now)
+            while tracked.request_times[0] < now - self.window:
+                tracked.request_times.popleft()
+            tracked.ssl_verify_value = ssl_verify_value
+            tracked.parse_mode = parse_mode
+            if self._scheduler is None:
+                self._scheduler = threading.Thread(target=self._run_scheduler, name="refresh-scheduler", daemon=True)
+                self._scheduler.start()
+
+    def refresh(self, remote_url, ssl_verify_value, parse_mode):
+        """在后台线程中刷新订阅；已在刷新或处于失败后的等待期时不重复发起。"""
+        with self._lock:
+            failed_at = self._failed_at.get(remote_url)
+            if remote_url in self._pending or \
+               (failed_at is not None and time.monotonic() - failed_at < SUBSCRIPTION_CACHE_TTL):
+                return
+            self._pending.add(remote_url)
+        threading.Thread(
+            target=self._refresh, args=(remote_url, ssl_verify_value, parse_mode), name="refresh", daemon=True
+        ).start()
+
+    def _refresh(self, remote_url, ssl_verify_value, parse_mode):
+        entry = None
+        try:
+            (entry, _), _ = SUBSCRIPTION_FETCH_FLIGHT.do(
+                remote_url,
+                lambda: _fetch_remote_subscription(remote_url, ssl_verify_value, parse_mode, revalidate=True),
+                SINGLEFLIGHT_WAIT_TIMEOUT,
+            )
+        except Exception as e:
+            logger.error(f"后台刷新远程订阅时发生意外错误: {e}", exc_info=True)
+        finally:
+            with self._lock:
+                self._pending.discard(remote_url)
+                if entry is None:
+                    self.failed += 1
+                    self._failed_at[remote_url] = time.monotonic()
+                else:
+                    self.refreshed += 1
+                    self._failed_at.pop(remote_url, None)
+        if entry is None:
+            logger.warning("后台刷新远程订阅失败，在超过最大陈旧时间前继续使用已缓存的订阅。")
+
+    def _hot_subscriptions(self):
+        """返回热门订阅 [(remote_url, ssl_verify_value, parse_mode)]，同时清理窗口内无请求的订阅。"""
+        now = time.monotonic()
+        hot = []
+        with self._lock:
+            for remote_url, tracked in list(self._tracked.items()):
+                while tracked.request_times and tracked.request_times[0] < now - self.window:
+                    tracked.request_times.popleft()
+                if not tracked.request_times:
+                    del self._tracked[remote_url]
+                    self._failed_at.pop(remote_url, None)
+                elif len(tracked.request_times) >= self.hot_requests:
+                    hot.append((remote_url, tracked.ssl_verify_value, tracked.parse_mode))
+        return hot
+
+    def _run_scheduler(self):
+        # 检查间隔取提前刷新窗口的一半，保证条目过期前至少被检查到一次
+        interval = max(1.0, SUBSCRIPTION_CACHE_TTL * (1 - self.REFRESH_AHEAD_RATIO) / 2)
+        while True:
+            time.sleep(interval)
+            try:
+                for remote_url, ssl_verify_value, parse_mode in self._hot_subscriptions():
+                    entry = SUBSCRIPTION_CACHE.get(remote_url)
+                    # 已被淘汰的订阅不再主动获取，等下一次请求时同步获取
+                    if entry is not None and entry.age() >= SUBSCRIPTION_CACHE_TTL * self.REFRESH_AHEAD_RATIO:
+                        self.refresh(remote_url, ssl_verify_value, parse_mode)
+            except Exception as e:
+                logger.error(f"后台刷新调度出错: {e}", exc_info=True)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "tracked": len(self._tracked),
+                "hot": sum(1 for tracked in self._tracked.values() if len(tracked.request_times) >= self.hot_requests),
+                "refreshing": len(self._pending),
+                "refreshed": self.refreshed,
+                "failed": self.failed,
+            }
+
+SUBSCRIPTION_REFRESHER = SubscriptionRefresher(BACKGROUND_REFRESH_HOT_REQUESTS, BACKGROUND_REFRESH_WINDOW)
+
+def _cached_subscription_for_request(remote_url, ssl_verify_value, parse_mode, logs_list_ref):
+    """返回可直接使用的缓存条目：TTL 内的条目，或过期未超过 SUBSCRIPTION_MAX_STALENESS 的条目（同时在后台刷新）。"""
+    fresh_entry = _fresh_cached_subscription(remote_url, logs_list_ref)
+    if fresh_entry is not None:
+        CACHE_LOOKUPS.inc("subscription", "hit")
+        return fresh_entry
+    cached_entry = SUBSCRIPTION_CACHE.get(remote_url)
+    if cached_entry is None or cached_entry.age() >= SUBSCRIPTION_CACHE_TTL + SUBSCRIPTION_MAX_STALENESS:
+        CACHE_LOOKUPS.inc("subscription", "miss")
+        return None
+    CACHE_LOOKUPS.inc("subscription", "stale")
+    SUBSCRIPTION_REFRESHER.refresh(remote_url, ssl_verify_value, parse_mode)
+    _add_log_entry(logs_list_ref, "info", f"使用已过期的缓存订阅 (缓存于 {cached_entry.age():.0f} 秒前)，同时在后台刷新。")
+    return cached_entry
+
+def render_node_pairs(config_object, node_pairs_list):
+    """在只读配置的副本上应用节点对并输出 YAML，返回 (是否成功, 应用日志, YAML 字节或 None, 输出错误信息或 None)。"""
+    with timed_stage("clone_config"):
+        config_copy = clone_config(config_object)
+    with timed_stage("apply_node_pairs"):
+        success, modified_config, apply_logs = apply_node_pairs_to_config(config_copy, node_pairs_list)
+    if not success:
+        return False, apply_logs, None, None
+    try:
+        output = StringIO()
+        with timed_stage("dump"):
+            get_yaml().dump(modified_config, output)
+    except Exception as e:
+        return True, apply_logs, None, str(e)
+    return True, apply_logs, output.getvalue().encode("utf-8"), None
+
+# --- 增量渲染 ---
+class IncrementalRenderUnsupported(Exception):
+    """文档不适合按条目增量更新（注释、锚点、流式列表、重名、条目以外的内容变化等），需要完整生成。"""
+
+INCREMENTAL_SECTIONS = ("proxies", "proxy-groups")
+_ITEM_NAME_EXTRACTORS = {"name": _extract_str}
+_COMMENT_PATTERN = re.compile(r"(?:^|[ \t])#", re.MULTILINE)
+
+def _checked_events(events):
+    # 锚点与别名使条目的输出依赖于文档中的其它位置，不能单独生成
+    for event in events:
+        if type(event) is AliasEvent or getattr(event, "anchor", None) is not None:
+            raise IncrementalRenderUnsupported("文档中含有锚点或别名")
+        yield event
+
+def _split_item_sections(text):
+    """把文档按行切分为模板与 proxies / proxy-groups 的逐条目文本。
+
+    返回 (模板, 各段)：各段按在文档中的顺序排列，为 (键, [(名称, 条目文本)])；模板为各段之前、之间与之后的文本，
+    比段数多一个。条目文本从条目的 "- " 所在行开始，到下一个条目（或下一个顶层键）之前为止，
+    其后的空行与 ruamel 的处理一致，属于该条目。条目中可能含有注释时抛出 IncrementalRenderUnsupported。
+    """
+    if "\x85" in text or "\u2028" in text or "\u2029" in text or "\r" in text.replace("\r\n", ""):
+        raise IncrementalRenderUnsupported("文档中含有非 \\n 的换行符")
+    lines = text.split("\n")
+    line_texts = [line + "\n" for line in lines[:-1]]
+    line_texts.append(lines[-1])
+    safe_yaml = get_safe_yaml()
+    resolver = safe_yaml.resolver
+    raw_events = safe_yaml.parse(text)
+    events = _checked_events(raw_events)
+    sections = [] # (键, [(名称, 行号)], 段结束行号)
+    try:
+        if type(next(events)) is not StreamStartEvent or type(next(events)) is not DocumentStartEvent:
+            raise IncrementalRenderUnsupported("文档结构无效")
+        event = next(events)
+        if type(event) is not MappingStartEvent or event.tag is not None:
+            raise IncrementalRenderUnsupported("文档顶层不是映射")
+        pending_section = None
+        seen_keys = set()
+        while True:
+            event = next(events)
+            if pending_section is not None:
+                sections.append(pending_section + (event.start_mark.line,))
+                pending_section = None
+            if type(event) is MappingEndEvent:
+                break
+            if type(event) is not ScalarEvent or event.tag is not None or event.value in seen_keys:
+                raise IncrementalRenderUnsupported("文档顶层含有不支持的键")
+            key = event.value
+            seen_keys.add(key)
+            value_event = next(events)
+            if key not in INCREMENTAL_SECTIONS:
+                _skip_yaml_node(events, value_event)
+                continue
+            if type(value_event) is not SequenceStartEvent or value_event.tag is not None or value_event.flow_style:
+                raise IncrementalRenderUnsupported(f"'{key}' 不是块格式的列表")
+            items = []
+            item_names = set()
+            while True:
+                event = next(events)
+                if type(event) is SequenceEndEvent:
+                    break
+                if type(event) is not MappingStartEvent or event.tag is not None:
+                    raise IncrementalRenderUnsupported(f"'{key}' 中含有非映射的条目")
+                line = event.start_mark.line
+                if line_texts[line][:event.start_mark.column].strip() != "-" or (items and line <= items[-1][1]):
+                    raise IncrementalRenderUnsupported(f"'{key}' 中的条目不是以 \"- \" 开始的独立行")
+                name = _extract_fields(events, resolver, _ITEM_NAME_EXTRACTORS).get("name")
+                if not name or name in item_names:
+                    raise IncrementalRenderUnsupported(f"'{key}' 中有条目缺少名称或名称重复")
+                item_names.add(name)
+                items.append((name, line))
+            if not items:
+                raise IncrementalRenderUnsupported(f"'{key}' 为空")
+            pending_section = (key, items)
+        if type(next(events)) is not DocumentEndEvent or type(next(events)) is not StreamEndEvent:
+            raise IncrementalRenderUnsupported("文档包含多个 YAML 文档")
+    except _NamesExtractionUnsupported:
+        raise IncrementalRenderUnsupported("条目中含有标签、合并键、重复键或非字符串名称")
+    finally:
+        raw_events.close()
+
+    template = []
+    split_sections = []
+    previous_end = 0
+    for key, items, end in sections:
+        template.append("".join(line_texts[previous_end:items[0][1]]))
+        item_texts = []
+        for index, (name, line) in enumerate(items):
+            next_line = items[index + 1][1] if index + 1 < len(items) else end
+            item_text = "".join(line_texts[line:next_line])
+            if _COMMENT_PATTERN.search(item_text):
+                # 引号内的 " #" 也会被视为注释，只是放弃增量更新，不影响结果
+                raise IncrementalRenderUnsupported(f"'{key}' 中可能含有注释")
+            item_texts.append((name, item_text))
+        split_sections.append((key, item_texts))
+        previous_end = end
+    template.append("".join(line_texts[previous_end:]))
+    return template, split_sections
+
+def _render_changed_items(changed_items, template, section_keys, node_pairs_list):
+    """只包含有变化条目的小文档经过与完整生成相同的解析、应用节点对与输出，返回 {(键, 名称): 输出的条目文本}。
+
+    落地节点未变化（不在小文档中）时以只有名称的占位节点代替，使前置组中的移除与完整生成时一致。
+    占位节点放在有变化的条目之前；原文档中某段之后还有其它键时，小文档中也在该段之后加一个占位键，
+    使每段最后一个条目（及其后的空行）所处的上下文与完整文档相同。
+    """
+    changed_proxy_names = {name for name, _ in changed_items.get("proxies", ())}
+    placeholder_names = [landing for landing in dict.fromkeys(landing for landing, _ in node_pairs_list)
+                         if landing not in changed_proxy_names]
+    parts = []
+    for index, key in enumerate(section_keys):
+        items = changed_items.get(key, ())
+        if not items and (key != "proxies" or not placeholder_names):
+            continue # 没有节点对时代理组不会被修改，小文档中无需 proxies
+        parts.append(f"{key}:\n")
+        if key == "proxies":
+            indent = items[0][1][:len(items[0][1]) - len(items[0][1].lstrip(" "))] if items else ""
+            for landing in placeholder_names:
+                parts.append(f"{indent}- {{name: {json.dumps(landing, ensure_ascii=False)}}}\n")
+        for _, item_text in items:
+            parts.append(item_text if item_text.endswith("\n") else item_text + "\n")
+        if template[index + 1].strip():
+            parts.append(f"incremental-render-end-{index}: 0\n")
+    config_object = get_yaml().load("".join(parts))
+    if node_pairs_list:
+        apply_node_pairs_to_config(config_object, node_pairs_list)
+    output = StringIO()
+    get_yaml().dump(config_object, output)
+    rendered = {}
+    for key, items in _split_item_sections(output.getvalue())[1]:
+        wanted = {name for name, _ in changed_items.get(key, ())}
+        for name, item_text in items:
+            if name in wanted:
+                rendered[(key, name)] = item_text
+    return rendered
+
+def patch_rendered_output(previous_content, previous_output, content, node_pairs_list):
+    """由上次的订阅内容与输出得到新订阅内容的输出，结果与完整生成一致。
+
+    两版订阅除 proxies / proxy-groups 的条目外必须完全相同；条目按名称对应，内容未变的条目直接复用上次的输出，
+    新增或有变化的条目重新生成。返回 (输出字节, 有变化的节点数, 有变化的代理组数)，
+    无法增量处理或节点对无法全部应用时抛出 IncrementalRenderUnsupported，由调用方完整生成。
+    """
+    try:
+        previous_text, text, output_text = previous_content.decode("utf-8"), content.decode("utf-8"), previous_output.decode("utf-8")
+    except UnicodeDecodeError:
+        raise IncrementalRenderUnsupported("订阅内容不是 UTF-8 编码")
+    previous_template, previous_sections = _split_item_sections(previous_text)
+    template, sections = _split_item_sections(text)
+    section_keys = [key for key, _ in sections]
+    if template != previous_template or section_keys != [key for key, _ in previous_sections]:
+        raise IncrementalRenderUnsupported("节点与代理组以外的内容有变化")
+    output_template, output_sections = _split_item_sections(output_text)
+    if [(key, [name for name, _ in items]) for key, items in output_sections] != \
+       [(key, [name for name, _ in items]) for key, items in previous_sections]:
+        raise IncrementalRenderUnsupported("上次的输出与订阅内容不对应")
+    proxy_names = {name for key, items in sections if key == "proxies" for name, _ in items}
+    if not proxy_names or any(landing not in proxy_names for landing, _ in node_pairs_list):
+        raise IncrementalRenderUnsupported("节点对中的落地节点不在新的订阅中")
+
+    reusable = {} # 键 -> {名称: (上次的条目文本, 上次输出的条目文本)}
+    changed_items = {}
+    for (key, previous_items), (_, output_items), (_, items) in zip(previous_sections, output_sections, sections):
+        previous_by_name = reusable[key] = {name: (item_text, output_item[1]) for (name, item_text), output_item in zip(previous_items, output_items)}
+        for name, item_text in items:
+            previous = previous_by_name.get(name)
+            if previous is None or previous[0] != item_text:
+                changed_items.setdefault(key, []).append((name, item_text))
+    rendered = _render_changed_items(changed_items, template, section_keys, node_pairs_list) if changed_items else {}
+
+    parts = [output_template[0]]
+    for index, (key, items) in enumerate(sections):
+        for name, _ in items:
+            item_output = rendered.get((key, name))
+            if item_output is None:
+                item_output = reusable[key][name][1]
+            parts.append(item_output)
+        parts.append(output_template[index + 1])
+    return "".join(parts).encode("utf-8"), len(changed_items.get("proxies", ())), len(changed_items.get("proxy-groups", ()))
+
+def _incremental_render_key(entry, node_pairs_list):
+    return (entry.url, tuple(node_pairs_list))
+
+def render_incrementally(entry, node_pairs_list, logs_list_ref):
+    """同一 (URL, 节点对) 上次生成后上游订阅有更新时，在上次输出的基础上增量生成；无法增量生成时返回 None。"""
+    if not INCREMENTAL_RENDERS.enabled or entry.url is None:
+        return None
+    previous = INCREMENTAL_RENDERS.get(_incremental_render_key(entry, node_pairs_list))
+    if previous is None or previous[0] == entry.content_hash:
+        return None
+    _, previous_content, previous_output = previous
+    try:
+        with timed_stage("incremental_render"):
+            if PROCESS_POOL is not None:
+                patched = run_in_process_pool(patch_rendered_output, previous_content, previous_output, entry.content, node_pairs_list)
+            else:
+                patched = patch_rendered_output(previous_content, previous_output, entry.content, node_pairs_list)
+    except IncrementalRenderUnsupported as e:
+        _add_log_entry(logs_list_ref, "debug", f"无法在上次的输出基础上增量生成 ({e})，将完整生成。")
+        return None
+    except Exception as e:
+        _add_log_entry(logs_list_ref, "warn", f"增量生成时出错，将完整生成: {e}", e)
+        return None
+    body, changed_proxies, changed_groups = patched
+    _add_log_entry(logs_list_ref, "info", f"上游订阅已更新：{changed_proxies} 个节点、{changed_groups} 个代理组有变化，已在上次的输出基础上增量生成。")
+    return body
+
+def cache_rendered_output(entry, render_key, body):
+    """保存完整生成或增量生成的输出：写入渲染结果缓存，并作为该 (URL, 节点对) 下次增量生成的基础。"""
+    RENDER_CACHE.put(render_key, body, len(body))
+    if INCREMENTAL_RENDERS.enabled and entry.url is not None:
+        INCREMENTAL_RENDERS.put(_incremental_render_key(entry, render_key[1]),
+                                (entry.content_hash, entry.content, body), len(entry.content) + len(body))
+
+INCREMENTAL_RENDERS = LRUByteCache(INCREMENTAL_RENDER_MAX_BYTES)
+METRICS.register(CallbackGauge(
+    "chain_incremental_render_bytes", "Subscription and output bytes kept for incremental rendering.", lambda: INCREMENTAL_RENDERS.total_bytes))
+
+# --- YAML 处理进程池 ---
+PROCESS_POOL = None # PROCESS_POOL_WORKERS > 0 时在启动服务前创建
+
+# 工作进程内按内容哈希缓存已解析的订阅，同一订阅的后续请求无需重新解析
+WORKER_SUBSCRIPTION_CACHE = LRUByteCache(SUBSCRIPTION_CACHE_MAX_BYTES)
+
+def _create_process_pool():
+    """创建 YAML 处理进程池。使用 forkserver/spawn 启动工作进程，避免从多线程的服务进程中 fork。"""
+    start_method = "forkserver" if "forkserver" in multiprocessing.get_all_start_methods() else "spawn"
+    return ProcessPoolExecutor(
+        max_workers=PROCESS_POOL_WORKERS,
+        mp_context=multiprocessing.get_context(start_method),
+        initializer=_init_pool_worker,
+    )
+
+def _init_pool_worker():
+    # 日志文件的轮转由服务进程负责，工作进程只输出到控制台；Ctrl+C 由服务进程统一处理
+    LOG_LISTENER.stop()
+    file_handler.close()
+    LOG_LISTENER.handlers = (console_handler,)
+    LOG_LISTENER.start()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def run_in_process_pool(fn, *args):
+    # 工作进程内的各阶段无法单独计时，整体记录为 process_pool 阶段（含进程间传输）
+    with timed_stage("process_pool"):
+        return PROCESS_POOL.submit(_run_with_log_capture, REQUEST_LOG_CAPTURE_LEVEL.get(), fn, *args).result()
+
+def _run_with_log_capture(capture_level, fn, *args):
+    # 工作进程沿用发起请求时的日志收集级别
+    REQUEST_LOG_CAPTURE_LEVEL.set(capture_level)
+    return fn(*args)
+
+def _pool_subscription_config(content_hash, content, parse_mode, logs_list_ref):
+    entry = WORKER_SUBSCRIPTION_CACHE.get(content_hash)
+    if entry is None:
+        entry = SubscriptionCacheEntry(None, content)
+        WORKER_SUBSCRIPTION_CACHE.put(content_hash, entry, entry.size)
+    return entry.get_config(parse_mode, logs_list_ref)
+
+# 以下任务在工作进程中执行，参数与返回值只包含原始字节、节点对与日志等可序列化数据。
+# 返回 (解析日志, 结果)，订阅无法解析时结果为 None。
+def _pool_auto_detect(content_hash, content):
+    logs = []
+    config_object = _pool_subscription_config(content_hash, content, PARSE_MODE_NAMES, logs)
+    if config_object is None:
+        return logs, None
+    return logs, perform_auto_detection(config_object, REGION_KEYWORD_CONFIG, LANDING_NODE_KEYWORDS)
+
+def _pool_validate_pairs(content_hash, content, node_pairs_list):
+    logs = []
+    config_object = _pool_subscription_config(content_hash, content, PARSE_MODE_NAMES, logs)
+    if config_object is None:
+        return logs, None
+    success, _, apply_logs = apply_node_pairs_to_config(NodeModel.from_config(config_object), node_pairs_list)
+    return logs, (success, apply_logs)
+
+def _pool_render_subscription(content_hash, content, node_pairs_list):
+    """结果同 render_node_pairs。"""
+    logs = []
+    config_object = _pool_subscription_config(content_hash, content, PARSE_MODE_ROUNDTRIP, logs)
+    if config_object is None:
+        return logs, None
+    return logs, render_node_pairs(config_object, node_pairs_list)
+
+# --- 流式输出 ---
+class StreamingResponseWriter:
+    """供 ruamel 输出使用的类文件对象，把 YAML 按块写到 /subscription.yaml 的响应中。
+
+    首个数据块写出前才发送响应头：整个文档不超过一个块时按普通响应发送（带 Content-Length），
+    否则对 HTTP/1.1 客户端使用分块传输编码，对 HTTP/1.0 客户端以关闭连接表示结束。
+    客户端接受压缩时按协商的编码逐块压缩后发送。
+    capture=True 时同时保留已输出的（未压缩）数据块，供写入渲染结果缓存。
+    """
+    def __init__(self, handler, etag, capture=False, chunk_size=None):
+        self.handler = handler
+        self.etag = etag
+        self.chunk_size = chunk_size or STREAM_CHUNK_SIZE
+        self.captured = [] if capture else None
+        self.started = False
+        self.chunked = handler.request_version >= "HTTP/1.1"
+        self.encoding = handler.response_encoding()
+        self._compressor = StreamCompressor(self.encoding) if self.encoding is not None else None
+        self._buffer = bytearray()
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        self._buffer += data
+        if len(self._buffer) >= self.chunk_size:
+            self._flush()
+
+    def _start(self):
+        handler = self.handler
+        if self.chunked:
+            # 状态行版本取自 protocol_version；该连接在解析请求时已确定会被关闭
+            handler.protocol_version = "HTTP/1.1"
+        handler.send_response(200)
+        self._send_content_headers()
+        handler.send_encoding_headers(self.encoding)
+        if self.chunked:
+            handler.send_header("Transfer-Encoding", "chunked")
+        handler.send_header("Connection", "close")
+        handler.end_headers()
+        self.started = True
+
+    def _send_content_headers(self):
+        handler = self.handler
+        handler.send_header("Content-Type", "text/yaml; charset=utf-8")
+        handler.send_header("Cache-Control", "no-cache")
+        handler.send_header("ETag", encoded_etag(self.etag, self.encoding))
+        handler.send_header("Content-Disposition", f"inline; filename=\"chain_subscription_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}.yaml\"")
+        handler.send_subscription_age_header()
+
+    def _flush(self, sync=False):
+        if not self._buffer:
+            return
+        if not self.started:
+            self._start()
+        data = bytes(self._buffer)
+        self._buffer.clear()
+        if self.captured is not None:
+            self.captured.append(data)
+        if self._compressor is not None:
+            data = self._compressor.compress(data, sync)
+        self._send_chunk(data)
+
+    def _send_chunk(self, data):
+        if not data:
+            return # 压缩器可能暂不输出数据；分块传输中空块表示结束，不能发送
+        if self.chunked:
+            self.handler.wfile.write(b"%X\r\n%s\r\n" % (len(data), data))
+        else:
+            self.handler.wfile.write(data)
+
+    def captured_body(self):
+        """返回完整的输出内容（需 capture=True）；文档未超过一个块时数据仍在缓冲区中。"""
+        if self.captured is None:
+            return None
+        return b"".join(self.captured) + bytes(self._buffer)
 
-    if not isinstance(proxies, list):
-        _add_log_entry(logs, "error", "配置对象中缺少有效的 'proxies' 部分。")
-        return False, config_object, logs
-    if "proxy-groups" in config_object and not isinstance(proxy_groups, list):
-        _add_log_entry(logs, "warn", "配置对象中的 'proxy-groups' 部分无效（不是列表），可能会影响组操作。")
-        proxy_groups = []
+    def finish(self):
+        if not self.started:
+            body = bytes(self._buffer)
+            self._buffer.clear()
+            self.handler.send_subscription_yaml(body, self.etag)
+            return
+        self._flush()
+        if self._compressor is not None:
+            self._send_chunk(self._compressor.finish())
+        if self.chunked:
+            self.handler.wfile.write(b"0\r\n\r\n")
+        self.handler.wfile.flush()
 
-    applied_count = 0
-    for landing_name, front_name in node_pairs_list:
-        _add_log_entry(logs, "debug", f"尝试应用节点对: 落地='{landing_name}', 前置='{front_name}'.")
-
-        landing_node_found = False
-        for proxy_node in proxies:
-            if isinstance(proxy_node, dict) and proxy_node.get("name") == landing_name:
-                landing_node_found = True
-                proxy_node["dialer-proxy"] = front_name
-                _add_log_entry(logs, "info", f"成功为落地节点 '{landing_name}' 设置 'dialer-proxy' 为 '{front_name}'.")
-                applied_count += 1
-                if isinstance(proxy_groups, list):
-                    for grp in proxy_groups:
-                        if isinstance(grp, dict) and grp.get("name") == front_name:
-                            group_proxies_list = grp.get("proxies")
-                            if isinstance(group_proxies_list, list) and landing_name in group_proxies_list:
-                                try:
-                                    group_proxies_list.remove(landing_name)
-                                    _add_log_entry(logs, "info", f"已从前置组 '{front_name}' 的节点列表中移除落地节点 '{landing_name}'。")
-                                except ValueError:
-                                    _add_log_entry(logs, "warn", f"尝试从前置组 '{front_name}' 移除落地节点 '{landing_name}' 时失败 (ValueError)。")
-                            break
-                break
+    def abort(self):
+        # 不发送结束块，直接关闭连接
+        self._buffer.clear()
+        self.captured = None
+        self.handler.close_connection = True
 
-        if not landing_node_found:
-            _add_log_entry(logs, "warn", f"节点对中的落地节点 '{landing_name}' 未在 'proxies' 列表中找到，已跳过此对。")
+class NdjsonResponseWriter(StreamingResponseWriter):
+    """逐行输出 NDJSON 的响应写入器，用于 /api/batch_subscriptions。
 
-    if len(node_pairs_list) > 0:
-        if applied_count == 0:
-            _add_log_entry(logs, "error", "未能应用任何提供的节点对。请检查节点名称是否与订阅中的节点匹配，或查看日志了解详情。")
-            return False, config_object, logs
-        elif applied_count < len(node_pairs_list):
-            failed_count = len(node_pairs_list) - applied_count
-            _add_log_entry(logs, "warn", f"节点对应用部分成功：成功 {applied_count} 个，失败 {failed_count} 个 (共 {len(node_pairs_list)} 个)。失败的节点对因无法匹配而被跳过。请核对节点名称或查看日志。")
-            return False, config_object, logs
-        else:
-            _add_log_entry(logs, "info", f"成功应用所有 {applied_count} 个节点对。")
-            return True, config_object, logs
-    else:
-        _add_log_entry(logs, "info", "没有提供节点对进行应用，配置未修改。")
-        return True, config_object, logs
+    每写完一行立即发送，客户端无需等待整个批次完成即可处理已完成的任务。
+    """
+    def __init__(self, handler):
+        super().__init__(handler, etag=None)
 
-def _keyword_match(text_to_search, keyword_to_find):
-    if not text_to_search or not keyword_to_find:
-        return False
-    text_lower = text_to_search.lower()
-    keyword_lower = keyword_to_find.lower()
-    if re.search(r'[a-zA-Z]', keyword_to_find):
-        pattern_str = r'(?<![a-zA-Z])' + re.escape(keyword_lower) + r'(?![a-zA-Z])'
-        try:
-            if re.search(pattern_str, text_lower):
-                return True
-        except re.error as e:
-            logger.debug(f"Regex error during keyword match for keyword '{keyword_to_find}': {e}")
-            pass
-    else:
-        if keyword_lower in text_lower:
-            return True
-    return False
+    def write_line(self, record):
+        self.write(json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n")
+        self._flush(sync=True)
 
-def perform_auto_detection(config_object, region_keyword_config, landing_node_keywords_config):
-    logs = []
-    _add_log_entry(logs, "info", "开始自动节点对检测。")
-    suggested_pairs = []
-    if not isinstance(config_object, dict):
-        _add_log_entry(logs, "error", "无效的配置对象：不是一个字典。")
-        return [], logs
-    proxies = config_object.get("proxies")
-    proxy_groups = config_object.get("proxy-groups")
-    if not isinstance(proxies, list):
-        _add_log_entry(logs, "error", "配置对象中缺少有效的 'proxies' 列表，无法进行自动检测。")
-        return [], logs
-    if not isinstance(proxy_groups, list):
-        _add_log_entry(logs, "warn", "'proxy-groups' 部分缺失或无效，自动检测前置组的功能将受影响。")
-    for proxy_node in proxies:
-        if not isinstance(proxy_node, dict):
-            _add_log_entry(logs, "debug", f"跳过 'proxies' 中的无效条目: {proxy_node}")
-            continue
-        proxy_name = proxy_node.get("name")
-        if not proxy_name:
-            _add_log_entry(logs, "debug", f"跳过 'proxies' 中缺少名称的节点: {proxy_node}")
-            continue
-        is_landing = False
-        for l_kw in landing_node_keywords_config:
-            if _keyword_match(proxy_name, l_kw):
-                is_landing = True
-                break
-        if not is_landing:
-            _add_log_entry(logs, "debug", f"节点 '{proxy_name}' 未被识别为落地节点，跳过。")
-            continue
-        _add_log_entry(logs, "info", f"节点 '{proxy_name}' 被识别为潜在的落地节点。开始为其查找前置...")
-        matched_region_ids = set()
-        for region_def in region_keyword_config:
-            for r_kw in region_def.get("keywords", []):
-                if _keyword_match(proxy_name, r_kw):
-                    matched_region_ids.add(region_def.get("id"))
-                    break
-        if not matched_region_ids:
-            _add_log_entry(logs, "warn", f"落地节点 '{proxy_name}': 未能识别出任何区域。跳过此节点。")
-            continue
-        if len(matched_region_ids) > 1:
-            _add_log_entry(logs, "error", f"落地节点 '{proxy_name}': 识别出多个区域 {list(matched_region_ids)}，区域不明确。跳过此节点。")
-            continue
-        target_region_id = matched_region_ids.pop()
-        _add_log_entry(logs, "info", f"落地节点 '{proxy_name}': 成功识别区域ID为 '{target_region_id}'.")
-        target_region_keywords_for_dialer_search = []
-        for region_def in region_keyword_config:
-            if region_def.get("id") == target_region_id:
-                target_region_keywords_for_dialer_search = region_def.get("keywords", [])
-                break
-        if not target_region_keywords_for_dialer_search:
-            _add_log_entry(logs, "error", f"内部错误：区域ID '{target_region_id}' 未找到对应的关键字列表。跳过落地节点 '{proxy_name}'.")
-            continue
-        found_dialer_name = None
-        if isinstance(proxy_groups, list):
-            matching_groups = []
-            for group in proxy_groups:
-                if not isinstance(group, dict): continue
-                group_name = group.get("name")
-                if not group_name: continue
-                for r_kw in target_region_keywords_for_dialer_search:
-                    if _keyword_match(group_name, r_kw):
-                        matching_groups.append(group_name)
-                        break
-            if len(matching_groups) == 1:
-                found_dialer_name = matching_groups[0]
-                _add_log_entry(logs, "info", f"落地节点 '{proxy_name}': 在区域 '{target_region_id}' 找到唯一匹配的前置组: '{found_dialer_name}'.")
-            elif len(matching_groups) > 1:
-                _add_log_entry(logs, "error", f"落地节点 '{proxy_name}': 在区域 '{target_region_id}' 找到多个匹配的前置组 {matching_groups}，无法自动选择。跳过此节点。")
-                continue
-            else:
-                _add_log_entry(logs, "info", f"落地节点 '{proxy_name}': 在区域 '{target_region_id}' 未找到匹配的前置组。将尝试查找节点。")
-        else:
-            _add_log_entry(logs, "debug", "跳过查找前置组，因为 'proxy-groups' 缺失或无效。")
-        if not found_dialer_name:
-            matching_nodes = []
-            for candidate_proxy in proxies:
-                if not isinstance(candidate_proxy, dict): continue
-                candidate_name = candidate_proxy.get("name")
-                if not candidate_name or candidate_name == proxy_name:
-                    continue
-                for r_kw in target_region_keywords_for_dialer_search:
-                    if _keyword_match(candidate_name, r_kw):
-                        matching_nodes.append(candidate_name)
-                        break
-            if len(matching_nodes) == 1:
-                found_dialer_name = matching_nodes[0]
-                _add_log_entry(logs, "info", f"落地节点 '{proxy_name}': 在区域 '{target_region_id}' 找到唯一匹配的前置节点: '{found_dialer_name}'.")
-            elif len(matching_nodes) > 1:
-                _add_log_entry(logs, "error", f"落地节点 '{proxy_name}': 在区域 '{target_region_id}' 找到多个匹配的前置节点 {matching_nodes}，无法自动选择。跳过此节点。")
-                continue
-            else:
-                 _add_log_entry(logs, "warn", f"落地节点 '{proxy_name}': 在区域 '{target_region_id}' 也未能找到匹配的前置节点。")
-        if found_dialer_name:
-            suggested_pairs.append({"landing": proxy_name, "front": found_dialer_name})
-            _add_log_entry(logs, "info", f"成功为落地节点 '{proxy_name}' 自动配置前置为 '{found_dialer_name}'.")
-    _add_log_entry(logs, "info", f"自动节点对检测完成，共找到 {len(suggested_pairs)} 对建议。")
-    if not suggested_pairs and len(proxies) > 0:
-        _add_log_entry(logs, "warn", "未自动检测到任何可用的节点对。请检查节点命名是否符合预设的关键字规则，或调整关键字配置。")
-    return suggested_pairs, logs
+    def _send_content_headers(self):
+        self.handler.send_header("Content-Type", "application/x-ndjson; charset=utf-8")
+        self.handler.send_header("Cache-Control", "no-cache, no-store, must-revalidate")
 
 class CustomHandler(http.server.SimpleHTTPRequestHandler):
-    ALLOWED_EXTENSIONS = {'.html', '.js', '.css', '.ico'}
+    ALLOWED_EXTENSIONS = STATIC_ALLOWED_EXTENSIONS
+    subscription_entry = None # 本次 /subscription.yaml 请求使用的订阅缓存条目
+
+    def response_encoding(self, body_size=None):
+        """本次响应使用的压缩编码，不压缩时为 None；已知响应体小于 COMPRESSION_MIN_BYTES 时不压缩。"""
+        if body_size is not None and body_size < COMPRESSION_MIN_BYTES:
+            return None
+        return negotiate_encoding(self.headers.get("Accept-Encoding"))
+
+    def send_encoding_headers(self, encoding):
+        if encoding is not None:
+            self.send_header("Content-Encoding", encoding)
+        if RESPONSE_COMPRESSION:
+            self.send_header("Vary", "Accept-Encoding")
 
-    def send_json_response(self, data_dict, http_status_code):
+    def send_json_response(self, data_dict, http_status_code, extra_headers=None):
         try:
             response_body = json.dumps(data_dict, ensure_ascii=False).encode('utf-8')
+            encoding = self.response_encoding(len(response_body))
+            if encoding is not None:
+                with timed_stage("compress"):
+                    response_body = compress_body(response_body, encoding)
             self.send_response(http_status_code)
             self.send_header("Content-Type", "application/json; charset=utf-8")
             self.send_header("Content-Length", str(len(response_body)))
+            self.send_encoding_headers(encoding)
             self.send_header("Cache-Control", "no-cache, no-store, must-revalidate")
+            for header_name, header_value in (extra_headers or {}).items():
+                self.send_header(header_name, header_value)
             self.end_headers()
-            self.wfile.write(response_body)
+            with timed_stage("write"):
+                self.wfile.write(response_body)
         except Exception as e:
             _error_logs_internal = [] # Use a different name to avoid conflict if this function is nested
             _add_log_entry(_error_logs_internal, "error", f"发送JSON响应时发生严重内部错误: {e}", e)
@@ -284,7 +2796,12 @@ class CustomHandler(http.server.SimpleHTTPRequestHandler):
                 self.end_headers()
                 self.wfile.write(b"Critical server error during response generation.")
 
-    def _get_config_from_remote(self, remote_url, logs_list_ref):
+    def _get_subscription_entry(self, remote_url, logs_list_ref, parse_mode=PARSE_MODE_ROUNDTRIP):
+        """获取远程订阅的（只读）缓存条目，失败时返回 None 并在日志中记录原因。
+
+        parse_mode 为本次请求需要的解析模式，合并请求时由第一个请求者的模式决定首先解析哪种，
+        其余模式在使用时由 SubscriptionCacheEntry.get_config 按需解析。
+        """
         if not remote_url:
             _add_log_entry(logs_list_ref, "error", "必须提供 'remote_url'。") #
             return None
@@ -299,48 +2816,153 @@ class CustomHandler(http.server.SimpleHTTPRequestHandler):
             return None
 
         # 根据环境变量确定 verify 参数的值
-        ssl_verify_value = True # 默认值
-        if REQUESTS_SSL_VERIFY_CONFIG == "false":
-            ssl_verify_value = False
-            _add_log_entry(logs_list_ref, "warn", "警告：SSL证书验证已禁用 (REQUESTS_SSL_VERIFY=false)。这可能存在安全风险。")
-        elif REQUESTS_SSL_VERIFY_CONFIG != "true":
-            # 如果不是 "true" 或 "false"，则假定它是一个 CA bundle 文件的路径
-            if os.path.exists(REQUESTS_SSL_VERIFY_CONFIG):
-                ssl_verify_value = REQUESTS_SSL_VERIFY_CONFIG
-                _add_log_entry(logs_list_ref, "info", f"SSL证书验证将使用自定义CA证书包: {REQUESTS_SSL_VERIFY_CONFIG}")
-            else:
-                _add_log_entry(logs_list_ref, "error", f"自定义CA证书包路径无效: {REQUESTS_SSL_VERIFY_CONFIG}。将回退到默认验证。")
-                # ssl_verify_value 保持 True
+        ssl_verify_value = _resolve_ssl_verify_value(logs_list_ref)
+        SUBSCRIPTION_REFRESHER.record_request(remote_url, ssl_verify_value, parse_mode)
 
         try:
-            _add_log_entry(logs_list_ref, "info", f"正在请求远程订阅 (URL provided).") #
-            headers = {'User-Agent': 'chain-subconverter/1.0'} #
-            response = requests.get(remote_url, timeout=15, headers=headers, verify=ssl_verify_value) # 使用 ssl_verify_value
-            response.raise_for_status() #
-            _add_log_entry(logs_list_ref, "info", f"远程订阅获取成功，状态码: {response.status_code}") #
-            config_content = response.content #
-            if config_content.startswith(b'\xef\xbb\xbf'): #
-                config_content = config_content[3:] #
-                _add_log_entry(logs_list_ref, "debug", "已移除UTF-8 BOM。") #
-            config_object = yaml.load(config_content) #
-            if not isinstance(config_object, dict) or \
-               not isinstance(config_object.get("proxies"), list): #
-                _add_log_entry(logs_list_ref, "error", "远程YAML格式无效或缺少 'proxies' 列表。") #
-                return None
-            _add_log_entry(logs_list_ref, "debug", "远程配置解析成功。") #
-            return config_object
-        except requests.Timeout:
-            _add_log_entry(logs_list_ref, "error", f"请求远程订阅超时 (URL provided).") #
+            entry, fetch_logs, shared = self._fetch_subscription(remote_url, ssl_verify_value, parse_mode)
+        except SingleFlightTimeout:
+            _add_log_entry(logs_list_ref, "error", f"等待同一远程订阅的并发请求超时 ({SINGLEFLIGHT_WAIT_TIMEOUT:g} 秒)。")
+            return None
+        if shared:
+            _add_log_entry(logs_list_ref, "debug", "已合并到同一远程订阅正在进行的请求。")
+        logs_list_ref.extend(fetch_logs)
+        return entry
+
+    def _fetch_subscription(self, remote_url, ssl_verify_value, parse_mode):
+        """返回 (条目或 None, 获取过程的日志, 是否合并到了其他请求)。缓存未过期或仍可使用时直接使用缓存。"""
+        logs = []
+        cached_entry = _cached_subscription_for_request(remote_url, ssl_verify_value, parse_mode, logs)
+        if cached_entry is not None:
+            return cached_entry, logs, False
+        started = time.perf_counter()
+        try:
+            (entry, fetch_logs), shared = SUBSCRIPTION_FETCH_FLIGHT.do(
+                remote_url, lambda: _fetch_remote_subscription(remote_url, ssl_verify_value, parse_mode), SINGLEFLIGHT_WAIT_TIMEOUT
+            )
+        finally:
+            record_span("fetch", started) # 合并到其他请求时为等待其获取的时间
+        return entry, fetch_logs, shared
+
+    def _get_config_from_remote(self, remote_url, logs_list_ref, parse_mode=PARSE_MODE_ROUNDTRIP, writable=True):
+        """获取远程订阅的配置对象。writable=True 时返回可修改的副本，否则返回共享的只读对象。"""
+        entry = self._get_subscription_entry(remote_url, logs_list_ref, parse_mode)
+        if entry is None:
             return None
-        except requests.RequestException as e:
-            _add_log_entry(logs_list_ref, "error", f"请求远程订阅发生错误 (URL provided): {e}", e) #
+        config_object = entry.get_config(parse_mode, logs_list_ref)
+        if config_object is None:
             return None
-        except Exception as e:
-            _add_log_entry(logs_list_ref, "error", f"处理远程订阅内容时出错 (URL provided): {e}", e) #
+        # 缓存中的条目以及合并请求共享的结果只读，需要修改时每个请求都拿到自己的副本
+        return clone_config(config_object) if writable else config_object
+
+    def _auto_detect_pairs(self, remote_url, logs_list_ref):
+        """返回 perform_auto_detection 的结果 (建议节点对, 检测日志)；无法获取或解析订阅时返回 None。"""
+        if PROCESS_POOL is not None:
+            entry = self._get_subscription_entry(remote_url, logs_list_ref, PARSE_MODE_NAMES)
+            if entry is None:
+                return None
+            parse_logs, detection = run_in_process_pool(_pool_auto_detect, entry.content_hash, entry.content)
+            logs_list_ref.extend(parse_logs)
+            return detection
+        # 自动检测只读取名称，直接使用共享的名称提取结果
+        config_object = self._get_config_from_remote(remote_url, logs_list_ref, PARSE_MODE_NAMES, writable=False)
+        if config_object is None:
+            return None
+        with timed_stage("auto_detect"):
+            return perform_auto_detection(config_object, REGION_KEYWORD_CONFIG, LANDING_NODE_KEYWORDS)
+
+    def _validate_node_pairs(self, remote_url, node_pairs_list, logs_list_ref):
+        """在订阅的节点模型上检查节点对能否应用，返回 (是否成功, 应用日志)；无法获取或解析订阅时返回 None。"""
+        if PROCESS_POOL is not None:
+            entry = self._get_subscription_entry(remote_url, logs_list_ref, PARSE_MODE_NAMES)
+            if entry is None:
+                return None
+            parse_logs, validation = run_in_process_pool(_pool_validate_pairs, entry.content_hash, entry.content, node_pairs_list)
+            logs_list_ref.extend(parse_logs)
+            return validation
+        # 在共享的节点模型上检查，不修改也不复制（旧版本磁盘快照中的名称骨架同样先转换为模型）
+        config_object = self._get_config_from_remote(remote_url, logs_list_ref, PARSE_MODE_NAMES, writable=False)
+        if config_object is None:
             return None
+        with timed_stage("apply_node_pairs"):
+            success, _, apply_logs = apply_node_pairs_to_config(NodeModel.from_config(config_object), node_pairs_list)
+        return success, apply_logs
 
+    # /metrics 中按路由统计请求；其余路径归入 other，避免标签数量随请求路径无限增长
+    METRICS_ROUTES = frozenset(["/", "/frontend.html", "/script.js", "/favicon.ico", "/subscription.yaml",
+                                "/api/auto_detect_pairs", "/api/validate_configuration", "/api/batch_subscriptions",
+                                "/api/status", "/metrics", "/debug/slow"])
+    response_status = None
 
     def do_POST(self):
+        self._handle_with_metrics(self._do_POST)
+
+    def do_GET(self):
+        self._handle_with_metrics(self._do_GET)
+
+    def send_response(self, code, message=None):
+        self.response_status = code
+        super().send_response(code, message)
+
+    def _handle_with_metrics(self, handle):
+        path = urlparse(self.path).path
+        route = path if path in self.METRICS_ROUTES else "other"
+        started = time.perf_counter()
+        INFLIGHT_REQUESTS.add(1)
+        capture_token = REQUEST_LOG_CAPTURE_LEVEL.set(request_log_capture_level(self.path))
+        trace = trace_token = profiler = None
+        if SLOW_REQUESTS.enabled and route != "/debug/slow":
+            # asyncio 服务模式下追踪由连接协程创建，已包含排队与预取订阅的时间
+            trace = CURRENT_TRACE.get()
+            if trace is None:
+                trace = RequestTrace()
+                trace_token = CURRENT_TRACE.set(trace)
+            profiler = SLOW_REQUESTS.start_profile()
+        try:
+            self._run_admitted(handle)
+        finally:
+            REQUEST_LOG_CAPTURE_LEVEL.reset(capture_token)
+            INFLIGHT_REQUESTS.add(-1)
+            HTTP_REQUEST_SECONDS.observe(time.perf_counter() - started, route)
+            HTTP_REQUESTS.inc(route, self.command, str(self.response_status or "none"))
+            if trace is not None:
+                SLOW_REQUESTS.finish(trace, self.command, route, self.response_status, profiler)
+                if trace_token is not None:
+                    CURRENT_TRACE.reset(trace_token)
+
+    def _run_admitted(self, handle):
+        """受准入控制的接口获得处理名额后才执行 handle；排队已满或超时时返回 503。"""
+        path = urlparse(self.path).path
+        if path not in ADMISSION_CONTROLLED_PATHS:
+            handle()
+            return
+        started = time.perf_counter()
+        try:
+            ADMISSION_CONTROLLER.acquire()
+        except AdmissionRejected as e:
+            self.send_overloaded_response(path, e)
+            return
+        finally:
+            record_span("admission_wait", started)
+        try:
+            handle()
+        finally:
+            ADMISSION_CONTROLLER.release()
+
+    def send_overloaded_response(self, path, rejection):
+        reason = "等待队列已满" if rejection.reason == "queue_full" else "排队等待超时"
+        message = f"服务繁忙（{reason}），请在 {rejection.retry_after} 秒后重试。"
+        logger.warning(f"准入控制拒绝请求 {path}: {reason}，当前处理中 {ADMISSION_CONTROLLER.active}，排队 {ADMISSION_CONTROLLER.queue_depth}")
+        headers = {"Retry-After": str(rejection.retry_after)}
+        if path.startswith("/api/"):
+            response_payload = {"success": False, "message": message, "logs": []}
+            if path == "/api/auto_detect_pairs":
+                response_payload["suggested_pairs"] = []
+            self.send_json_response(response_payload, 503, headers)
+        else:
+            self.send_error_response(message, 503, headers)
+
+    def _do_POST(self):
         parsed_url = urlparse(self.path)
         request_logs = [] # Renamed to avoid confusion with 'logs' parameter in other functions
 
@@ -373,8 +2995,8 @@ class CustomHandler(http.server.SimpleHTTPRequestHandler):
 
                 _add_log_entry(request_logs, "info", f"开始验证配置 (URL provided), 节点对数量={len(node_pairs_tuples)}")
 
-                config_object = self._get_config_from_remote(remote_url, request_logs)
-                if config_object is None:
+                validation = self._validate_node_pairs(remote_url, node_pairs_tuples, request_logs)
+                if validation is None:
                     # _get_config_from_remote already added specific error to request_logs
                     client_message = "无法获取或解析远程配置以进行验证。"
                     if request_logs:
@@ -386,8 +3008,8 @@ class CustomHandler(http.server.SimpleHTTPRequestHandler):
                     self.send_json_response({"success": False, "message": client_message, "logs": request_logs}, 400)
                     return
 
-                # config_object is valid, now try to apply pairs
-                success, _, apply_logs_from_func = apply_node_pairs_to_config(config_object, node_pairs_tuples)
+                # config_object is valid, pairs have been applied
+                success, apply_logs_from_func = validation
 
                 if success:
                     request_logs.extend(apply_logs_from_func) # Add apply logs for successful case
@@ -415,11 +3037,13 @@ class CustomHandler(http.server.SimpleHTTPRequestHandler):
             except Exception as e:
                 _add_log_entry(request_logs, "error", f"处理 /api/validate_configuration 时发生意外错误: {e}", e)
                 self.send_json_response({"success": False, "message": "服务器内部错误。", "logs": request_logs}, 500)
+        elif parsed_url.path == "/api/batch_subscriptions":
+            self.handle_batch_subscriptions(request_logs)
         else:
             self.send_error_response("此路径不支持POST请求。", 405)
 
 
-    def do_GET(self):
+    def _do_GET(self):
         parsed_url = urlparse(self.path)
         query_params = parse_qs(parsed_url.query)
         request_logs = []
@@ -428,9 +3052,9 @@ class CustomHandler(http.server.SimpleHTTPRequestHandler):
             remote_url = query_params.get('remote_url', [None])[0]
             _add_log_entry(request_logs, "info", f"收到 /api/auto_detect_pairs 请求 (URL provided).")
 
-            config_object = self._get_config_from_remote(remote_url, request_logs)
+            detection = self._auto_detect_pairs(remote_url, request_logs)
             client_message_auto_detect = "无法获取或解析远程配置。"
-            if config_object is None:
+            if detection is None:
                 if request_logs:
                     reason = next((log_entry['message'] for log_entry in reversed(request_logs) if log_entry['level'] in ['ERROR', 'WARN']), None)
                     if reason:
@@ -443,7 +3067,7 @@ class CustomHandler(http.server.SimpleHTTPRequestHandler):
                 }, 400)
                 return
 
-            suggested_pairs, detect_logs = perform_auto_detection(config_object, REGION_KEYWORD_CONFIG, LANDING_NODE_KEYWORDS)
+            suggested_pairs, detect_logs = detection
             request_logs.extend(detect_logs)
 
             success_flag = True if suggested_pairs else False
@@ -476,39 +3100,85 @@ class CustomHandler(http.server.SimpleHTTPRequestHandler):
 
             _add_log_entry(request_logs, "info", f"收到 /subscription.yaml 请求 (URL provided), manual_pairs='{manual_pairs_str}' (解析后 {len(node_pairs_list)} 对)")
 
-            config_object = self._get_config_from_remote(remote_url, request_logs)
-            if config_object is None:
+            entry = self._get_subscription_entry(remote_url, request_logs)
+            if entry is None:
                 error_detail = request_logs[-1]['message'] if request_logs and request_logs[-1]['message'] else '未知错误'
                 self.send_error_response(f"错误: 无法获取或解析远程配置。详情: {error_detail}", 502)
                 return
+            self.subscription_entry = entry
 
-            success, modified_config, apply_logs_from_func = apply_node_pairs_to_config(config_object, node_pairs_list)
+            render_key = render_cache_key(entry.content_hash, node_pairs_list)
+            etag = render_etag(render_key)
+            if etag_matches(self.headers.get("If-None-Match"), etag):
+                CACHE_LOOKUPS.inc("render", "not_modified")
+                _add_log_entry(request_logs, "info", "订阅内容与节点对均未变化，返回 304。")
+                encoding = self.response_encoding()
+                self.send_response(304)
+                self.send_header("ETag", encoded_etag(etag, encoding))
+                self.send_encoding_headers(None)
+                self.send_header("Cache-Control", "no-cache")
+                self.send_subscription_age_header()
+                self.end_headers()
+                return
+            cached_output = RENDER_CACHE.get(render_key)
+            CACHE_LOOKUPS.inc("render", "hit" if cached_output is not None else "miss")
+            if cached_output is not None:
+                _add_log_entry(request_logs, "info", "使用已缓存的YAML渲染结果。")
+                self.send_subscription_yaml(cached_output, etag)
+                return
+            incremental_output = render_incrementally(entry, node_pairs_list, request_logs)
+            if incremental_output is not None:
+                cache_rendered_output(entry, render_key, incremental_output)
+                self.send_subscription_yaml(incremental_output, etag)
+                return
+
+            if PROCESS_POOL is not None:
+                self.render_in_process_pool(entry, node_pairs_list, etag, render_key, request_logs)
+                return
+            config_object = entry.get_config(PARSE_MODE_ROUNDTRIP, request_logs)
+            if config_object is None:
+                error_detail = request_logs[-1]['message'] if request_logs and request_logs[-1]['message'] else '未知错误'
+                self.send_error_response(f"错误: 无法获取或解析远程配置。详情: {error_detail}", 502)
+                return
+            with timed_stage("clone_config"):
+                config_copy = clone_config(config_object)
+            with timed_stage("apply_node_pairs"):
+                success, modified_config, apply_logs_from_func = apply_node_pairs_to_config(config_copy, node_pairs_list)
             request_logs.extend(apply_logs_from_func)
 
-            if success:
+            if success and SUBSCRIPTION_STREAMING:
+                self.stream_subscription_yaml(modified_config, etag, render_key, request_logs)
+            elif success:
                 try:
                     output = StringIO()
-                    yaml.dump(modified_config, output)
-                    final_yaml_string = output.getvalue()
+                    with timed_stage("dump"):
+                        get_yaml().dump(modified_config, output)
+                    final_yaml_bytes = output.getvalue().encode("utf-8")
                     _add_log_entry(request_logs, "info", "成功生成YAML配置。")
-                    self.send_response(200)
-                    self.send_header("Content-Type", "text/yaml; charset=utf-8")
-                    self.send_header("Cache-Control", "no-cache, no-store, must-revalidate")
-                    self.send_header("Content-Disposition", f"inline; filename=\"chain_subscription_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}.yaml\"")
-                    self.end_headers()
-                    self.wfile.write(final_yaml_string.encode("utf-8"))
+                    cache_rendered_output(entry, render_key, final_yaml_bytes)
+                    self.send_subscription_yaml(final_yaml_bytes, etag)
                 except Exception as e:
                     _add_log_entry(request_logs, "error", f"生成最终YAML时出错: {e}", e)
                     self.send_error_response(f"服务器内部错误：无法生成YAML。详情: {e}", 500)
             else: # success is False from apply_node_pairs_to_config
-                client_error_detail = "应用节点对失败。" # Default
-                if apply_logs_from_func: # Get specific reason from apply_node_pairs_to_config's logs
-                     reason = next((log_entry['message'] for log_entry in reversed(apply_logs_from_func) if log_entry['level'] in ['ERROR', 'WARN']), None)
-                     if reason:
-                        client_error_detail = reason
-                _add_log_entry(request_logs, "error", "应用节点对到配置时失败（/subscription.yaml）。") # Server-side log
-                self.send_error_response(f"错误: {client_error_detail}", 400)
+                self.send_apply_failure(apply_logs_from_func, request_logs)
 
+        elif parsed_url.path == "/metrics":
+            body = METRICS.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Cache-Control", "no-cache, no-store, must-revalidate")
+            self.end_headers()
+            self.wfile.write(body)
+        elif parsed_url.path == "/debug/slow" and SLOW_REQUESTS.enabled:
+            self.send_json_response(SLOW_REQUESTS.snapshot(), 200)
+        elif parsed_url.path == "/api/status":
+            self.send_json_response({
+                "admission": ADMISSION_CONTROLLER.stats(),
+                "upstream_hosts": UPSTREAM_HOST_LIMITER.stats(),
+                "background_refresh": SUBSCRIPTION_REFRESHER.stats(),
+            }, 200)
         elif parsed_url.path == "/" or parsed_url.path == "/frontend.html":
             self.serve_static_file("frontend.html", "text/html; charset=utf-8")
         elif parsed_url.path == "/script.js":
@@ -519,70 +3189,278 @@ class CustomHandler(http.server.SimpleHTTPRequestHandler):
             self.send_error_response(f"资源未找到: {self.path}", 404)
 
     def serve_static_file(self, file_name, content_type):
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        file_path = os.path.join(script_dir, file_name)
-        normalized_script_dir = os.path.normcase(os.path.normpath(script_dir))
-        normalized_file_path = os.path.normcase(os.path.normpath(os.path.realpath(file_path)))
-        if not normalized_script_dir.endswith(os.sep):
-            normalized_script_dir += os.sep
-        if not normalized_file_path.startswith(normalized_script_dir):
-            logger.warning(f"禁止访问：尝试访问脚本目录之外的文件: {file_path}")
-            self.send_error_response(f"禁止访问: {self.path}", 403)
+        try:
+            asset = STATIC_ASSETS.get(file_name)
+        except StaticAssetError as e:
+            self.send_error_response(str(e), e.status)
             return
-        ext = os.path.splitext(file_path)[1].lower()
-        if ext not in self.ALLOWED_EXTENSIONS:
-            logger.warning(f"禁止访问：不允许的文件类型 {ext} 对于路径 {file_path}")
-            self.send_error_response(f"文件类型 {ext} 不允许访问", 403)
+        except Exception as e:
+            logger.error(f"读取或提供静态文件 {file_name} 时发生错误: {e}", exc_info=True)
+            self.send_error_response(f"提供文件时出错: {e}", 500)
             return
-        if not os.path.exists(file_path) or not os.path.isfile(file_path):
-            logger.warning(f"静态文件未找到或不是一个文件: {file_path}")
-            self.send_error_response(f"资源未找到: {self.path}", 404)
+        encoding, body = asset.body_for(self.response_encoding())
+        logger.debug(f"正在提供静态文件: {asset.file_path} 类型: {content_type} 编码: {encoding or 'identity'}")
+        not_modified = etag_matches(self.headers.get("If-None-Match"), asset.etag)
+        self.send_response(304 if not_modified else 200)
+        if not not_modified:
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+        self.send_encoding_headers(encoding if not not_modified else None)
+        self.send_header("ETag", encoded_etag(asset.etag, encoding))
+        if content_type.startswith("text/html") or content_type.startswith("application/javascript"):
+            # 内容不变时客户端凭 ETag 得到 304，更新部署后仍会立即取到新版本
+            self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        if not not_modified:
+            self.wfile.write(body)
+
+    def send_apply_failure(self, apply_logs_from_func, request_logs):
+        client_error_detail = "应用节点对失败。" # Default
+        if apply_logs_from_func: # Get specific reason from apply_node_pairs_to_config's logs
+             reason = next((log_entry['message'] for log_entry in reversed(apply_logs_from_func) if log_entry['level'] in ['ERROR', 'WARN']), None)
+             if reason:
+                client_error_detail = reason
+        _add_log_entry(request_logs, "error", "应用节点对到配置时失败（/subscription.yaml）。") # Server-side log
+        self.send_error_response(f"错误: {client_error_detail}", 400)
+
+    def handle_batch_subscriptions(self, request_logs):
+        """批量生成订阅。请求体为 {"jobs": [{"id": 可选标识, "remote_url": ..., "node_pairs": [{"landing": ..., "front": ...}]}]}。
+
+        同一批次中每个不同的远程订阅只获取、解析一次（不同订阅并发获取），各任务在解析结果的结构副本上应用节点对。
+        结果以 NDJSON 按任务顺序逐行返回，每行含该任务的状态码、YAML 文本与日志；最后一行为汇总，
+        客户端未收到汇总行即说明响应被中断。
+        """
+        try:
+            content_length = int(self.headers.get('Content-Length', 0))
+            data = json.loads(self.rfile.read(content_length).decode('utf-8')) if content_length > 0 else None
+        except (ValueError, UnicodeDecodeError) as e:
+            _add_log_entry(request_logs, "error", f"解析请求体JSON时出错: {e}", e)
+            self.send_json_response({"success": False, "message": "请求体JSON格式错误。", "logs": request_logs}, 400)
+            return
+        jobs = data.get("jobs") if isinstance(data, dict) else None
+        if not isinstance(jobs, list) or not jobs:
+            client_message = "请求中的 'jobs' 格式无效，应为非空列表。"
+        elif BATCH_MAX_JOBS > 0 and len(jobs) > BATCH_MAX_JOBS:
+            client_message = f"任务数 {len(jobs)} 超过单次请求的上限 {BATCH_MAX_JOBS}。"
+        else:
+            client_message = None
+        if client_message is not None:
+            _add_log_entry(request_logs, "error", client_message)
+            self.send_json_response({"success": False, "message": client_message, "logs": request_logs}, 400)
+            return
+
+        job_logs = [[] for _ in jobs]
+        parsed_jobs = [self._parse_batch_job(job, logs) for job, logs in zip(jobs, job_logs)]
+        remote_urls = list(dict.fromkeys(parsed[0] for parsed in parsed_jobs if parsed is not None))
+        _add_log_entry(request_logs, "info", f"收到 /api/batch_subscriptions 请求：{len(jobs)} 个任务，{len(remote_urls)} 个不同的远程订阅。")
+
+        writer = NdjsonResponseWriter(self)
+        succeeded = 0
+        with ThreadPoolExecutor(max_workers=max(1, min(BATCH_FETCH_WORKERS, len(remote_urls))), thread_name_prefix="batch-fetch") as fetcher:
+            # 每个获取任务在当前请求上下文的副本中执行，沿用本请求的日志收集级别
+            sources = {
+                remote_url: fetcher.submit(contextvars.copy_context().run, self._load_batch_source, remote_url)
+                for remote_url in remote_urls
+            }
+            try:
+                for index, (job, parsed, logs) in enumerate(zip(jobs, parsed_jobs, job_logs)):
+                    result = self._run_batch_job(index, job, parsed, sources, logs)
+                    succeeded += result["success"]
+                    writer.write_line(result)
+                writer.write_line({"done": True, "total": len(jobs), "succeeded": succeeded, "failed": len(jobs) - succeeded})
+                writer.finish()
+            except ConnectionError as e:
+                logger.info(f"客户端在批量生成过程中断开连接: {e}")
+                for future in sources.values():
+                    future.cancel()
+                writer.abort()
+                return
+        _add_log_entry(request_logs, "info", f"批量生成完成：成功 {succeeded} 个，失败 {len(jobs) - succeeded} 个。")
+
+    @staticmethod
+    def _parse_batch_job(job, job_logs):
+        """校验单个批量任务，返回 (remote_url, 节点对列表)；格式无效时返回 None 并在日志中记录原因。"""
+        if not isinstance(job, dict):
+            _add_log_entry(job_logs, "error", "任务格式无效，应为包含 'remote_url' 与 'node_pairs' 的对象。")
+            return None
+        remote_url = job.get("remote_url")
+        if not isinstance(remote_url, str) or not remote_url:
+            _add_log_entry(job_logs, "error", "必须提供 'remote_url'。")
+            return None
+        node_pairs_from_request = job.get("node_pairs", [])
+        if not isinstance(node_pairs_from_request, list):
+            _add_log_entry(job_logs, "error", "请求中的 'node_pairs' 格式无效，应为列表。")
+            return None
+        node_pairs_list = []
+        for pair_dict in node_pairs_from_request:
+            if isinstance(pair_dict, dict) and "landing" in pair_dict and "front" in pair_dict:
+                node_pairs_list.append((str(pair_dict["landing"]), str(pair_dict["front"])))
+            else:
+                _add_log_entry(job_logs, "warn", f"提供的节点对 '{pair_dict}' 格式不正确，已跳过。")
+        return remote_url, node_pairs_list
+
+    def _load_batch_source(self, remote_url):
+        """获取并解析批量任务用到的一个远程订阅，返回 (缓存条目或 None, round-trip 配置对象或 None, 日志)。
+
+        使用进程池时由工作进程解析，这里不解析，配置对象为 None。
+        """
+        logs = []
+        entry = self._get_subscription_entry(remote_url, logs)
+        config_object = None
+        if entry is not None and PROCESS_POOL is None:
+            config_object = entry.get_config(PARSE_MODE_ROUNDTRIP, logs)
+        return entry, config_object, logs
+
+    def _run_batch_job(self, index, job, parsed, sources, job_logs):
+        """执行一个批量任务，返回该任务的结果行。"""
+        result = {"index": index, "id": job.get("id", index) if isinstance(job, dict) else index}
+        status, message, body, etag = 400, None, None, None
+        if parsed is not None:
+            remote_url, node_pairs_list = parsed
+            entry, config_object, source_logs = sources[remote_url].result()
+            job_logs.extend(source_logs)
+            if entry is not None:
+                result["subscription_age"] = int(entry.age())
+            try:
+                status, message, body, etag = self._render_batch_job(entry, config_object, node_pairs_list, job_logs)
+            except Exception as e:
+                _add_log_entry(job_logs, "error", f"批量任务 {index} 生成YAML时发生意外错误: {e}", e)
+                status, message = 500, f"服务器内部错误：无法生成YAML。详情: {e}"
+        if message is None:
+            message = next((log_entry['message'] for log_entry in reversed(job_logs) if log_entry['level'] == 'ERROR'), "任务格式无效。")
+        result.update({
+            "success": status == 200,
+            "status": status,
+            "message": message,
+            "etag": etag,
+            "yaml": body.decode("utf-8") if body is not None else None,
+            "logs": job_logs,
+        })
+        return result
+
+    def _render_batch_job(self, entry, config_object, node_pairs_list, job_logs):
+        """为一个批量任务生成 YAML，返回 (状态码, 消息, YAML 字节或 None, ETag 或 None)；状态码含义与 /subscription.yaml 一致。"""
+        if entry is None:
+            error_detail = job_logs[-1]['message'] if job_logs and job_logs[-1]['message'] else '未知错误'
+            return 502, f"错误: 无法获取或解析远程配置。详情: {error_detail}", None, None
+        render_key = render_cache_key(entry.content_hash, node_pairs_list)
+        etag = render_etag(render_key)
+        cached_output = RENDER_CACHE.get(render_key)
+        CACHE_LOOKUPS.inc("render", "hit" if cached_output is not None else "miss")
+        if cached_output is not None:
+            return 200, "使用已缓存的YAML渲染结果。", cached_output, etag
+        incremental_output = render_incrementally(entry, node_pairs_list, job_logs)
+        if incremental_output is not None:
+            cache_rendered_output(entry, render_key, incremental_output)
+            return 200, "已在上次的输出基础上增量生成YAML配置。", incremental_output, etag
+
+        if PROCESS_POOL is not None:
+            parse_logs, rendered = run_in_process_pool(_pool_render_subscription, entry.content_hash, entry.content, node_pairs_list)
+            job_logs.extend(parse_logs)
+        else:
+            rendered = render_node_pairs(config_object, node_pairs_list) if config_object is not None else None
+        if rendered is None:
+            error_detail = job_logs[-1]['message'] if job_logs and job_logs[-1]['message'] else '未知错误'
+            return 502, f"错误: 无法获取或解析远程配置。详情: {error_detail}", None, None
+        success, apply_logs_from_func, final_yaml_bytes, dump_error = rendered
+        job_logs.extend(apply_logs_from_func)
+
+        if not success:
+            reason = next((log_entry['message'] for log_entry in reversed(apply_logs_from_func) if log_entry['level'] in ['ERROR', 'WARN']), "应用节点对失败。")
+            return 400, f"错误: {reason}", None, None
+        if dump_error is not None:
+            _add_log_entry(job_logs, "error", f"生成最终YAML时出错: {dump_error}")
+            return 500, f"服务器内部错误：无法生成YAML。详情: {dump_error}", None, None
+        cache_rendered_output(entry, render_key, final_yaml_bytes)
+        return 200, "成功生成YAML配置。", final_yaml_bytes, etag
+
+    def render_in_process_pool(self, entry, node_pairs_list, etag, render_key, request_logs):
+        """在工作进程中解析订阅、应用节点对并输出 YAML，响应与进程内处理时一致（不使用分块输出）。"""
+        try:
+            parse_logs, rendered = run_in_process_pool(_pool_render_subscription, entry.content_hash, entry.content, node_pairs_list)
+        except Exception as e:
+            _add_log_entry(request_logs, "error", f"生成最终YAML时出错: {e}", e)
+            self.send_error_response(f"服务器内部错误：无法生成YAML。详情: {e}", 500)
             return
+        request_logs.extend(parse_logs)
+        if rendered is None:
+            error_detail = request_logs[-1]['message'] if request_logs and request_logs[-1]['message'] else '未知错误'
+            self.send_error_response(f"错误: 无法获取或解析远程配置。详情: {error_detail}", 502)
+            return
+        success, apply_logs_from_func, final_yaml_bytes, dump_error = rendered
+        request_logs.extend(apply_logs_from_func)
+        if not success:
+            self.send_apply_failure(apply_logs_from_func, request_logs)
+        elif dump_error is not None:
+            _add_log_entry(request_logs, "error", f"生成最终YAML时出错: {dump_error}")
+            self.send_error_response(f"服务器内部错误：无法生成YAML。详情: {dump_error}", 500)
+        else:
+            _add_log_entry(request_logs, "info", "成功生成YAML配置。")
+            cache_rendered_output(entry, render_key, final_yaml_bytes)
+            self.send_subscription_yaml(final_yaml_bytes, etag)
+
+    def send_subscription_yaml(self, body, etag):
+        encoding = self.response_encoding(len(body))
+        if encoding is not None:
+            # 压缩结果与渲染结果一同缓存，同一订阅的后续请求无需重新压缩
+            compressed_key = (etag, encoding)
+            compressed = RENDER_CACHE.get(compressed_key)
+            if compressed is None:
+                with timed_stage("compress"):
+                    compressed = compress_body(body, encoding)
+                RENDER_CACHE.put(compressed_key, compressed, len(compressed))
+            body = compressed
+        self.send_response(200)
+        self.send_header("Content-Type", "text/yaml; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_encoding_headers(encoding)
+        # no-cache 允许客户端缓存，但每次使用前须携带 If-None-Match 重新验证
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("ETag", encoded_etag(etag, encoding))
+        self.send_header("Content-Disposition", f"inline; filename=\"chain_subscription_{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}.yaml\"")
+        self.send_subscription_age_header()
+        self.end_headers()
+        with timed_stage("write"):
+            self.wfile.write(body)
+
+    def send_subscription_age_header(self):
+        """告知客户端所用上游订阅距上次成功获取或验证的秒数，过期后仍在使用旧订阅时可据此判断。"""
+        if self.subscription_entry is not None:
+            self.send_header("X-Subscription-Age", str(int(self.subscription_entry.age())))
+
+    def stream_subscription_yaml(self, config_object, etag, render_key, request_logs):
+        """边生成边把 YAML 写入连接。
+
+        输出在缓冲区满前出错时仍可返回正常的 500 响应；开始发送后再出错只能中断连接，
+        分块传输下客户端会因为缺少结束块而识别出响应不完整。
+        """
+        writer = StreamingResponseWriter(self, etag, capture=RENDER_CACHE.enabled or INCREMENTAL_RENDERS.enabled)
         try:
-            with open(file_path, "rb") as f:
-                content_to_serve = f.read()
-
-            if file_name == "frontend.html":
-                logger.debug(f"Modifying frontend.html to inject SHOW_SERVICE_ADDRESS_CONFIG: {SHOW_SERVICE_ADDRESS_CONFIG_ENV}")
-                html_content_str = content_to_serve.decode('utf-8')
-                js_config_script = f"<script>window.SHOW_SERVICE_ADDRESS_CONFIG = {str(SHOW_SERVICE_ADDRESS_CONFIG_ENV).lower()};</script>"
-                # Insert before closing </head> tag
-                insertion_point = html_content_str.find("</head>")
-                if insertion_point != -1:
-                    html_content_str = html_content_str[:insertion_point] + js_config_script + html_content_str[insertion_point:]
-                else:
-                    logger.warning("</head> tag not found in frontend.html, config script not injected near head. Trying before body.")
-                    insertion_point_body = html_content_str.find("<body")
-                    if insertion_point_body != -1: # find opening body tag
-                         # find where that tag ends
-                        end_of_body_tag = html_content_str.find(">",insertion_point_body)
-                        if end_of_body_tag != -1:
-                             html_content_str = html_content_str[:end_of_body_tag+1] + js_config_script + html_content_str[end_of_body_tag+1:]
-                        else: # fallback if body tag is weirdly formatted
-                             html_content_str = js_config_script + html_content_str # prepend
-                    else: # ultimate fallback
-                        html_content_str = js_config_script + html_content_str # prepend
-                content_to_serve = html_content_str.encode('utf-8')
-
-
-            logger.info(f"正在提供静态文件: {file_path} 类型: {content_type}")
-            self.send_response(200)
-            self.send_header("Content-Type", content_type)
-            self.send_header("Content-Length", str(len(content_to_serve)))
-            if content_type.startswith("text/html") or content_type.startswith("application/javascript"):
-                 self.send_header("Cache-Control", "no-cache, no-store, must-revalidate")
-            self.end_headers()
-            self.wfile.write(content_to_serve)
+            with timed_stage("dump"): # 分块输出时包含向客户端写出的时间
+                get_yaml().dump(config_object, writer)
+            # 在发送结束块之前写入缓存，客户端收到完整响应时缓存已可用
+            body = writer.captured_body()
+            if body is not None:
+                cache_rendered_output(self.subscription_entry, render_key, body)
+            writer.finish()
         except Exception as e:
-            logger.error(f"读取或提供静态文件 {file_path} 时发生错误: {e}", exc_info=True)
-            self.send_error_response(f"提供文件时出错: {e}", 500)
+            if not writer.started:
+                _add_log_entry(request_logs, "error", f"生成最终YAML时出错: {e}", e)
+                self.send_error_response(f"服务器内部错误：无法生成YAML。详情: {e}", 500)
+            else:
+                _add_log_entry(request_logs, "error", f"输出YAML过程中出错，已中断响应: {e}", e)
+                writer.abort()
+            return
+        _add_log_entry(request_logs, "info", "成功生成YAML配置。")
 
-    def send_error_response(self, message, code=500):
+    def send_error_response(self, message, code=500, extra_headers=None):
         logger.info(f"发送错误响应: code={code}, message='{message}'")
         self.send_response(code)
         self.send_header("Content-Type", "text/plain; charset=utf-8")
         self.send_header("Cache-Control", "no-cache, no-store, must-revalidate")
         self.send_header("Content-Length", str(len(message.encode('utf-8'))))
+        for header_name, header_value in (extra_headers or {}).items():
+            self.send_header(header_name, header_value)
         self.end_headers()
         self.wfile.write(message.encode("utf-8"))
 
@@ -590,6 +3468,361 @@ class CustomHandler(http.server.SimpleHTTPRequestHandler):
         logger.debug(f"HTTP Request: {self.address_string()} {self.requestline} -> Status: {args[0] if args else 'N/A'}")
         return
 
+# --- asyncio 服务模式 ---
+class AsyncSingleFlight:
+    """SingleFlight 的 asyncio 版本：同一 key 的并发协程共享同一次执行的结果。"""
+    def __init__(self):
+        self._tasks = {}
+
+    async def do(self, key, coro_fn, timeout=None):
+        task = self._tasks.get(key)
+        if task is None:
+            task = asyncio.ensure_future(coro_fn())
+            self._tasks[key] = task
+            task.add_done_callback(lambda _task: self._tasks.pop(key, None))
+            return await task, False
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), timeout), True
+        except asyncio.TimeoutError:
+            raise SingleFlightTimeout(key) from None
+
+class _AsyncUpstreamClient:
+    """asyncio 服务模式下的上游客户端，返回值与异常同 _upstream_get。
+
+    安装了 aiohttp 时全程非阻塞；否则在有界线程池中调用 _upstream_get，等待上游的请求数不会超过线程数。
+    """
+    def __init__(self):
+        self._session = None
+        self._ssl_contexts = {}
+        self._executor = None
+        if aiohttp is None:
+            self._executor = ThreadPoolExecutor(max_workers=ASYNC_UPSTREAM_THREADS, thread_name_prefix="upstream")
+
+    async def get(self, remote_url, headers, ssl_verify_value, incremental_parse=None):
+        if self._executor is not None:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(
+                self._executor, _upstream_get, remote_url, headers, ssl_verify_value, incremental_parse
+            )
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=UPSTREAM_FETCH_DEADLINE, sock_connect=15, sock_read=15),
+                cookie_jar=aiohttp.DummyCookieJar(), # 与 HTTP_SESSION 一致，不保存任何 Cookie
+                trace_configs=[_upstream_trace_config()] if SLOW_REQUESTS.enabled else None,
+            )
+        body = _UpstreamBody(incremental_parse)
+        try:
+            for attempt in range(REQUESTS_MAX_RETRIES + 1):
+                retry_allowed = attempt < REQUESTS_MAX_RETRIES
+                try:
+                    started = time.perf_counter()
+                    async with self._session.get(remote_url, headers=headers, ssl=self._ssl_param(ssl_verify_value)) as response:
+                        record_span("upstream_headers", started)
+                        if response.status in (502, 503, 504) and retry_allowed:
+                            await asyncio.sleep(REQUESTS_RETRY_BACKOFF * (2 ** attempt))
+                            continue
+                        response.raise_for_status()
+                        body.check_declared_length(response.headers)
+                        started = time.perf_counter()
+                        async for chunk in response.content.iter_chunked(UPSTREAM_CHUNK_SIZE):
+                            body.add(chunk)
+                        record_span("upstream_download", started)
+                        return response.status, response.headers, body.finish()
+                except aiohttp.ClientConnectionError:
+                    if not retry_allowed:
+                        raise
+                    await asyncio.sleep(REQUESTS_RETRY_BACKOFF * (2 ** attempt))
+        except BaseException:
+            body.abort()
+            raise
+
+    def _ssl_param(self, ssl_verify_value):
+        if ssl_verify_value is True:
+            return None
+        if ssl_verify_value is False:
+            return False
+        context = self._ssl_contexts.get(ssl_verify_value)
+        if context is None:
+            context = self._ssl_contexts[ssl_verify_value] = ssl.create_default_context(cafile=ssl_verify_value)
+        return context
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+
+def _upstream_trace_config():
+    """把 aiohttp 的 DNS 解析与建立连接（含 TLS 握手）耗时作为 span 记入请求追踪。"""
+    trace_config = aiohttp.TraceConfig()
+
+    async def on_dns_start(session, context, params):
+        context.dns_started = time.perf_counter()
+
+    async def on_dns_end(session, context, params):
+        record_span("upstream_dns", context.dns_started)
+
+    async def on_connect_start(session, context, params):
+        context.connect_started = time.perf_counter()
+
+    async def on_connect_end(session, context, params):
+        record_span("upstream_connect", context.connect_started)
+
+    trace_config.on_dns_resolvehost_start.append(on_dns_start)
+    trace_config.on_dns_resolvehost_end.append(on_dns_end)
+    trace_config.on_connection_create_start.append(on_connect_start)
+    trace_config.on_connection_create_end.append(on_connect_end)
+    return trace_config
+
+_ASYNC_UPSTREAM_ERRORS = (requests.RequestException,) + ((aiohttp.ClientError,) if aiohttp is not None else ())
+
+async def _fetch_remote_subscription_async(client, executor, remote_url, ssl_verify_value, parse_mode):
+    """_fetch_remote_subscription 的协程版本：等待上游时不占用线程，解析在 executor 中执行。"""
+    logs = []
+    fresh_entry = _fresh_cached_subscription(remote_url, logs)
+    if fresh_entry is not None:
+        return fresh_entry, logs
+    cached_entry = SUBSCRIPTION_CACHE.get(remote_url)
+    upstream_host = urlparse(remote_url).hostname or ""
+    incremental_parse = _incremental_parse_for(cached_entry, parse_mode)
+    _add_log_entry(logs, "info", f"正在请求远程订阅 (URL provided).") #
+    try:
+        await UPSTREAM_HOST_LIMITER.acquire_async(upstream_host)
+        try:
+            with timed_stage("upstream_fetch"):
+                status_code, response_headers, config_content = await client.get(
+                    remote_url, _conditional_request_headers(cached_entry), ssl_verify_value, incremental_parse
+                )
+        finally:
+            UPSTREAM_HOST_LIMITER.release(upstream_host)
+        entry = await asyncio.get_running_loop().run_in_executor(
+            executor, contextvars.copy_context().run, _accept_subscription_response, # 沿用当前请求的日志收集级别
+            remote_url, cached_entry, status_code, response_headers, config_content, parse_mode, logs,
+            incremental_parse,
+        )
+        return entry, logs
+    except AdmissionRejected:
+        UPSTREAM_FETCHES.inc("host_limit")
+        _add_log_entry(logs, "error", f"同一上游主机的并发请求数已达上限 ({UPSTREAM_HOST_MAX_CONCURRENT})，等待超时。")
+        return None, logs
+    except (requests.Timeout, asyncio.TimeoutError):
+        UPSTREAM_FETCHES.inc("timeout")
+        _add_log_entry(logs, "error", f"请求远程订阅超时 (URL provided).") #
+        return None, logs
+    except _ASYNC_UPSTREAM_ERRORS as e:
+        status = getattr(getattr(e, "response", None), "status_code", None) or getattr(e, "status", None)
+        UPSTREAM_FETCHES.inc(str(status) if status else "error")
+        _add_log_entry(logs, "error", f"请求远程订阅发生错误 (URL provided): {e}", e) #
+        return None, logs
+    except Exception as e:
+        _add_log_entry(logs, "error", f"处理远程订阅内容时出错 (URL provided): {e}", e) #
+        return None, logs
+
+class _AsyncResponseWriter:
+    """供工作线程中的处理器使用的 wfile：把数据交给事件循环写出，并等待 drain 以遵守背压。"""
+    closed = False
+
+    def __init__(self, stream_writer, loop):
+        self._stream_writer = stream_writer
+        self._loop = loop
+
+    async def _write(self, data):
+        self._stream_writer.write(data)
+        await self._stream_writer.drain()
+
+    def write(self, data):
+        if data:
+            asyncio.run_coroutine_threadsafe(self._write(bytes(data)), self._loop).result()
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        pass
+
+class _AsyncBridgeHandler(CustomHandler):
+    """在工作线程中运行 CustomHandler 的路由逻辑。
+
+    请求已由事件循环完整读取，远程订阅也已在事件循环中获取好 (prefetched)，
+    因此处理器只做解析/输出等 CPU 工作，不会在线程中等待上游。
+    """
+    def __init__(self, raw_request, client_address, server, response_writer, prefetched, admission_rejection=None):
+        self._response_writer = response_writer
+        self._prefetched = prefetched
+        self._admission_rejection = admission_rejection
+        super().__init__(raw_request, client_address, server)
+
+    def _run_admitted(self, handle):
+        # 准入控制已在事件循环中完成，排队期间不占用工作线程
+        path = urlparse(self.path).path
+        if self._admission_rejection is not None and path in ADMISSION_CONTROLLED_PATHS:
+            self.send_overloaded_response(path, self._admission_rejection)
+            return
+        handle()
+
+    def setup(self):
+        self.connection = None
+        self.rfile = io.BytesIO(self.request)
+        self.wfile = self._response_writer
+
+    def _fetch_subscription(self, remote_url, ssl_verify_value, parse_mode):
+        prefetched = self._prefetched.pop(remote_url, None)
+        if prefetched is None:
+            return super()._fetch_subscription(remote_url, ssl_verify_value, parse_mode)
+        if isinstance(prefetched, Exception):
+            raise prefetched
+        return prefetched
+
+class AsyncioServer:
+    """asyncio 服务引擎 (SERVER_ENGINE=asyncio)，提供与 ThreadingHTTPServer + CustomHandler 相同的路由。
+
+    每个连接只占用一个协程：请求头与请求体、上游订阅都在事件循环中等待，
+    之后才把 CustomHandler 交给大小固定的线程池执行 YAML 解析、节点对应用与输出。
+    与 ThreadingHTTPServer 一样，每个连接只处理一个请求。
+    """
+    MAX_HEADER_BYTES = 64 * 1024
+
+    def __init__(self, server_address, handler_class=_AsyncBridgeHandler):
+        self.server_address = server_address
+        self.handler_class = handler_class
+        self._executor = ThreadPoolExecutor(max_workers=ASYNC_WORKER_THREADS, thread_name_prefix="worker")
+        self._client = _AsyncUpstreamClient()
+        self._flight = AsyncSingleFlight()
+
+    async def serve_forever(self, ready_callback=None):
+        server = await asyncio.start_server(
+            self._handle_connection, *self.server_address, limit=self.MAX_HEADER_BYTES
+        )
+        self.server_address = server.sockets[0].getsockname()[:2] # 与 socketserver 一致，绑定后记录实际地址
+        try:
+            async with server:
+                if ready_callback is not None:
+                    ready_callback()
+                await server.serve_forever()
+        finally:
+            await self._client.close()
+            self._executor.shutdown(wait=False)
+
+    async def _handle_connection(self, reader, writer):
+        loop = asyncio.get_running_loop()
+        try:
+            try:
+                head = await reader.readuntil(b"\r\n\r\n")
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                return
+            request_line, _, header_block = head.partition(b"\r\n")
+            headers = http.client.parse_headers(io.BytesIO(header_block))
+            body = b""
+            try:
+                content_length = int(headers.get("Content-Length", 0))
+            except ValueError:
+                content_length = 0 # 交由处理器按原逻辑报错
+            if content_length > 0:
+                try:
+                    body = await reader.readexactly(content_length)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    return
+
+            if SLOW_REQUESTS.enabled:
+                CURRENT_TRACE.set(RequestTrace()) # 只作用于本连接的任务上下文，随后复制给处理器所在的线程
+            admitted = False
+            admission_rejection = None
+            if self._request_path(request_line) in ADMISSION_CONTROLLED_PATHS:
+                started = time.perf_counter()
+                try:
+                    await ADMISSION_CONTROLLER.acquire_async()
+                    admitted = True
+                except AdmissionRejected as e:
+                    admission_rejection = e
+                record_span("admission_wait", started)
+            try:
+                prefetched = {}
+                remote_url, parse_mode = self._subscription_target(request_line, body)
+                if remote_url and admission_rejection is None:
+                    # 每个连接在独立的任务上下文中处理，预取订阅时按该请求的日志收集级别记录
+                    REQUEST_LOG_CAPTURE_LEVEL.set(request_log_capture_level(self._request_target(request_line)))
+                    prefetched[remote_url] = await self._prefetch(remote_url, parse_mode)
+
+                response_writer = _AsyncResponseWriter(writer, loop)
+                client_address = writer.get_extra_info("peername") or ("", 0)
+                await loop.run_in_executor(
+                    self._executor, contextvars.copy_context().run, self._run_handler, head + body, client_address,
+                    response_writer, prefetched, admission_rejection,
+                )
+            finally:
+                if admitted:
+                    ADMISSION_CONTROLLER.release()
+        except asyncio.CancelledError:
+            # 服务关闭时取消了仍在处理的连接；不再向上抛出，否则 start_server 的回调会把取消当作错误输出
+            pass
+        except Exception as e:
+            logger.error(f"asyncio 服务处理连接时发生错误: {e}", exc_info=True)
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except (Exception, asyncio.CancelledError):
+                pass
+
+    def _run_handler(self, raw_request, client_address, response_writer, prefetched, admission_rejection):
+        try:
+            self.handler_class(raw_request, client_address, self, response_writer, prefetched, admission_rejection)
+        except (ConnectionError, RuntimeError, concurrent.futures.CancelledError) as e:
+            # 客户端断开，或服务关闭时事件循环已停止
+            logger.debug(f"写出响应时连接已关闭: {e}")
+
+    @staticmethod
+    def _request_target(request_line):
+        try:
+            return request_line.decode("iso-8859-1").split()[1]
+        except Exception:
+            return ""
+
+    @classmethod
+    def _request_path(cls, request_line):
+        return urlparse(cls._request_target(request_line)).path or None
+
+    @staticmethod
+    def _subscription_target(request_line, body):
+        """返回该请求需要的 (远程订阅 URL, 解析模式)，不需要获取订阅时 URL 为 None。"""
+        try:
+            method, target = request_line.decode("iso-8859-1").split()[:2]
+            parsed_url = urlparse(target)
+            if method == "GET" and parsed_url.path in ("/subscription.yaml", "/api/auto_detect_pairs"):
+                remote_url = parse_qs(parsed_url.query).get('remote_url', [None])[0]
+                parse_mode = PARSE_MODE_ROUNDTRIP if parsed_url.path == "/subscription.yaml" else PARSE_MODE_NAMES
+            elif method == "POST" and parsed_url.path == "/api/validate_configuration":
+                remote_url = json.loads(body.decode('utf-8')).get("remote_url")
+                parse_mode = PARSE_MODE_NAMES
+            else:
+                return None, None
+        except Exception:
+            return None, None # 格式错误的请求由处理器按原逻辑返回错误
+        if not isinstance(remote_url, str) or urlparse(remote_url).scheme not in ('http', 'https'):
+            return None, None
+        return remote_url, parse_mode
+
+    async def _prefetch(self, remote_url, parse_mode):
+        """在事件循环中获取订阅，结果格式同 CustomHandler._fetch_subscription；等待超时时返回异常对象。"""
+        logs = []
+        ssl_verify_value = _resolve_ssl_verify_value([]) # 相关日志由处理器记录
+        cached_entry = _cached_subscription_for_request(remote_url, ssl_verify_value, parse_mode, logs)
+        if cached_entry is not None:
+            return cached_entry, logs, False
+        started = time.perf_counter()
+        try:
+            (entry, fetch_logs), shared = await self._flight.do(
+                remote_url,
+                lambda: _fetch_remote_subscription_async(self._client, self._executor, remote_url, ssl_verify_value, parse_mode),
+                SINGLEFLIGHT_WAIT_TIMEOUT,
+            )
+        except SingleFlightTimeout as e:
+            return e
+        finally:
+            record_span("fetch", started)
+        return entry, fetch_logs, shared
+
 # --- 主执行 ---
 if __name__ == "__main__":
     if not os.path.exists(LOG_DIR):
@@ -607,15 +3840,46 @@ if __name__ == "__main__":
     logger.info(f"前端脚本 script.js 预期路径: {os.path.join(script_dir, 'script.js')}")
 
     mimetypes.init()
+    STATIC_ASSETS.preload(PRELOADED_STATIC_FILES)
 
-    httpd = ThreadingHTTPServer(("", PORT), CustomHandler)
-    logger.info(f"服务已启动于 http://0.0.0.0:{PORT}")
-    logger.info("--- Mihomo 链式订阅转换服务已就绪 ---")
-    logger.info(f"请通过 http://<您的服务器IP>:{PORT}/ 访问前端配置页面")
-    try:
-        httpd.serve_forever()
-    except KeyboardInterrupt:
-        logger.info("服务正在关闭...")
-    finally:
-        httpd.server_close()
-        logger.info("服务已成功关闭。")
\ No newline at end of file
+    if DISK_SUBSCRIPTION_STORE.enabled and SUBSCRIPTION_CACHE.enabled:
+        warm_start = time.monotonic()
+        loaded_entries, loaded_snapshots = DISK_SUBSCRIPTION_STORE.warm(SUBSCRIPTION_CACHE)
+        if loaded_entries:
+            logger.info(f"已从磁盘缓存 {DISK_CACHE_DIR} 预热 {loaded_entries} 个订阅 ({loaded_snapshots} 个解析快照)，耗时 {time.monotonic() - warm_start:.2f} 秒。")
+
+    if PROCESS_POOL_WORKERS > 0:
+        PROCESS_POOL = _create_process_pool()
+        logger.info(f"YAML 处理进程池已启用，工作进程数: {PROCESS_POOL_WORKERS}")
+    # docker stop 等发送的 SIGTERM 与 Ctrl+C 一样正常关闭服务，工作进程随之退出。
+    # asyncio 模式下转为 SIGINT，由 asyncio.run 先取消任务再抛出 KeyboardInterrupt。
+    if SERVER_ENGINE == "asyncio":
+        signal.signal(signal.SIGTERM, lambda signum, frame: signal.raise_signal(signal.SIGINT))
+    else:
+        signal.signal(signal.SIGTERM, signal.default_int_handler)
+
+    def log_service_ready():
+        logger.info(f"服务已启动于 http://0.0.0.0:{PORT}")
+        logger.info("--- Mihomo 链式订阅转换服务已就绪 ---")
+        logger.info(f"请通过 http://<您的服务器IP>:{PORT}/ 访问前端配置页面")
+
+    if SERVER_ENGINE == "asyncio":
+        logger.info(f"使用 asyncio 服务引擎，工作线程数: {ASYNC_WORKER_THREADS}，上游客户端: {'aiohttp' if aiohttp is not None else f'线程池 ({ASYNC_UPSTREAM_THREADS})'}")
+        try:
+            asyncio.run(AsyncioServer(("", PORT)).serve_forever(log_service_ready))
+        except KeyboardInterrupt:
+            logger.info("服务正在关闭...")
+        finally:
+            logger.info("服务已成功关闭。")
+    else:
+        if SERVER_ENGINE != "threading":
+            logger.warning(f"未知的 SERVER_ENGINE: {SERVER_ENGINE}，将使用 threading。")
+        httpd = ThreadingHTTPServer(("", PORT), CustomHandler)
+        log_service_ready()
+        try:
+            httpd.serve_forever()
+        except KeyboardInterrupt:
+            logger.info("服务正在关闭...")
+        finally:
+            httpd.server_close()
+            logger.info("服务已成功关闭。")
@@ -401,7 +401,7 @@ async function handleAutoDetectPairs() {
     if(document.getElementById('autoDetectButton')) document.getElementById('autoDetectButton').disabled = true;  
 
     try {
-        const apiEndpoint = `${serviceUrl}/api/auto_detect_pairs?remote_url=${encodeURIComponent(remoteUrl)}`;
+        const apiEndpoint = `${serviceUrl}/api/auto_detect_pairs?remote_url=${encodeURIComponent(remoteUrl)}&verbose=1`; // verbose=1: include the full processing log for the log panel
         const response = await fetch(apiEndpoint);
         const responseData = await response.json();
 
@@ -511,7 +511,7 @@ async function validateConfigurationAndGenerateUrl() {
     }
 
     try {
-        const apiEndpoint = `${serviceUrl}/api/validate_configuration`;
+        const apiEndpoint = `${serviceUrl}/api/validate_configuration?verbose=1`;
         const response = await fetch(apiEndpoint, {
             method: 'POST',
             headers: { 'Content-Type': 'application/json' },
@@ -0,0 +1,15 @@
+"""pytest 公用夹具：服务脚本文件名带连字符，借助 benchmarks/common.py 按路径加载。"""
+import logging
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "benchmarks"))
+
+from common import load_service_module # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def service():
+    return load_service_module(log_level=logging.CRITICAL)
@@ -0,0 +1,191 @@
+"""服务脚本中优化前的原始实现，作为等价性测试的参照。
+
+与原版逐字一致，只是把模块内的 _add_log_entry、logger 改为由调用方传入的 service 提供。
+"""
+import re
+
+
+def apply_node_pairs_to_config(service, config_object, node_pairs_list):
+    """逐对线性查找节点与代理组的原始版本。"""
+    _add_log_entry = service._add_log_entry
+    logs = [] # Logs specific to this function's execution
+    _add_log_entry(logs, "info", f"开始应用 {len(node_pairs_list)} 个节点对到配置中。")
+
+    if not isinstance(config_object, dict):
+        _add_log_entry(logs, "error", "无效的配置对象：不是一个字典。")
+        return False, config_object, logs
+
+    proxies = config_object.get("proxies")
+    proxy_groups = config_object.get("proxy-groups")
+
+    if not isinstance(proxies, list):
+        _add_log_entry(logs, "error", "配置对象中缺少有效的 'proxies' 部分。")
+        return False, config_object, logs
+    if "proxy-groups" in config_object and not isinstance(proxy_groups, list):
+        _add_log_entry(logs, "warn", "配置对象中的 'proxy-groups' 部分无效（不是列表），可能会影响组操作。")
+        proxy_groups = []
+
+    applied_count = 0
+    for landing_name, front_name in node_pairs_list:
+        _add_log_entry(logs, "debug", f"尝试应用节点对: 落地='{landing_name}', 前置='{front_name}'.")
+
+        landing_node_found = False
+        for proxy_node in proxies:
+            if isinstance(proxy_node, dict) and proxy_node.get("name") == landing_name:
+                landing_node_found = True
+                proxy_node["dialer-proxy"] = front_name
+                _add_log_entry(logs, "info", f"成功为落地节点 '{landing_name}' 设置 'dialer-proxy' 为 '{front_name}'.")
+                applied_count += 1
+                if isinstance(proxy_groups, list):
+                    for grp in proxy_groups:
+                        if isinstance(grp, dict) and grp.get("name") == front_name:
+                            group_proxies_list = grp.get("proxies")
+                            if isinstance(group_proxies_list, list) and landing_name in group_proxies_list:
+                                try:
+                                    group_proxies_list.remove(landing_name)
+                                    _add_log_entry(logs, "info", f"已从前置组 '{front_name}' 的节点列表中移除落地节点 '{landing_name}'。")
+                                except ValueError:
+                                    _add_log_entry(logs, "warn", f"尝试从前置组 '{front_name}' 移除落地节点 '{landing_name}' 时失败 (ValueError)。")
+                            break
+                break
+
+        if not landing_node_found:
+            _add_log_entry(logs, "warn", f"节点对中的落地节点 '{landing_name}' 未在 'proxies' 列表中找到，已跳过此对。")
+
+    if len(node_pairs_list) > 0:
+        if applied_count == 0:
+            _add_log_entry(logs, "error", "未能应用任何提供的节点对。请检查节点名称是否与订阅中的节点匹配，或查看日志了解详情。")
+            return False, config_object, logs
+        elif applied_count < len(node_pairs_list):
+            failed_count = len(node_pairs_list) - applied_count
+            _add_log_entry(logs, "warn", f"节点对应用部分成功：成功 {applied_count} 个，失败 {failed_count} 个 (共 {len(node_pairs_list)} 个)。失败的节点对因无法匹配而被跳过。请核对节点名称或查看日志。")
+            return False, config_object, logs
+        else:
+            _add_log_entry(logs, "info", f"成功应用所有 {applied_count} 个节点对。")
+            return True, config_object, logs
+    else:
+        _add_log_entry(logs, "info", "没有提供节点对进行应用，配置未修改。")
+        return True, config_object, logs
+
+
+def _keyword_match(service, text_to_search, keyword_to_find):
+    if not text_to_search or not keyword_to_find:
+        return False
+    text_lower = text_to_search.lower()
+    keyword_lower = keyword_to_find.lower()
+    if re.search(r'[a-zA-Z]', keyword_to_find):
+        pattern_str = r'(?<![a-zA-Z])' + re.escape(keyword_lower) + r'(?![a-zA-Z])'
+        try:
+            if re.search(pattern_str, text_lower):
+                return True
+        except re.error as e:
+            service.logger.debug(f"Regex error during keyword match for keyword '{keyword_to_find}': {e}")
+            pass
+    else:
+        if keyword_lower in text_lower:
+            return True
+    return False
+
+
+def perform_auto_detection(service, config_object, region_keyword_config, landing_node_keywords_config):
+    """对每个落地节点逐一扫描全部代理组与节点查找前置的原始版本。"""
+    _add_log_entry = service._add_log_entry
+    logs = []
+    _add_log_entry(logs, "info", "开始自动节点对检测。")
+    suggested_pairs = []
+    if not isinstance(config_object, dict):
+        _add_log_entry(logs, "error", "无效的配置对象：不是一个字典。")
+        return [], logs
+    proxies = config_object.get("proxies")
+    proxy_groups = config_object.get("proxy-groups")
+    if not isinstance(proxies, list):
+        _add_log_entry(logs, "error", "配置对象中缺少有效的 'proxies' 列表，无法进行自动检测。")
+        return [], logs
+    if not isinstance(proxy_groups, list):
+        _add_log_entry(logs, "warn", "'proxy-groups' 部分缺失或无效，自动检测前置组的功能将受影响。")
+    for proxy_node in proxies:
+        if not isinstance(proxy_node, dict):
+            _add_log_entry(logs, "debug", f"跳过 'proxies' 中的无效条目: {proxy_node}")
+            continue
+        proxy_name = proxy_node.get("name")
+        if not proxy_name:
+            _add_log_entry(logs, "debug", f"跳过 'proxies' 中缺少名称的节点: {proxy_node}")
+            continue
+        is_landing = False
+        for l_kw in landing_node_keywords_config:
+            if _keyword_match(service, proxy_name, l_kw):
+                is_landing = True
+                break
+        if not is_landing:
+            _add_log_entry(logs, "debug", f"节点 '{proxy_name}' 未被识别为落地节点，跳过。")
+            continue
+        _add_log_entry(logs, "info", f"节点 '{proxy_name}' 被识别为潜在的落地节点。开始为其查找前置...")
+        matched_region_ids = set()
+        for region_def in region_keyword_config:
+            for r_kw in region_def.get("keywords", []):
+                if _keyword_match(service, proxy_name, r_kw):
+                    matched_region_ids.add(region_def.get("id"))
+                    break
+        if not matched_region_ids:
+            _add_log_entry(logs, "warn", f"落地节点 '{proxy_name}': 未能识别出任何区域。跳过此节点。")
+            continue
+        if len(matched_region_ids) > 1:
+            _add_log_entry(logs, "error", f"落地节点 '{proxy_name}': 识别出多个区域 {list(matched_region_ids)}，区域不明确。跳过此节点。")
+            continue
+        target_region_id = matched_region_ids.pop()
+        _add_log_entry(logs, "info", f"落地节点 '{proxy_name}': 成功识别区域ID为 '{target_region_id}'.")
+        target_region_keywords_for_dialer_search = []
+        for region_def in region_keyword_config:
+            if region_def.get("id") == target_region_id:
+                target_region_keywords_for_dialer_search = region_def.get("keywords", [])
+                break
+        if not target_region_keywords_for_dialer_search:
+            _add_log_entry(logs, "error", f"内部错误：区域ID '{target_region_id}' 未找到对应的关键字列表。跳过落地节点 '{proxy_name}'.")
+            continue
+        found_dialer_name = None
+        if isinstance(proxy_groups, list):
+            matching_groups = []
+            for group in proxy_groups:
+                if not isinstance(group, dict): continue
+                group_name = group.get("name")
+                if not group_name: continue
+                for r_kw in target_region_keywords_for_dialer_search:
+                    if _keyword_match(service, group_name, r_kw):
+                        matching_groups.append(group_name)
+                        break
+            if len(matching_groups) == 1:
+                found_dialer_name = matching_groups[0]
+                _add_log_entry(logs, "info", f"落地节点 '{proxy_name}': 在区域 '{target_region_id}' 找到唯一匹配的前置组: '{found_dialer_name}'.")
+            elif len(matching_groups) > 1:
+                _add_log_entry(logs, "error", f"落地节点 '{proxy_name}': 在区域 '{target_region_id}' 找到多个匹配的前置组 {matching_groups}，无法自动选择。跳过此节点。")
+                continue
+            else:
+                _add_log_entry(logs, "info", f"落地节点 '{proxy_name}': 在区域 '{target_region_id}' 未找到匹配的前置组。将尝试查找节点。")
+        else:
+            _add_log_entry(logs, "debug", "跳过查找前置组，因为 'proxy-groups' 缺失或无效。")
+        if not found_dialer_name:
+            matching_nodes = []
+            for candidate_proxy in proxies:
+                if not isinstance(candidate_proxy, dict): continue
+                candidate_name = candidate_proxy.get("name")
+                if not candidate_name or candidate_name == proxy_name:
+                    continue
+                for r_kw in target_region_keywords_for_dialer_search:
+                    if _keyword_match(service, candidate_name, r_kw):
+                        matching_nodes.append(candidate_name)
+                        break
+            if len(matching_nodes) == 1:
+                found_dialer_name = matching_nodes[0]
+                _add_log_entry(logs, "info", f"落地节点 '{proxy_name}': 在区域 '{target_region_id}' 找到唯一匹配的前置节点: '{found_dialer_name}'.")
+            elif len(matching_nodes) > 1:
+                _add_log_entry(logs, "error", f"落地节点 '{proxy_name}': 在区域 '{target_region_id}' 找到多个匹配的前置节点 {matching_nodes}，无法自动选择。跳过此节点。")
+                continue
+            else:
+                 _add_log_entry(logs, "warn", f"落地节点 '{proxy_name}': 在区域 '{target_region_id}' 也未能找到匹配的前置节点。")
+        if found_dialer_name:
+            suggested_pairs.append({"landing": proxy_name, "front": found_dialer_name})
+            _add_log_entry(logs, "info", f"成功为落地节点 '{proxy_name}' 自动配置前置为 '{found_dialer_name}'.")
+    _add_log_entry(logs, "info", f"自动节点对检测完成，共找到 {len(suggested_pairs)} 对建议。")
+    if not suggested_pairs and len(proxies) > 0:
+        _add_log_entry(logs, "warn", "未自动检测到任何可用的节点对。请检查节点命名是否符合预设的关键字规则，或调整关键字配置。")
+    return suggested_pairs, logs
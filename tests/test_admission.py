@@ -0,0 +1,64 @@
+"""准入控制：按上游主机的并发限制在主机统计被淘汰时仍然有效。"""
+import asyncio
+
+import pytest
+
+
+def fill_idle_hosts(limiter, count):
+    for i in range(count):
+        limiter.acquire(f"idle-{i}.example.com")
+        limiter.release(f"idle-{i}.example.com")
+
+
+def test_controller_in_use_is_not_evicted(service, monkeypatch):
+    limiter = service.UpstreamHostLimiter(1, 0.05)
+    fill_idle_hosts(limiter, limiter.MAX_IDLE_HOSTS - 1)
+    in_gap = []
+
+    class GapController(service.AdmissionController):
+        """在查找到控制器与真正 acquire 之间插入其它主机的请求，触发淘汰空闲主机。"""
+        def acquire(self):
+            while in_gap:
+                in_gap.pop()()
+            super().acquire()
+
+    monkeypatch.setattr(service, "AdmissionController", GapController)
+    in_gap.append(lambda: (limiter.acquire("other.example.com"), limiter.release("other.example.com")))
+    limiter.acquire("target.example.com")
+    assert "idle-0.example.com" not in limiter.stats() # 确实发生了淘汰
+    with pytest.raises(service.AdmissionRejected):
+        limiter.acquire("target.example.com") # 名额仍被第一个请求占用
+    limiter.release("target.example.com")
+    assert limiter.stats()["target.example.com"]["active"] == 0
+    limiter.acquire("target.example.com")
+    limiter.release("target.example.com")
+    assert limiter.stats()["target.example.com"]["active"] == 0
+
+
+def test_busy_and_queued_hosts_survive_eviction(service):
+    limiter = service.UpstreamHostLimiter(1, 0.05)
+    limiter.acquire("busy.example.com")
+    with pytest.raises(service.AdmissionRejected):
+        limiter.acquire("busy.example.com") # 超时的等待者不应留下使用登记
+    fill_idle_hosts(limiter, limiter.MAX_IDLE_HOSTS * 2)
+    assert limiter.stats()["busy.example.com"]["active"] == 1
+    with pytest.raises(service.AdmissionRejected):
+        limiter.acquire("busy.example.com")
+    limiter.release("busy.example.com")
+    fill_idle_hosts(limiter, limiter.MAX_IDLE_HOSTS)
+    assert "busy.example.com" not in limiter.stats() # 不再使用后可以被淘汰
+    assert len(limiter.stats()) <= limiter.MAX_IDLE_HOSTS
+
+
+def test_async_acquire_survives_eviction(service):
+    limiter = service.UpstreamHostLimiter(1, 0.05)
+
+    async def scenario():
+        await limiter.acquire_async("target.example.com")
+        fill_idle_hosts(limiter, limiter.MAX_IDLE_HOSTS * 2)
+        with pytest.raises(service.AdmissionRejected):
+            await limiter.acquire_async("target.example.com")
+        limiter.release("target.example.com")
+
+    asyncio.run(scenario())
+    assert limiter.stats()["target.example.com"]["active"] == 0
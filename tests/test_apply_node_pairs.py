@@ -0,0 +1,109 @@
+"""apply_node_pairs_to_config 与逐对线性查找的原始实现结果一致：返回值、日志以及修改后的配置。"""
+import json
+import random
+
+import pytest
+
+import reference
+
+NAMES = ["HK Landing", "香港 落地 01", "US 01", "JP", "a", "A", "DIRECT", "", "HK", "🇭🇰 Hong Kong"]
+
+
+def random_config(rng):
+    """随机生成含重名、无效条目、非列表成员等边界情况的配置（JSON 即合法 YAML）。"""
+    def name():
+        choice = rng.random()
+        if choice < 0.05:
+            return rng.choice([3, None])
+        return rng.choice(NAMES)
+
+    config = {}
+    if rng.random() < 0.95:
+        proxies = []
+        for _ in range(rng.randint(0, 8)):
+            kind = rng.random()
+            if kind < 0.08:
+                proxies.append(rng.choice(["plain", 7, None]))
+            elif kind < 0.14:
+                proxies.append({"type": "ss"})
+            else:
+                proxies.append({"name": name(), "type": "ss", "port": rng.randint(1, 9)})
+        config["proxies"] = proxies
+    else:
+        config["proxies"] = {"name": "x"}
+    kind = rng.random()
+    if kind < 0.85:
+        groups = []
+        for _ in range(rng.randint(0, 5)):
+            if rng.random() < 0.08:
+                groups.append("not a group")
+                continue
+            group = {"name": name(), "type": "select"}
+            if rng.random() < 0.9:
+                group["proxies"] = [name() for _ in range(rng.randint(0, 6))]
+            else:
+                group["proxies"] = "HK Landing"
+            groups.append(group)
+        config["proxy-groups"] = groups
+    elif kind < 0.93:
+        config["proxy-groups"] = "invalid"
+    return config
+
+
+def random_pairs(rng):
+    return [(rng.choice(NAMES + ["missing"]), rng.choice(NAMES + ["missing"])) for _ in range(rng.randint(0, 5))]
+
+
+def log_messages(logs):
+    return [(log["level"], log["message"]) for log in logs]
+
+
+def dump(service, config_object):
+    output = service.StringIO()
+    service.get_yaml().dump(config_object, output)
+    return output.getvalue()
+
+
+def assert_same_as_reference(service, text, node_pairs):
+    for load in (service.get_yaml().load, service.get_safe_yaml().load):
+        expected = reference.apply_node_pairs_to_config(service, load(text), node_pairs)
+        result = service.apply_node_pairs_to_config(load(text), node_pairs)
+        assert result[0] == expected[0]
+        assert log_messages(result[2]) == log_messages(expected[2])
+        assert dump(service, result[1]) == dump(service, expected[1])
+
+
+EDGE_CASES = [
+    ("proxies:\n  - {name: a}\n  - {name: b}\nproxy-groups:\n  - {name: g, proxies: [b, a, b, a, a]}\n",
+     [("a", "g"), ("b", "g"), ("a", "g"), ("a", "g"), ("a", "g"), ("b", "g")]),
+    ("proxies:\n  - &n {name: HK Landing, type: ss}\n  - *n\n  - {name: [1, 2]}\n  - {name: 123}\n  - {name: ''}\n"
+     "proxy-groups:\n  - name: HK\n    proxies: &m [HK Landing, 'HK Landing', DIRECT]\n  - {name: HK, proxies: [HK Landing]}\n"
+     "  - {name: US, proxies: *m}\n",
+     [("HK Landing", "HK"), ("HK Landing", "HK"), ("", "US"), ("HK Landing", "US")]),
+    ("proxies:\n  - {name: a}\nproxy-groups: nope\n", [("a", "b")]),
+    ("proxies:\n  - {name: a}\nproxy-groups:\n  - {name: b, proxies: x}\n", [("a", "b")]),
+    ("proxies: {}\n", [("a", "b")]),
+    ("- a\n- b\n", [("a", "b")]),
+    ("proxies:\n  - {name: a}\n", []),
+]
+
+
+@pytest.mark.parametrize("text, node_pairs", EDGE_CASES)
+def test_edge_cases_match_reference(service, text, node_pairs):
+    assert_same_as_reference(service, text, node_pairs)
+
+
+def test_random_configs_match_reference(service):
+    rng = random.Random(20240501)
+    for _ in range(200):
+        assert_same_as_reference(service, json.dumps(random_config(rng), ensure_ascii=False), random_pairs(rng))
+
+
+def test_generated_subscription_matches_reference(service):
+    from common import make_subscription_yaml
+
+    text, proxy_names, landing_names, group_names = make_subscription_yaml(300, 12)
+    rng = random.Random(7)
+    node_pairs = [(landing, rng.choice(group_names + proxy_names)) for landing in landing_names]
+    node_pairs.append(("missing", group_names[0]))
+    assert_same_as_reference(service, text, node_pairs)
@@ -0,0 +1,145 @@
+"""增量生成：patch_rendered_output 的结果必须与完整的 apply_node_pairs_to_config + 输出一致。"""
+import pytest
+
+from common import make_subscription_yaml
+
+BASE = """mixed-port: 7890
+proxies:
+  - {name: 'HK Landing 01', type: ss, server: hk.example.com, port: 1001, cipher: aes-128-gcm, password: p}
+  - {name: "香港 \\"引号\\" 02", type: ss, server: hk2.example.com, port: 1002, cipher: aes-128-gcm, password: p}
+  - {name: 'US 03', type: ss, server: us.example.com, port: 1003, cipher: aes-128-gcm, password: p}
+  - name: "🇯🇵 日本 04"
+    type: ss
+    server: jp.example.com
+    port: 1004
+    cipher: aes-128-gcm
+    password: p
+proxy-groups:
+  - name: 香港节点
+    type: select
+    proxies:
+      - 'HK Landing 01'
+      - "香港 \\"引号\\" 02"
+  - name: 'Auto'
+    type: url-test
+    url: http://www.gstatic.com/generate_204
+    interval: 300
+    proxies:
+      - 'US 03'
+      - "🇯🇵 日本 04"
+rules:
+  - MATCH,Auto
+"""
+PAIRS = [("HK Landing 01", "香港节点")]
+
+
+def full_render(service, text, node_pairs):
+    config = service.get_yaml().load(text.encode("utf-8"))
+    success, config, logs = service.apply_node_pairs_to_config(config, node_pairs)
+    assert success, logs
+    output = service.StringIO()
+    service.get_yaml().dump(config, output)
+    return output.getvalue().encode("utf-8")
+
+
+def patch(service, previous_text, text, node_pairs=PAIRS):
+    previous_output = full_render(service, previous_text, node_pairs)
+    return service.patch_rendered_output(previous_text.encode("utf-8"), previous_output, text.encode("utf-8"), node_pairs)
+
+
+CASES = {
+    "unchanged": (BASE, 0, 0),
+    "field_changed": (BASE.replace("port: 1003", "port: 2003"), 1, 0),
+    "block_field_changed": (BASE.replace("    port: 1004", "    port: 2004"), 1, 0),
+    "landing_changed": (BASE.replace("port: 1001", "port: 2001"), 1, 0),
+    "proxy_added": (BASE.replace(
+        "proxy-groups:",
+        "  - {name: 'SG 05', type: ss, server: sg.example.com, port: 1005, cipher: aes-128-gcm, password: p}\n"
+        "proxy-groups:"), 1, 0),
+    "proxy_removed": (BASE.replace(
+        "  - {name: 'US 03', type: ss, server: us.example.com, port: 1003, cipher: aes-128-gcm, password: p}\n", ""), 0, 0),
+    "proxy_renamed": (BASE.replace("'US 03'", "'US 03 new'"), 1, 1),
+    "quoted_unicode_renamed": (BASE.replace('香港 \\"引号\\" 02', '香港 \\"新\\" 02 ✈'), 1, 1),
+    "group_changed": (BASE.replace("interval: 300", "interval: 600"), 0, 1),
+    "group_members_changed": (BASE.replace("      - 'US 03'\n", ""), 0, 1),
+}
+
+
+@pytest.mark.parametrize("name", CASES)
+def test_patch_matches_full_render(service, name):
+    text, changed_proxies, changed_groups = CASES[name]
+    body, proxies, groups = patch(service, BASE, text)
+    assert body == full_render(service, text, PAIRS)
+    assert (proxies, groups) == (changed_proxies, changed_groups)
+
+
+def test_patch_generated_subscription(service):
+    # 合成订阅与自动检测的节点对：同时有节点改动、新增、删除，以及代理组成员变化
+    text, proxy_names, _, _ = make_subscription_yaml(200, 12)
+    config = service.get_yaml().load(text)
+    node_pairs = [(pair["landing"], pair["front"]) for pair in service.perform_auto_detection(
+        config, service.REGION_KEYWORD_CONFIG, service.LANDING_NODE_KEYWORDS)[0]]
+    assert node_pairs
+    changed = text
+    for i in (3, 77, 150):
+        changed = changed.replace(f"port: {10000 + i},", f"port: {20000 + i},")
+    removed = proxy_names[41]
+    changed = "".join(line for line in changed.splitlines(True) if f"'{removed}'" not in line)
+    changed = changed.replace("proxy-groups:\n", "  - {name: 'KR 新增', type: ss, server: new.example.com, port: 1, "
+                                                 "cipher: aes-128-gcm, password: p}\nproxy-groups:\n")
+    assert all(landing != removed for landing, _ in node_pairs)
+    body, proxies, groups = patch(service, text, changed, node_pairs)
+    assert body == full_render(service, changed, node_pairs)
+    assert (proxies, groups) == (4, 2) # 12 个组中每个节点属于两个组
+
+
+def test_patch_without_pairs(service):
+    text = BASE.replace("port: 1002", "port: 2002")
+    body, proxies, groups = patch(service, BASE, text, [])
+    assert body == full_render(service, text, [])
+    assert (proxies, groups) == (1, 0)
+
+
+def test_patch_crlf_document(service):
+    previous_text = BASE.replace("\n", "\r\n")
+    text = previous_text.replace("port: 1003", "port: 2003")
+    assert patch(service, previous_text, text)[0] == full_render(service, text, PAIRS)
+
+
+UNSUPPORTED_CASES = {
+    "int_name": BASE.replace("name: 'US 03'", "name: 3"),
+    "comment": BASE.replace("port: 1003, cipher: aes-128-gcm, password: p}", "port: 1003, cipher: aes-128-gcm, password: p} # 注释"),
+    "anchor": BASE.replace("{name: 'US 03',", "&us {name: 'US 03',"),
+    "top_level_changed": BASE.replace("mixed-port: 7890", "mixed-port: 7891"),
+    "rules_changed": BASE.replace("  - MATCH,Auto", "  - MATCH,DIRECT"),
+    "landing_removed": BASE.replace("'HK Landing 01', type: ss", "'HK Landing 99', type: ss"),
+    "multiple_documents": BASE + "---\nx: 1\n",
+}
+
+
+@pytest.mark.parametrize("name", UNSUPPORTED_CASES)
+def test_patch_unsupported_changes(service, name):
+    text = UNSUPPORTED_CASES[name]
+    assert text != BASE
+    with pytest.raises(service.IncrementalRenderUnsupported):
+        patch(service, BASE, text)
+
+
+def test_int_names_in_previous_document(service):
+    # 整数名称在完整生成时作为节点名使用，增量生成放弃处理而不是产生不一致的输出
+    previous_text = BASE.replace("'US 03'", "3")
+    with pytest.raises(service.IncrementalRenderUnsupported):
+        patch(service, previous_text, previous_text.replace("port: 1004", "port: 2004"))
+
+
+def test_split_item_sections(service):
+    template, sections = service._split_item_sections(BASE)
+    assert [key for key, _ in sections] == ["proxies", "proxy-groups"]
+    assert [name for name, _ in sections[0][1]] == ["HK Landing 01", '香港 "引号" 02', "US 03", "🇯🇵 日本 04"]
+    assert [name for name, _ in sections[1][1]] == ["香港节点", "Auto"]
+    assert template[0] == "mixed-port: 7890\nproxies:\n"
+    assert template[1] == "proxy-groups:\n"
+    assert template[2] == "rules:\n  - MATCH,Auto\n"
+    rebuilt = template[0] + "".join(text for _, text in sections[0][1]) + template[1] + \
+        "".join(text for _, text in sections[1][1]) + template[2]
+    assert rebuilt == BASE
@@ -0,0 +1,132 @@
+"""names 解析模式：extract_proxy_names 得到的节点模型及其上的检测与校验结果，与完整 safe 解析一致。"""
+import random
+
+import pytest
+from ruamel.yaml import YAML
+from ruamel.yaml.compat import StringIO
+
+NAMES = ["HK Landing 01", "香港 落地 02", "US 01", "🇯🇵 Japan", "JP 节点", "123", "true", "null", "a: b", "# x", "DIRECT", "香港组"]
+
+
+def model_summary(model):
+    if model is None:
+        return None
+    return (
+        [(proxy.name, proxy.position) for proxy in model.proxies] if model.proxies is not None else None,
+        dict(model.proxy_ids),
+        dict(model.invalid_proxies),
+        [(group.name, group.position, list(group.members) if group.members is not None else None)
+         for group in model.groups] if model.groups is not None else None,
+        model.has_groups_key,
+    )
+
+
+def log_messages(logs):
+    return [(log["level"], log["message"]) for log in logs]
+
+
+def parse(service, content, parse_mode):
+    logs = []
+    return service.parse_subscription(content, parse_mode, logs), logs
+
+
+def assert_names_match_safe(service, content):
+    names_model, _ = parse(service, content, service.PARSE_MODE_NAMES)
+    safe_config, _ = parse(service, content, service.PARSE_MODE_SAFE)
+    safe_model = service.NodeModel.from_config(safe_config) if safe_config is not None else None
+    assert model_summary(names_model) == model_summary(safe_model)
+    if safe_model is None:
+        return
+    detection_args = (service.REGION_KEYWORD_CONFIG, service.LANDING_NODE_KEYWORDS)
+    names_pairs, names_logs = service.perform_auto_detection(names_model, *detection_args)
+    safe_pairs, safe_logs = service.perform_auto_detection(safe_config, *detection_args)
+    assert names_pairs == safe_pairs
+    assert log_messages(names_logs) == log_messages(safe_logs)
+    node_pairs = [(pair["landing"], pair["front"]) for pair in safe_pairs] + [("missing", "香港组")]
+    names_result = service.apply_node_pairs_to_config(names_model, node_pairs)
+    safe_result = service.apply_node_pairs_to_config(safe_config, node_pairs)
+    assert names_result[0] == safe_result[0]
+    assert log_messages(names_result[2]) == log_messages(safe_result[2])
+
+
+def random_document(rng):
+    """随机结构以随机的流式 / 块式风格输出，名称中混有需要加引号的字符串。"""
+    def name():
+        return rng.choice(NAMES)
+
+    config = {"mixed-port": 7890, "dns": {"enable": True, "nameserver": ["1.1.1.1"]}}
+    config["proxies"] = []
+    for i in range(rng.randint(0, 8)):
+        if rng.random() < 0.05:
+            config["proxies"].append("plain entry")
+        else:
+            config["proxies"].append({"name": name(), "type": "ss", "server": f"s{i}.example.com", "port": 1000 + i,
+                                      "plugin-opts": {"mode": "websocket", "headers": {"Host": "example.com"}}})
+    if rng.random() < 0.9:
+        config["proxy-groups"] = []
+        for _ in range(rng.randint(0, 5)):
+            group = {"name": name(), "type": rng.choice(["select", "url-test"])}
+            if rng.random() < 0.9:
+                group["proxies"] = [name() for _ in range(rng.randint(0, 6))]
+            config["proxy-groups"].append(group)
+    config["rules"] = [f"DOMAIN-SUFFIX,site{i}.example.com,DIRECT" for i in range(rng.randint(0, 3))] + ["MATCH,DIRECT"]
+    yaml = YAML(typ="safe", pure=True)
+    yaml.default_flow_style = rng.choice([False, True, None])
+    yaml.allow_unicode = rng.random() < 0.5
+    output = StringIO()
+    yaml.dump(config, output)
+    return output.getvalue()
+
+
+SPECIAL_DOCUMENTS = {
+    "anchor_alias_in_groups": "proxies:\n  - {name: HK Landing, type: ss}\n  - {name: HK 01, type: ss}\n"
+                              "proxy-groups:\n  - {name: 香港组, proxies: &m [HK 01, HK Landing]}\n  - {name: B, proxies: *m}\n",
+    "alias_in_skipped_section": "x: &m [1, 2]\ny: *m\nproxies:\n  - {name: HK Landing, type: ss}\n",
+    "merge_key": "base: &b {type: ss}\nproxies:\n  - {<<: *b, name: HK Landing}\n  - {name: HK 01, type: ss}\n",
+    "explicit_tags": "proxies:\n  - {name: !!str 123, type: ss}\n  - {name: HK Landing, type: ss}\n",
+    "int_name": "proxies:\n  - {name: 123, type: ss}\n  - {name: HK Landing, type: ss}\n",
+    "missing_name": "proxies:\n  - {type: ss}\n  - {name: HK Landing, type: ss}\n",
+    "empty_name": "proxies:\n  - {name: '', type: ss}\n  - {name: HK Landing, type: ss}\n",
+    "scalar_items": "proxies:\n  - plain\n  - 7\n  - {name: HK Landing, type: ss}\n",
+    "null_proxies": "proxies:\nproxy-groups: []\n",
+    "proxies_mapping": "proxies: {name: HK Landing}\n",
+    "groups_not_list": "proxies:\n  - {name: HK Landing, type: ss}\nproxy-groups: invalid\n",
+    "group_proxies_not_list": "proxies:\n  - {name: HK Landing, type: ss}\nproxy-groups:\n  - {name: 香港组, proxies: HK Landing}\n",
+    "group_member_int": "proxies:\n  - {name: HK Landing, type: ss}\n  - {name: '1', type: ss}\nproxy-groups:\n  - {name: 香港组, proxies: [1, '1', HK Landing]}\n",
+    "duplicate_names": "proxies:\n  - {name: HK Landing, type: ss}\n  - {name: HK Landing, type: vmess}\n"
+                       "proxy-groups:\n  - {name: 香港组, proxies: [HK Landing, HK Landing]}\n  - {name: 香港组, proxies: []}\n",
+    "comments_and_bom": "\ufeff# 订阅\nproxies: # 节点\n  - name: HK Landing # 落地\n    type: ss\n  - name: 'HK 01'\n    type: ss\n",
+    "block_scalars": "proxies:\n  - name: >-\n      HK\n      Landing\n    type: ss\n  - name: |-\n      HK 01\n    type: ss\n",
+    "multiple_documents": "proxies:\n  - {name: HK Landing}\n---\nproxies: []\n",
+    "yaml_directive": "%YAML 1.1\n---\nproxies:\n  - {name: HK Landing}\n",
+    "duplicate_top_level_key": "proxies:\n  - {name: HK Landing}\nproxies:\n  - {name: HK 01}\n",
+    "top_level_list": "- a\n- b\n",
+    "syntax_error": "proxies: [\n",
+    "empty": "",
+}
+
+
+@pytest.mark.parametrize("name", SPECIAL_DOCUMENTS)
+def test_special_documents_match_safe(service, name):
+    assert_names_match_safe(service, SPECIAL_DOCUMENTS[name].encode("utf-8"))
+
+
+def test_random_documents_match_safe(service):
+    rng = random.Random(1010)
+    for _ in range(150):
+        assert_names_match_safe(service, random_document(rng).encode("utf-8"))
+
+
+def test_generated_subscription_matches_safe(service):
+    from common import make_subscription_yaml
+
+    content = make_subscription_yaml(500, 20, num_rules=200)[0].encode("utf-8")
+    model = service.extract_proxy_names(content) # 合成订阅不含需要回退的结构
+    assert model_summary(model) == model_summary(service.NodeModel.from_config(service.get_safe_yaml().load(content)))
+    assert_names_match_safe(service, content)
+
+
+def test_unsupported_structures_raise(service):
+    for name in ("anchor_alias_in_groups", "merge_key", "explicit_tags", "int_name", "missing_name", "multiple_documents"):
+        with pytest.raises(service._NamesExtractionUnsupported):
+            service.extract_proxy_names(SPECIAL_DOCUMENTS[name].encode("utf-8"))
@@ -0,0 +1,118 @@
+"""节点模型：在 NodeModel 上进行的自动检测与节点对校验，与直接遍历配置的原始实现结果一致。"""
+import json
+import random
+
+import pytest
+
+import reference
+
+NAMES = ["HK Landing", "香港 落地 02", "US Landing", "HK US Landing", "Landing", "🇯🇵 落地", "RUSSIA Landing",
+         "台湾 落地", "HK 01", "HK 02", "JP 01", "USA 01", "🇺🇸 美国", "香港组", "Japan Group", "HK Group",
+         "TW", "DIRECT", ""]
+
+
+def random_config(rng):
+    config = {"proxies": []}
+    for _ in range(rng.randint(0, 10)):
+        kind = rng.random()
+        if kind < 0.05:
+            config["proxies"].append("plain entry")
+        elif kind < 0.1:
+            config["proxies"].append({"type": "ss"})
+        else:
+            config["proxies"].append({"name": rng.choice(NAMES), "type": "ss"})
+    kind = rng.random()
+    if kind < 0.85:
+        config["proxy-groups"] = []
+        for _ in range(rng.randint(0, 5)):
+            if rng.random() < 0.05:
+                config["proxy-groups"].append("not a group")
+                continue
+            group = {"name": rng.choice(NAMES), "type": "select"}
+            if rng.random() < 0.9:
+                group["proxies"] = [rng.choice(NAMES) for _ in range(rng.randint(0, 6))]
+            config["proxy-groups"].append(group)
+    elif kind < 0.93:
+        config["proxy-groups"] = "invalid"
+    return config
+
+
+def log_messages(logs):
+    return [(log["level"], log["message"]) for log in logs]
+
+
+def loaded_variants(service, text):
+    """同一文档的各种输入形式：safe 解析的 dict、round-trip 文档、紧凑节点模型，以及 names 模式的解析结果。"""
+    content = text.encode("utf-8")
+    safe_config = service.get_safe_yaml().load(content)
+    variants = {
+        "safe": safe_config,
+        "roundtrip": service.get_yaml().load(content),
+        "model": service.NodeModel.from_config(service.get_safe_yaml().load(content)),
+    }
+    names_model = service.parse_subscription(content, service.PARSE_MODE_NAMES, [])
+    if names_model is not None:
+        variants["names"] = names_model
+    return safe_config, variants
+
+
+def assert_model_matches_reference(service, text, node_pairs=None):
+    detection_args = (service.REGION_KEYWORD_CONFIG, service.LANDING_NODE_KEYWORDS)
+    safe_config, variants = loaded_variants(service, text)
+    expected_pairs, expected_logs = reference.perform_auto_detection(service, safe_config, *detection_args)
+    if node_pairs is None:
+        node_pairs = [(pair["landing"], pair["front"]) for pair in expected_pairs] + [("HK Landing", "香港组")]
+    expected_apply = reference.apply_node_pairs_to_config(service, service.get_safe_yaml().load(text), node_pairs)
+    for variant, config_object in variants.items():
+        pairs, logs = service.perform_auto_detection(config_object, *detection_args)
+        assert pairs == expected_pairs, variant
+        assert log_messages(logs) == log_messages(expected_logs), variant
+        if isinstance(config_object, service.NodeModel):
+            # 只读模型上只校验，返回值与日志与实际应用时相同
+            success, result, logs = service.apply_node_pairs_to_config(config_object, node_pairs)
+            assert result is config_object
+            assert success == expected_apply[0], variant
+            assert log_messages(logs) == log_messages(expected_apply[2]), variant
+
+
+def test_random_configs_match_reference(service):
+    rng = random.Random(2323)
+    for _ in range(200):
+        assert_model_matches_reference(service, json.dumps(random_config(rng), ensure_ascii=False))
+
+
+@pytest.mark.parametrize("text", [
+    "proxies:\n  - {name: HK Landing}\n  - {name: HK 01}\nproxy-groups:\n"
+    "  - {name: 香港组, proxies: &m [HK 01, HK Landing, HK Landing]}\n  - {name: HK Group, proxies: *m}\n",
+    "proxies:\n  - {name: HK Landing}\n  - {name: HK Landing}\n  - {name: HK 01}\nproxy-groups:\n"
+    "  - {name: 香港组, proxies: [HK Landing]}\n  - {name: 香港组, proxies: [HK Landing]}\n",
+    "proxies:\n  - {name: HK Landing}\n  - {name: 3}\nproxy-groups:\n  - {name: 香港组, proxies: [3, HK Landing]}\n",
+    "proxies: []\n",
+    "proxies: {}\n",
+    "- a\n",
+])
+def test_edge_cases_match_reference(service, text):
+    node_pairs = [("HK Landing", "香港组"), ("HK Landing", "HK Group"), ("HK Landing", "香港组"), ("missing", "香港组")]
+    if "name: 3" in text:
+        # 原始检测对非字符串名称调用 .lower() 会出错，这里只比较节点对校验
+        safe_config, variants = loaded_variants(service, text)
+        expected = reference.apply_node_pairs_to_config(service, safe_config, node_pairs)
+        result = service.apply_node_pairs_to_config(variants["model"], node_pairs)
+        assert (result[0], log_messages(result[2])) == (expected[0], log_messages(expected[2]))
+        return
+    assert_model_matches_reference(service, text, node_pairs)
+
+
+def test_generated_subscription_matches_reference(service):
+    from common import make_subscription_yaml
+
+    assert_model_matches_reference(service, make_subscription_yaml(300, 12)[0])
+
+
+def test_compact_model_shares_aliased_member_lists(service):
+    config = service.get_safe_yaml().load("proxies:\n  - {name: a}\nproxy-groups:\n  - {name: g, proxies: &m [a, DIRECT]}\n"
+                                          "  - {name: h, proxies: *m}\n  - {name: i, proxies: [a, DIRECT]}\n")
+    model = service.NodeModel.from_config(config)
+    assert model.groups[0].members is model.groups[1].members
+    assert model.groups[2].members is not model.groups[0].members
+    assert list(model.groups[2].members) == [0, -1]
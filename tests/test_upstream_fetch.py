@@ -0,0 +1,72 @@
+"""上游订阅下载：压缩传输的解码与大小上限。"""
+import gzip
+
+import pytest
+
+from common import StubUpstream, make_subscription_yaml
+
+
+@pytest.fixture(scope="module")
+def subscription():
+    return make_subscription_yaml(300, 10)
+
+
+@pytest.fixture(scope="module")
+def gzip_upstream(subscription):
+    upstream = StubUpstream(subscription[0].encode("utf-8"), etag=False, gzip=True)
+    yield upstream
+    upstream.stop()
+
+
+def test_upstream_get_decodes_gzip(service, subscription, gzip_upstream):
+    status_code, headers, content = service._upstream_get(gzip_upstream.url + "?case=raw", {}, True)
+    assert status_code == 200
+    assert headers["Content-Encoding"] == "gzip"
+    assert content == subscription[0].encode("utf-8")
+
+
+@pytest.mark.parametrize("parse_mode", ["names", "safe", "roundtrip"])
+def test_fetch_gzip_subscription_parses(service, subscription, gzip_upstream, parse_mode):
+    # names / safe 模式在下载的同时增量解析，压缩数据若未解码会直接送进 YAML 解析器
+    url = f"{gzip_upstream.url}?case={parse_mode}"
+    entry, logs = service._fetch_remote_subscription(url, True, parse_mode)
+    assert entry is not None, logs
+    config = entry.get_config(parse_mode, logs)
+    proxies = config.proxies if isinstance(config, service.NodeModel) else config["proxies"]
+    names = [proxy.name if isinstance(config, service.NodeModel) else proxy["name"] for proxy in proxies]
+    assert names == subscription[1]
+
+
+def test_max_bytes_applies_to_decoded_size(service, subscription, gzip_upstream, monkeypatch):
+    body = subscription[0].encode("utf-8")
+    assert len(gzip.compress(body)) < len(body) // 2
+    monkeypatch.setattr(service, "UPSTREAM_MAX_BYTES", len(body) // 2)
+    with pytest.raises(service.UpstreamBodyTooLarge):
+        service._upstream_get(gzip_upstream.url + "?case=limit", {}, True)
+
+
+class _ShortTimeoutSession:
+    """把 _upstream_get 固定的 15 秒超时缩短，使读取超时在测试中很快发生。"""
+    def __init__(self, session, timeout):
+        self._session = session
+        self._timeout = timeout
+
+    def get(self, url, **kwargs):
+        kwargs["timeout"] = self._timeout
+        return self._session.get(url, **kwargs)
+
+
+@pytest.mark.parametrize("max_retries", [0, 2])
+def test_read_timeout_is_reported_as_timeout(service, subscription, monkeypatch, max_retries):
+    monkeypatch.setattr(service, "REQUESTS_MAX_RETRIES", max_retries)
+    monkeypatch.setattr(service, "HTTP_SESSION", _ShortTimeoutSession(service._create_http_session(), 0.3))
+    upstream = StubUpstream(subscription[0].encode("utf-8"), latency=1.5, etag=False)
+    try:
+        timeouts_before = service.UPSTREAM_FETCHES._values.get(("timeout",), 0)
+        entry, logs = service._fetch_remote_subscription(f"{upstream.url}?case=timeout-{max_retries}", True, "names")
+        assert entry is None
+        assert any("请求远程订阅超时" in log["message"] for log in logs), logs
+        assert service.UPSTREAM_FETCHES._values.get(("timeout",), 0) == timeouts_before + 1
+        assert upstream.requests == 1 # 读取超时不重试
+    finally:
+        upstream.stop()